@@ -17,7 +17,9 @@ from dflow.python import upload_packages
 
 upload_packages.append(__file__)
 
-from dflowautotest.lib.utils import return_prop_list
+from dflowautotest.lib.utils import return_prop_list, copy_post_output, overlay_tree
+from dflowautotest.lib.cache import (list_task_dirs, mark_cache_hits, is_cache_hit,
+                                     restore_cache_hits, store_cache_misses)
 try:
     from dflowautotest.auto_test.common_equi import (make_equi, post_equi)
     from dflowautotest.auto_test.common_prop import (make_property, post_property)
@@ -61,7 +63,9 @@ class RelaxMakeABACUS(OP):
         inter_parameter = loadfn(param_argv)["interaction"]
         parameter = loadfn(param_argv)["relaxation"]
 
-        make_equi(structures, inter_parameter, parameter)
+        make_equi(structures, inter_parameter, parameter, loadfn(param_argv).get("make_workers", 1))
+        # the tasks found in the result cache are not computed again
+        mark_cache_hits(list_task_dirs(structures), loadfn(param_argv).get("result_cache", None))
 
         conf_dirs = []
         for conf in structures:
@@ -71,7 +75,8 @@ class RelaxMakeABACUS(OP):
         task_list = []
         for ii in conf_dirs:
             conf_dir_global = os.path.join(work_d, ii)
-            task_list.append(os.path.join(conf_dir_global, 'relaxation/relax_task'))
+            if not is_cache_hit(os.path.join(ii, 'relaxation/relax_task')):
+                task_list.append(os.path.join(conf_dir_global, 'relaxation/relax_task'))
 
         all_jobs = task_list
         njobs = len(all_jobs)
@@ -111,11 +116,8 @@ class RelaxABACUS(OP):
 
     @OP.exec_sign_check
     def execute(self, op_in: OPIO) -> OPIO:
-        cwd = os.getcwd()
-        os.chdir(op_in["input_abacus"])
         cmd = op_in["run_command"]
-        subprocess.call(cmd, shell=True)
-        os.chdir(cwd)
+        subprocess.call(cmd, shell=True, cwd=op_in["input_abacus"])
         op_out = OPIO({
             "output_abacus": op_in["input_abacus"]
         })
@@ -133,7 +135,7 @@ class RelaxPostABACUS(OP):
     @classmethod
     def get_input_sign(cls):
         return OPIOSign({
-            'input_post': Artifact(Path, sub_path=False),
+            'input_post': Artifact(Path, sub_path=False, optional=True),
             'input_all': Artifact(Path, sub_path=False),
             'param': Artifact(Path),
             'path': str
@@ -143,24 +145,34 @@ class RelaxPostABACUS(OP):
     def get_output_sign(cls):
         return OPIOSign({
             'output_all': Artifact(Path, sub_path=False),
-            'output_post': Artifact(Path, sub_path=False)
+            'output_post': Artifact(Path, sub_path=False),
+            'output_raw': Artifact(Path, sub_path=False, optional=True)
         })
 
     @OP.exec_sign_check
     def execute(self, op_in: OPIO) -> OPIO:
         cwd = os.getcwd()
         os.chdir(str(op_in['input_all']) + op_in['path'])
-        shutil.copytree(str(op_in['input_post']) + op_in['path'], './', dirs_exist_ok=True)
+        # without input_post every task is a result cache hit, nothing was computed
+        if op_in['input_post'] is not None:
+            overlay_tree(str(op_in['input_post']) + op_in['path'], './')
 
         param_argv = op_in['param']
-        post_equi(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"])
+        result_cache = loadfn(param_argv).get("result_cache", None)
+        if result_cache is not None:
+            restore_cache_hits(list_task_dirs(loadfn(param_argv)["structures"]), result_cache)
+        post_equi(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"], loadfn(param_argv).get("post_workers", 1))
+        if result_cache is not None:
+            store_cache_misses(list_task_dirs(loadfn(param_argv)["structures"]), result_cache)
 
         os.chdir(cwd)
-        shutil.copytree(str(op_in['input_all']) + op_in['path'] + '/confs', './confs', dirs_exist_ok=True)
+        raw = copy_post_output(str(op_in['input_all']) + op_in['path'], loadfn(param_argv)["structures"],
+                               loadfn(param_argv).get("compact_post", False))
 
         op_out = OPIO({
             'output_all': Path(str(op_in["input_all"]) + op_in['path']),
-            'output_post': Path('./confs')
+            'output_post': Path('./confs'),
+            'output_raw': Path(raw) if raw is not None else None
         })
         return op_out
 
@@ -201,7 +213,9 @@ class PropsMakeABACUS(OP):
         structures = loadfn(param_argv)["structures"]
         inter_parameter = loadfn(param_argv)["interaction"]
         parameter = loadfn(param_argv)["properties"]
-        make_property(structures, inter_parameter, parameter)
+        make_property(structures, inter_parameter, parameter, loadfn(param_argv).get("make_workers", 1))
+        # the tasks found in the result cache are not computed again
+        mark_cache_hits(list_task_dirs(structures, parameter), loadfn(param_argv).get("result_cache", None))
 
         conf_dirs = []
         for conf in structures:
@@ -214,11 +228,11 @@ class PropsMakeABACUS(OP):
             conf_dir_global = os.path.join(work_d, ii)
             for jj in prop_list:
                 prop = os.path.join(conf_dir_global, jj)
-                os.chdir(prop)
                 prop_tasks = glob.glob(os.path.join(prop, 'task.*'))
                 prop_tasks.sort()
                 for kk in prop_tasks:
-                    task_list.append(kk)
+                    if not is_cache_hit(kk):
+                        task_list.append(kk)
 
         all_jobs = task_list
         njobs = len(all_jobs)
@@ -258,11 +272,8 @@ class PropsABACUS(OP):
 
     @OP.exec_sign_check
     def execute(self, op_in: OPIO) -> OPIO:
-        cwd = os.getcwd()
-        os.chdir(op_in["input_abacus"])
         cmd = op_in["run_command"]
-        subprocess.call(cmd, shell=True)
-        os.chdir(cwd)
+        subprocess.call(cmd, shell=True, cwd=op_in["input_abacus"])
         op_out = OPIO({
             "output_abacus": op_in["input_abacus"]
         })
@@ -280,7 +291,7 @@ class PropsPostABACUS(OP):
     @classmethod
     def get_input_sign(cls):
         return OPIOSign({
-            'input_post': Artifact(Path, sub_path=False),
+            'input_post': Artifact(Path, sub_path=False, optional=True),
             'input_all': Artifact(Path, sub_path=False),
             'param': Artifact(Path),
             'path': str
@@ -289,22 +300,33 @@ class PropsPostABACUS(OP):
     @classmethod
     def get_output_sign(cls):
         return OPIOSign({
-            'output_post': Artifact(Path, sub_path=False)
+            'output_post': Artifact(Path, sub_path=False),
+            'output_raw': Artifact(Path, sub_path=False, optional=True)
         })
 
     @OP.exec_sign_check
     def execute(self, op_in: OPIO) -> OPIO:
         cwd = os.getcwd()
         os.chdir(str(op_in['input_all']) + op_in['path'])
-        shutil.copytree(str(op_in['input_post']) + op_in['path'], './', dirs_exist_ok=True)
+        # without input_post every task is a result cache hit, nothing was computed
+        if op_in['input_post'] is not None:
+            overlay_tree(str(op_in['input_post']) + op_in['path'], './')
 
         param_argv = op_in["param"]
-        post_property(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"], loadfn(param_argv)["properties"])
+        result_cache = loadfn(param_argv).get("result_cache", None)
+        task_dirs = list_task_dirs(loadfn(param_argv)["structures"], loadfn(param_argv)["properties"])
+        if result_cache is not None:
+            restore_cache_hits(task_dirs, result_cache)
+        post_property(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"], loadfn(param_argv)["properties"], loadfn(param_argv).get("post_workers", 1))
+        if result_cache is not None:
+            store_cache_misses(task_dirs, result_cache)
 
         os.chdir(cwd)
-        shutil.copytree(str(op_in['input_all']) + op_in['path'] + '/confs', './confs', dirs_exist_ok=True)
+        raw = copy_post_output(str(op_in['input_all']) + op_in['path'], loadfn(param_argv)["structures"],
+                               loadfn(param_argv).get("compact_post", False))
 
         op_out = OPIO({
-            'output_post': Path('./confs')
+            'output_post': Path('./confs'),
+            'output_raw': Path(raw) if raw is not None else None
         })
         return op_out
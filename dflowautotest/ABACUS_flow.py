@@ -103,8 +103,9 @@ class ABACUSFlow(Flow):
 
         relaxmake = Step(
             name="Relaxmake",
+            key=self.key_prefix + "relaxmake",
             template=PythonOPTemplate(RelaxMakeABACUS, image=self.dpgen_image_name, command=["python3"]),
-            artifacts={"input": upload_artifact(work_dir),
+            artifacts={"input": self.upload_work_dir(work_dir),
                        "param": upload_artifact(self.relax_param)},
         )
         self.relaxmake = relaxmake
@@ -120,13 +121,14 @@ class ABACUSFlow(Flow):
             artifacts={"input_abacus": relaxmake.outputs.artifacts["task_paths"]},
             parameters={"run_command": self.abacus_run_command},
             with_param=argo_range(relaxmake.outputs.parameters["njobs"]),
-            key="ABACUS-Cal-{{item}}",
+            key=self.key_prefix + "relax-abacus-cal-{{item}}",
             executor=self.dispatcher_executor
         )
         self.relaxcal = relaxcal
 
         relaxpost = Step(
             name="Relaxpost",
+            key=self.key_prefix + "relaxpost",
             template=PythonOPTemplate(RelaxPostABACUS, image=self.dpgen_image_name, command=["python3"]),
             artifacts={"input_post": relaxcal.outputs.artifacts["output_abacus"],
                        "input_all": relaxmake.outputs.artifacts["output"],
@@ -138,6 +140,7 @@ class ABACUSFlow(Flow):
         if self.do_relax:
             propsmake = Step(
                 name="Propsmake",
+                key=self.key_prefix + "propsmake",
                 template=PythonOPTemplate(PropsMakeABACUS, image=self.dpgen_image_name, command=["python3"]),
                 artifacts={"input": relaxpost.outputs.artifacts["output_all"],
                            "param": upload_artifact(self.props_param)},
@@ -146,8 +149,9 @@ class ABACUSFlow(Flow):
         else:
             propsmake = Step(
                 name="Propsmake",
+                key=self.key_prefix + "propsmake",
                 template=PythonOPTemplate(PropsMakeABACUS, image=self.dpgen_image_name, command=["python3"]),
-                artifacts={"input": upload_artifact(work_dir),
+                artifacts={"input": self.upload_work_dir(work_dir),
                            "param": upload_artifact(self.props_param)},
             )
             self.propsmake = propsmake
@@ -162,13 +166,14 @@ class ABACUSFlow(Flow):
             artifacts={"input_abacus": propsmake.outputs.artifacts["task_paths"]},
             parameters={"run_command": self.abacus_run_command},
             with_param=argo_range(propsmake.outputs.parameters["njobs"]),
-            key="ABACUS-Cal-{{item}}",
+            key=self.key_prefix + "props-abacus-cal-{{item}}",
             executor=self.dispatcher_executor
         )
         self.propscal = propscal
 
         propspost = Step(
             name="Propspost",
+            key=self.key_prefix + "propspost",
             template=PythonOPTemplate(PropsPostABACUS, image=self.dpgen_image_name, command=["python3"]),
             artifacts={"input_post": propscal.outputs.artifacts["output_abacus"],
                        "input_all": propsmake.outputs.artifacts["output"],
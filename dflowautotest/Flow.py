@@ -1,13 +1,25 @@
-import time
+import glob
+import os
+import re
+import tempfile
 from abc import ABC, abstractmethod
-from monty.serialization import loadfn
+from monty.serialization import loadfn, dumpfn
 
-from dflow import download_artifact, Workflow
+from dflow import Workflow, Step, Steps, OutputArtifact
+from dflow.python import PythonOPTemplate
 
 from dflowautotest.lib.utils import identify_task
+from dflowautotest.lib.monitor import WorkflowMonitor
+from dflowautotest.lib.manifest import input_manifest, upload_manifest
+from dflowautotest.Pipeline_OPs import MergeConfs
 
 
 class Flow(ABC):
+    # the workflow submitted last from the working directory
+    record_file = 'workflow_record.json'
+    # the models are uploaded by upload_models instead of with the work directory
+    separate_models = False
+
     def __init__(self, args):
         # identify type of flow and input parameter file
         num_args = len(args.files)
@@ -36,6 +48,19 @@ class Flow(ABC):
         else:
             raise ValueError('A maximum of two input arguments is allowed')
 
+        # optional step between self.propsmake and self.propscal
+        self.propsschedule = None
+        # resume the workflow in self.record_file
+        self.resume = getattr(args, 'resume', False)
+        # one relax -> props sub-workflow per conf instead of a global relax barrier
+        self.pipeline = getattr(args, 'pipeline', False)
+        # the input files of the work directory are uploaded once and shared by all the steps
+        self.work_artifact = None
+        # prepended to the step keys, unique for each conf of a pipeline
+        self.key_prefix = ''
+        # the per-conf param files of a pipeline, removed after generate_flow
+        self.param_dir = None
+
         if self.do_relax:
             self.flow_type = 'joint'
         elif not self.props_param:
@@ -50,44 +75,156 @@ class Flow(ABC):
         IMPORTANT: total six steps are required to be defined as attributes in this method,
         and should be named strictly by self.relaxmake; self.relaxcal; self.relaxpost;
         self.propsmake; self.propscal; self.propspost.
+        The optional self.propsschedule runs between self.propsmake and self.propscal.
+        The step keys start with self.key_prefix, so that init_steps can be called once per conf.
         """
         pass
 
+    def upload_work_dir(self, work_dir):
+        """
+        Upload the files of work_dir (the cwd) referenced by the param files
+        """
+        if self.work_artifact is None:
+            self.work_artifact = upload_manifest(input_manifest(self.relax_param, self.props_param,
+                                                                model=not self.separate_models))
+        return self.work_artifact
+
+    def init_pipeline(self):
+        """
+        Define one relax -> props sub-workflow per conf of a joint flow, so that the
+        properties of a conf start as soon as its own relaxation is done, and the
+        self.confsmerge step that merges their results.
+        The steps of each conf are made by self.init_steps with the param files
+        restricted to the conf.
+        """
+        if self.flow_type != 'joint':
+            raise RuntimeError('the pipeline needs both the relaxation and the property json files')
+        relax_param, props_param = self.relax_param, self.props_param
+        relax_confs, props_confs = set(), set()
+        for conf in loadfn(relax_param)["structures"]:
+            relax_confs.update([os.path.normpath(ii) for ii in glob.glob(conf)])
+        for conf in loadfn(props_param)["structures"]:
+            props_confs.update([os.path.normpath(ii) for ii in glob.glob(conf)])
+        if relax_confs != props_confs:
+            raise RuntimeError('the pipeline needs the same confs in both json files, only relaxed: %s, '
+                               'only computed: %s' % (' '.join(sorted(relax_confs - props_confs)),
+                                                     ' '.join(sorted(props_confs - relax_confs))))
+        conf_dirs = sorted(relax_confs)
+        if len(conf_dirs) == 0:
+            raise RuntimeError('no conf matches the structures of the json files')
+
+        # the files of all the confs in one bundle
+        self.upload_work_dir(os.getcwd())
+        self.param_dir = param_dir = tempfile.mkdtemp(prefix='dflowautotest-')
+        self.conf_steps = []
+        for kk, conf in enumerate(conf_dirs):
+            prefix = 'conf-%03d' % kk
+            self.relax_param = os.path.join(param_dir, prefix + '-relax.json')
+            self.props_param = os.path.join(param_dir, prefix + '-props.json')
+            dumpfn(dict(loadfn(relax_param), structures=[conf]), self.relax_param, indent=4)
+            dumpfn(dict(loadfn(props_param), structures=[conf]), self.props_param, indent=4)
+            self.key_prefix = prefix + '-'
+            self.init_steps()
+            pipe = Steps(name=prefix)
+            for ii in self.stage_steps():
+                pipe.add(ii)
+            pipe.outputs.artifacts['output_post'] = OutputArtifact(
+                _from=self.propspost.outputs.artifacts['output_post'])
+            self.conf_steps.append(Step(name='Conf-%03d' % kk, template=pipe))
+        self.relax_param, self.props_param = relax_param, props_param
+        self.key_prefix = ''
+
+        self.confsmerge = Step(
+            name="Confsmerge",
+            key="confsmerge",
+            template=PythonOPTemplate(MergeConfs, image=self.dpgen_image_name, command=["python3"]),
+            artifacts={"input_posts": [ii.outputs.artifacts["output_post"] for ii in self.conf_steps]},
+            parameters={"conf_dirs": conf_dirs}
+        )
+
     @staticmethod
-    def assertion(wf, task_type):
-        while wf.query_status() in ["Pending", "Running"]:
-            time.sleep(4)
-        assert (wf.query_status() == 'Succeeded')
-        step = wf.query_step(name=f"{task_type}post")[0]
-        download_artifact(step.outputs.artifacts["output_post"])
+    def assertion(wf, post_step):
+        monitor = WorkflowMonitor()
+        monitor.watch(wf, post_step)
+        assert (monitor.run()[wf.id] == 'Succeeded')
 
-    def generate_flow(self):
-        if self.flow_type == 'relax':
-            wf = Workflow(name='relaxation')
-            wf.add(self.relaxmake)
-            wf.add(self.relaxcal)
-            wf.add(self.relaxpost)
-            wf.submit()
-            self.assertion(wf, 'Relax')
-
-        elif self.flow_type == 'props':
-            wf = Workflow(name='properties')
-            wf.add(self.propsmake)
-            wf.add(self.propscal)
-            wf.add(self.propspost)
-            wf.submit()
-            self.assertion(wf, 'Props')
-
-        elif self.flow_type == 'joint':
-            wf = Workflow(name='relax-props')
-            wf.add(self.relaxmake)
-            wf.add(self.relaxcal)
-            wf.add(self.relaxpost)
-            wf.add(self.propsmake)
-            wf.add(self.propscal)
-            wf.add(self.propspost)
-            wf.submit()
-            self.assertion(wf, 'Props')
+    def stage_steps(self):
+        """
+        The steps of the flow type made by self.init_steps, in order
+        """
+        relax = [self.relaxmake, self.relaxcal, self.relaxpost]
+        props = [self.propsmake, self.propsschedule, self.propscal, self.propspost]
+        steps = {'relax': relax, 'props': props, 'joint': relax + props}[self.flow_type]
+        return [ii for ii in steps if ii is not None]
+
+    def flow_steps(self):
+        """
+        The steps of the workflow in order (a list is a parallel group) and
+        the name of the step whose output_post is downloaded
+        """
+        if self.pipeline:
+            return [self.conf_steps, self.confsmerge], 'Confsmerge'
+        elif self.flow_type == 'relax':
+            return self.stage_steps(), 'Relaxpost'
+        else:
+            return self.stage_steps(), 'Propspost'
+
+    @staticmethod
+    def step_keys(steps):
+        """
+        The keys of the steps, including those in parallel groups and sub-workflows
+        """
+        keys = []
+        for ii in steps:
+            if isinstance(ii, list):
+                keys.extend(Flow.step_keys(ii))
+            elif isinstance(ii.template, Steps):
+                keys.extend(Flow.step_keys(ii.template.steps))
+            elif ii.key is not None:
+                keys.append(ii.key)
+        return keys
 
+    def reusable_steps(self, record):
+        """
+        The succeeded steps of the recorded workflow whose keys match the recorded
+        step keys, a sliced step matches once per finished slice
+        """
+        patterns = [re.compile(re.escape(ii).replace(re.escape('{{item}}'), r'\d+') + '$')
+                    for ii in record['step_keys']]
+        old_wf = Workflow(id=record['workflow_id'])
+        reuse = [ii for ii in old_wf.query_step(phase='Succeeded')
+                 if ii.key is not None and any([jj.match(ii.key) for jj in patterns])]
+        print('reusing %d succeeded steps of workflow %s: %s'
+              % (len(reuse), record['workflow_id'], ' '.join(sorted([ii.key for ii in reuse]))))
+        return reuse
 
+    def generate_flow(self):
+        names = {'relax': 'relaxation', 'props': 'properties', 'joint': 'relax-props'}
+        steps, post_step = self.flow_steps()
+        reuse = None
+        if self.resume:
+            if not os.path.isfile(self.record_file):
+                raise RuntimeError('no %s to resume from' % self.record_file)
+            record = loadfn(self.record_file)
+            if record['flow_type'] != self.flow_type:
+                raise RuntimeError('the recorded workflow is a %s flow, not %s'
+                                   % (record['flow_type'], self.flow_type))
+            old_wf = Workflow(id=record['workflow_id'])
+            if old_wf.query_status() in ['Pending', 'Running', 'Succeeded']:
+                # still alive (or already done): re-attach instead of resubmitting
+                print('re-attaching to workflow %s' % record['workflow_id'])
+                self.assertion(old_wf, post_step)
+                return
+            reuse = self.reusable_steps(record)
 
+        wf = Workflow(name=names[self.flow_type])
+        for ii in steps:
+            wf.add(ii)
+        wf.submit(reuse_step=reuse)
+        # everything needed to resume this workflow later
+        dumpfn({
+            'workflow_id': wf.id,
+            'flow_type': self.flow_type,
+            'step_keys': self.step_keys(steps)
+        }, self.record_file, indent=4)
+        self.assertion(wf, post_step)
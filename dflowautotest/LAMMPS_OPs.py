@@ -5,21 +5,29 @@ from dflow.python import (
     OPIOSign,
     Artifact,
     Slices,
+    Parameter,
     upload_packages
 )
 
 import subprocess, os, shutil, glob, dpdata, pathlib
 from pathlib import Path
 from typing import List
-from monty.serialization import loadfn
+from monty.serialization import dumpfn, loadfn
 from dflow.python import upload_packages
 upload_packages.append(__file__)
 
-from dflowautotest.lib.utils import return_prop_list
+from dflowautotest.lib.utils import (return_prop_list, estimate_task_cost, pack_tasks,
+                                     stage_slice, merge_slice, run_task_pool,
+                                     link_models, strip_model_links, link_task_models,
+                                     copy_post_output, overlay_tree)
+from dflowautotest.lib.manifest import model_files
+from dflowautotest.lib.cache import (list_task_dirs, mark_cache_hits, is_cache_hit,
+                                     restore_cache_hits, store_cache_misses)
 
 try:
     from dflowautotest.auto_test.common_equi import (make_equi, post_equi)
     from dflowautotest.auto_test.common_prop import (make_property, post_property)
+    from dflowautotest.auto_test.ASE import run_ase_task
 except:
     pass
 
@@ -35,7 +43,8 @@ class RelaxMakeLAMMPS(OP):
     def get_input_sign(cls):
         return OPIOSign({
             'input': Artifact(Path),
-            'param': Artifact(Path)
+            'param': Artifact(Path),
+            'model': Artifact(List[Path], optional=True)
         })
 
     @classmethod
@@ -60,7 +69,15 @@ class RelaxMakeLAMMPS(OP):
         inter_parameter = loadfn(param_argv)["interaction"]
         parameter = loadfn(param_argv)["relaxation"]
 
-        make_equi(structures, inter_parameter, parameter)
+        # the models are a separate artifact, linked where the interaction expects them
+        model_links = link_models(op_in["model"], model_files(inter_parameter)) if op_in["model"] else []
+        make_equi(structures, inter_parameter, parameter, loadfn(param_argv).get("make_workers", 1))
+        # the tasks found in the result cache are not computed again
+        mark_cache_hits(list_task_dirs(structures), loadfn(param_argv).get("result_cache", None))
+        if op_in["model"]:
+            strip_model_links(list_task_dirs(structures), model_files(inter_parameter))
+        for ii in model_links:
+            os.remove(ii)
 
         conf_dirs = []
         for conf in structures:
@@ -70,7 +87,8 @@ class RelaxMakeLAMMPS(OP):
         task_list = []
         for ii in conf_dirs:
             conf_dir_global = os.path.join(work_d, ii)
-            task_list.append(os.path.join(conf_dir_global, 'relaxation/relax_task'))
+            if not is_cache_hit(os.path.join(ii, 'relaxation/relax_task')):
+                task_list.append(os.path.join(conf_dir_global, 'relaxation/relax_task'))
 
         all_jobs = task_list
         njobs = len(all_jobs)
@@ -99,7 +117,10 @@ class RelaxLAMMPS(OP):
     def get_input_sign(cls):
         return OPIOSign({
             'input_lammps': Artifact(Path),
-            'run_command': str
+            'model': Artifact(List[Path], optional=True),
+            'run_command': str,
+            'run_workers': Parameter(int, default=1),
+            'run_envs': Parameter(list, default=[])
         })
 
     @classmethod
@@ -110,11 +131,19 @@ class RelaxLAMMPS(OP):
 
     @OP.exec_sign_check
     def execute(self, op_in: OPIO) -> OPIO:
-        cwd = os.getcwd()
-        os.chdir(op_in["input_lammps"])
         cmd = op_in["run_command"]
-        subprocess.call(cmd, shell=True)
-        os.chdir(cwd)
+        task_dir = str(op_in["input_lammps"])
+        # the models are linked for the run only, they are not output
+        model_links = link_task_models(task_dir, op_in["model"] or [])
+        if loadfn(os.path.join(task_dir, "inter.json"))["type"] == "ase":
+            # computed in this process, no lammps run
+            run_ase_task(task_dir)
+        else:
+            exit_code = run_task_pool(cmd, [task_dir], 1, op_in["run_envs"])[0]
+            if exit_code != 0:
+                print("%s exited with %d in %s" % (cmd, exit_code, task_dir))
+        for ii in model_links:
+            os.remove(ii)
         op_out = OPIO({
             "output_lammps": op_in["input_lammps"]
         })
@@ -132,7 +161,7 @@ class RelaxPostLAMMPS(OP):
     @classmethod
     def get_input_sign(cls):
         return OPIOSign({
-            'input_post': Artifact(Path, sub_path=False),
+            'input_post': Artifact(Path, sub_path=False, optional=True),
             'input_all': Artifact(Path, sub_path=False),
             'param': Artifact(Path),
             'path': str
@@ -142,35 +171,34 @@ class RelaxPostLAMMPS(OP):
     def get_output_sign(cls):
         return OPIOSign({
             'output_all': Artifact(Path, sub_path=False),
-            'output_post': Artifact(Path, sub_path=False)
+            'output_post': Artifact(Path, sub_path=False),
+            'output_raw': Artifact(Path, sub_path=False, optional=True)
         })
 
     @OP.exec_sign_check
     def execute(self, op_in: OPIO) -> OPIO:
         cwd = os.getcwd()
         os.chdir(str(op_in['input_all'])+op_in['path'])
-        shutil.copytree(str(op_in['input_post']) + op_in['path'], './', dirs_exist_ok=True)
+        # without input_post every task is a result cache hit, nothing was computed
+        if op_in['input_post'] is not None:
+            overlay_tree(str(op_in['input_post']) + op_in['path'], './')
 
         param_argv = op_in['param']
-        post_equi(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"])
-
-        conf_dirs = []
-        for conf in loadfn(param_argv)["structures"]:
-            conf_dirs.extend(glob.glob(conf))
-        conf_dirs.sort()
-
-        for ii in conf_dirs:
-            os.chdir(os.path.join(ii, 'relaxation/relax_task'))
-            cmd = 'rm *.pb'
-            subprocess.call(cmd, shell=True)
-            os.chdir("../../../../")
+        result_cache = loadfn(param_argv).get("result_cache", None)
+        if result_cache is not None:
+            restore_cache_hits(list_task_dirs(loadfn(param_argv)["structures"]), result_cache)
+        post_equi(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"], loadfn(param_argv).get("post_workers", 1))
+        if result_cache is not None:
+            store_cache_misses(list_task_dirs(loadfn(param_argv)["structures"]), result_cache)
 
         os.chdir(cwd)
-        shutil.copytree(str(op_in['input_all']) + op_in['path'] + '/confs', './confs', dirs_exist_ok = True)
+        raw = copy_post_output(str(op_in['input_all']) + op_in['path'], loadfn(param_argv)["structures"],
+                               loadfn(param_argv).get("compact_post", False))
 
         op_out = OPIO({
             'output_all': Path(str(op_in["input_all"])+op_in['path']),
-            'output_post': Path('./confs')
+            'output_post': Path('./confs'),
+            'output_raw': Path(raw) if raw is not None else None
         })
         return op_out
 
@@ -186,7 +214,8 @@ class PropsMakeLAMMPS(OP):
     def get_input_sign(cls):
         return OPIOSign({
             'input': Artifact(Path),
-            'param': Artifact(Path)
+            'param': Artifact(Path),
+            'model': Artifact(List[Path], optional=True)
         })
 
     @classmethod
@@ -210,7 +239,15 @@ class PropsMakeLAMMPS(OP):
         structures = loadfn(param_argv)["structures"]
         inter_parameter = loadfn(param_argv)["interaction"]
         parameter = loadfn(param_argv)["properties"]
-        make_property(structures, inter_parameter, parameter)
+        # the models are a separate artifact, linked where the interaction expects them
+        model_links = link_models(op_in["model"], model_files(inter_parameter)) if op_in["model"] else []
+        make_property(structures, inter_parameter, parameter, loadfn(param_argv).get("make_workers", 1))
+        # the tasks found in the result cache are not computed again
+        mark_cache_hits(list_task_dirs(structures, parameter), loadfn(param_argv).get("result_cache", None))
+        if op_in["model"]:
+            strip_model_links(list_task_dirs(structures, parameter), model_files(inter_parameter))
+        for ii in model_links:
+            os.remove(ii)
 
         conf_dirs = []
         for conf in structures:
@@ -239,6 +276,86 @@ class PropsMakeLAMMPS(OP):
         return op_out
 
 
+class PropsScheduleLAMMPS(OP):
+    """
+    class for packing the property tasks into slices of balanced cost
+    """
+    def __init__(self):
+        pass
+
+    @classmethod
+    def get_input_sign(cls):
+        return OPIOSign({
+            'input': Artifact(Path),
+            'param': Artifact(Path)
+        })
+
+    @classmethod
+    def get_output_sign(cls):
+        return OPIOSign({
+            'manifest': Artifact(Path),
+            'njobs': int,
+            'task_paths': Artifact(List[Path])
+        })
+
+    @OP.exec_sign_check
+    def execute(
+            self,
+            op_in: OPIO,
+    ) -> OPIO:
+        cwd = os.getcwd()
+
+        os.chdir(op_in["input"])
+        work_d = os.getcwd()
+        param_argv = op_in["param"]
+        structures = loadfn(param_argv)["structures"]
+        parameter = loadfn(param_argv)["properties"]
+
+        conf_dirs = []
+        for conf in structures:
+            conf_dirs.extend(glob.glob(conf))
+        conf_dirs.sort()
+
+        prop_list = return_prop_list(parameter)
+        task_list = []
+        for ii in conf_dirs:
+            for jj in prop_list:
+                task_list.extend([kk for kk in sorted(glob.glob(os.path.join(ii, jj, 'task.*')))
+                                  if not is_cache_hit(kk)])
+
+        # one slice per property of each conf by default
+        n_slices = loadfn(param_argv).get("n_slices", len(conf_dirs) * len(prop_list))
+        costs = [estimate_task_cost(ii, loadfn(param_argv).get("cost_weights", None))
+                 for ii in task_list]
+        slices = pack_tasks(costs, n_slices)
+
+        if os.path.isdir('slices'):
+            shutil.rmtree('slices')
+        os.makedirs('slices')
+        manifest = []
+        jobs = []
+        for kk, ii in enumerate(slices):
+            slice_dir = os.path.join('slices', 'slice.%03d' % kk)
+            stage_slice([task_list[jj] for jj in ii], slice_dir)
+            manifest.append({
+                'slice': slice_dir,
+                'cost': sum([costs[jj] for jj in ii]),
+                'tasks': [task_list[jj] for jj in ii]
+            })
+            jobs.append(pathlib.Path(os.path.join(work_d, slice_dir)))
+        dumpfn(manifest, os.path.join('slices', 'manifest.json'), indent=4)
+        print('%d tasks in %d slices, makespan %.1f of total cost %.1f'
+              % (len(task_list), len(slices), max([ii['cost'] for ii in manifest] + [0]), sum(costs)))
+
+        os.chdir(cwd)
+        op_out = OPIO({
+            "manifest": pathlib.Path(os.path.join(work_d, 'slices', 'manifest.json')),
+            "njobs": len(jobs),
+            "task_paths": jobs
+        })
+        return op_out
+
+
 class PropsLAMMPS(OP):
     """
     class for LAMMPS calculation
@@ -251,7 +368,10 @@ class PropsLAMMPS(OP):
     def get_input_sign(cls):
         return OPIOSign({
             'input_lammps': Artifact(Path),
-            'run_command': str
+            'model': Artifact(List[Path], optional=True),
+            'run_command': str,
+            'run_workers': Parameter(int, default=1),
+            'run_envs': Parameter(list, default=[])
         })
 
     @classmethod
@@ -262,12 +382,32 @@ class PropsLAMMPS(OP):
 
     @OP.exec_sign_check
     def execute(self, op_in: OPIO) -> OPIO:
-        cwd = os.getcwd()
-        os.chdir(op_in["input_lammps"])
         lmp = op_in["run_command"]
-        cmd = "for ii in task.*; do cd $ii; " + lmp + "; cd ..; done"
-        subprocess.call(cmd, shell=True)
-        os.chdir(cwd)
+        slice_json = os.path.join(op_in["input_lammps"], "slice.json")
+        if os.path.isfile(slice_json):
+            # a slice of the schedule, run in the planned order
+            task_dirs = [os.path.join(op_in["input_lammps"], ii) for ii in loadfn(slice_json)]
+        else:
+            task_dirs = [ii for ii in sorted(glob.glob(os.path.join(op_in["input_lammps"], "task.*")))
+                         if not is_cache_hit(ii)]
+        # the models are linked for the run only, they are not output
+        model_links = []
+        for ii in task_dirs:
+            model_links.extend(link_task_models(ii, op_in["model"] or []))
+        lmp_dirs = []
+        for ii in task_dirs:
+            if loadfn(os.path.join(ii, "inter.json"))["type"] == "ase":
+                # computed in this process, no lammps run
+                run_ase_task(ii)
+            else:
+                lmp_dirs.append(ii)
+        # up to run_workers lammps processes at a time
+        exit_codes = run_task_pool(lmp, lmp_dirs, op_in["run_workers"], op_in["run_envs"])
+        for ii, jj in zip(lmp_dirs, exit_codes):
+            if jj != 0:
+                print("%s exited with %d in %s" % (lmp, jj, ii))
+        for ii in model_links:
+            os.remove(ii)
         op_out = OPIO({
             "output_lammps": op_in["input_lammps"]
         })
@@ -285,7 +425,7 @@ class PropsPostLAMMPS(OP):
     @classmethod
     def get_input_sign(cls):
         return OPIOSign({
-            'input_post': Artifact(Path, sub_path=False),
+            'input_post': Artifact(Path, sub_path=False, optional=True),
             'input_all': Artifact(Path, sub_path=False),
             'param': Artifact(Path),
             'path': str
@@ -294,35 +434,39 @@ class PropsPostLAMMPS(OP):
     @classmethod
     def get_output_sign(cls):
         return OPIOSign({
-            'output_post': Artifact(Path, sub_path=False)
+            'output_post': Artifact(Path, sub_path=False),
+            'output_raw': Artifact(Path, sub_path=False, optional=True)
         })
 
     @OP.exec_sign_check
     def execute(self, op_in: OPIO) -> OPIO:
         cwd = os.getcwd()
         os.chdir(str(op_in['input_all'])+op_in['path'])
-        shutil.copytree(str(op_in['input_post']) + op_in['path'], './', dirs_exist_ok=True)
+        # without input_post every task is a result cache hit, nothing was computed
+        if op_in['input_post'] is not None:
+            overlay_tree(str(op_in['input_post']) + op_in['path'], './')
 
-        param_argv = op_in["param"]
-        post_property(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"], loadfn(param_argv)["properties"])
+        # put the outputs of the scheduled slices back in place
+        if os.path.isdir('slices'):
+            for ii in sorted(glob.glob(os.path.join('slices', 'slice.*'))):
+                merge_slice(ii, './')
+            shutil.rmtree('slices')
 
-        conf_dirs = []
-        for conf in loadfn(param_argv)["structures"]:
-            conf_dirs.extend(glob.glob(conf))
-        conf_dirs.sort()
-
-        prop_list = return_prop_list(loadfn(param_argv)["properties"])
-        for ii in conf_dirs:
-            for jj in prop_list:
-                os.chdir(os.path.join(ii,jj))
-                cmd = "for kk in task.*; do cd $kk; rm *.pb; cd ..; done"
-                subprocess.call(cmd, shell=True)
-                os.chdir('../../../')
+        param_argv = op_in["param"]
+        result_cache = loadfn(param_argv).get("result_cache", None)
+        task_dirs = list_task_dirs(loadfn(param_argv)["structures"], loadfn(param_argv)["properties"])
+        if result_cache is not None:
+            restore_cache_hits(task_dirs, result_cache)
+        post_property(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"], loadfn(param_argv)["properties"], loadfn(param_argv).get("post_workers", 1))
+        if result_cache is not None:
+            store_cache_misses(task_dirs, result_cache)
 
         os.chdir(cwd)
-        shutil.copytree(str(op_in['input_all']) + op_in['path'] + '/confs', './confs', dirs_exist_ok=True)
+        raw = copy_post_output(str(op_in['input_all']) + op_in['path'], loadfn(param_argv)["structures"],
+                               loadfn(param_argv).get("compact_post", False))
 
         op_out = OPIO({
-            'output_post': Path('./confs')
+            'output_post': Path('./confs'),
+            'output_raw': Path(raw) if raw is not None else None
         })
         return op_out
@@ -27,10 +27,12 @@ from dflowautotest.LAMMPS_OPs import (
     RelaxLAMMPS,
     RelaxPostLAMMPS,
     PropsMakeLAMMPS,
+    PropsScheduleLAMMPS,
     PropsLAMMPS,
     PropsPostLAMMPS
 )
 from dflowautotest.Flow import Flow
+from dflowautotest.lib.manifest import upload_models
 
 upload_packages.append(__file__)
 
@@ -38,6 +40,9 @@ class LAMMPSFlow(Flow):
     """
     Generate autotest workflow and automatically submit lammps jobs according to user input arguments.
     """
+    # the model artifact is shared by the slices, it is not copied into the tasks
+    separate_models = True
+
     def __init__(self, args):
         super().__init__(args)
         # initiate params defined in global.json
@@ -55,6 +60,9 @@ class LAMMPSFlow(Flow):
         self.cpu_scass_type = global_param.get("cpu_scass_type", None)
         self.gpu_scass_type = global_param.get("gpu_scass_type", None)
         self.lammps_run_command = global_param.get("lammps_run_command", None)
+        # concurrent lammps processes in a slice and the environment of each
+        self.lammps_run_workers = global_param.get("lammps_run_workers", 1)
+        self.lammps_run_envs = global_param.get("lammps_run_envs", [])
         self.vasp_run_command = global_param.get("vasp_run_command", None)
         self.abacus_run_command = global_param.get("abacus_run_command", None)
         self.upload_python_packages = global_param.get("upload_python_packages", None)
@@ -100,12 +108,16 @@ class LAMMPSFlow(Flow):
     def init_steps(self):
         cwd = os.getcwd()
         work_dir = cwd
+        relax_models = upload_models(self.relax_param) if self.relax_param else None
+        props_models = upload_models(self.props_param) if self.props_param else None
 
         relaxmake = Step(
             name="Relaxmake",
+            key=self.key_prefix + "relaxmake",
             template=PythonOPTemplate(RelaxMakeLAMMPS, image=self.dpgen_image_name, command=["python3"]),
-            artifacts={"input": upload_artifact(work_dir),
-                       "param": upload_artifact(self.relax_param)},
+            artifacts={"input": self.upload_work_dir(work_dir),
+                       "param": upload_artifact(self.relax_param),
+                       "model": relax_models},
         )
         self.relaxmake = relaxmake
 
@@ -117,16 +129,20 @@ class LAMMPSFlow(Flow):
         relaxcal = Step(
             name="RelaxLAMMPS-Cal",
             template=relax,
-            artifacts={"input_lammps": relaxmake.outputs.artifacts["task_paths"]},
-            parameters={"run_command": self.lammps_run_command},
+            artifacts={"input_lammps": relaxmake.outputs.artifacts["task_paths"],
+                       "model": relax_models},
+            parameters={"run_command": self.lammps_run_command,
+                        "run_workers": self.lammps_run_workers,
+                        "run_envs": self.lammps_run_envs},
             with_param=argo_range(relaxmake.outputs.parameters["njobs"]),
-            key="LAMMPS-Cal-{{item}}",
+            key=self.key_prefix + "relax-lammps-cal-{{item}}",
             executor=self.dispatcher_executor
         )
         self.relaxcal = relaxcal
 
         relaxpost = Step(
             name="Relaxpost",
+            key=self.key_prefix + "relaxpost",
             template=PythonOPTemplate(RelaxPostLAMMPS, image=self.dpgen_image_name, command=["python3"]),
             artifacts={"input_post": relaxcal.outputs.artifacts["output_lammps"],
                        "input_all": relaxmake.outputs.artifacts["output"],
@@ -138,19 +154,32 @@ class LAMMPSFlow(Flow):
         if self.do_relax:
             propsmake = Step(
                 name="Propsmake",
+                key=self.key_prefix + "propsmake",
                 template=PythonOPTemplate(PropsMakeLAMMPS, image=self.dpgen_image_name, command=["python3"]),
                 artifacts={"input": relaxpost.outputs.artifacts["output_all"],
-                           "param": upload_artifact(self.props_param)},
+                           "param": upload_artifact(self.props_param),
+                           "model": props_models},
             )
         else:
             propsmake = Step(
                 name="Propsmake",
+                key=self.key_prefix + "propsmake",
                 template=PythonOPTemplate(PropsMakeLAMMPS, image=self.dpgen_image_name, command=["python3"]),
-                artifacts={"input": upload_artifact(work_dir),
-                           "param": upload_artifact(self.props_param)},
+                artifacts={"input": self.upload_work_dir(work_dir),
+                           "param": upload_artifact(self.props_param),
+                           "model": props_models},
             )
         self.propsmake = propsmake
 
+        propsschedule = Step(
+            name="Propsschedule",
+            key=self.key_prefix + "propsschedule",
+            template=PythonOPTemplate(PropsScheduleLAMMPS, image=self.dpgen_image_name, command=["python3"]),
+            artifacts={"input": propsmake.outputs.artifacts["output"],
+                       "param": upload_artifact(self.props_param)},
+        )
+        self.propsschedule = propsschedule
+
         props = PythonOPTemplate(PropsLAMMPS,
                                  slices=Slices("{{item}}", input_artifact=["input_lammps"],
                                                output_artifact=["output_lammps"]), image=self.dpmd_image_name, command=["python3"])
@@ -158,16 +187,20 @@ class LAMMPSFlow(Flow):
         propscal = Step(
             name="PropsLAMMPS-Cal",
             template=props,
-            artifacts={"input_lammps": propsmake.outputs.artifacts["task_paths"]},
-            parameters={"run_command": self.lammps_run_command},
-            with_param=argo_range(propsmake.outputs.parameters["njobs"]),
-            key="LAMMPS-Cal-{{item}}",
+            artifacts={"input_lammps": propsschedule.outputs.artifacts["task_paths"],
+                       "model": props_models},
+            parameters={"run_command": self.lammps_run_command,
+                        "run_workers": self.lammps_run_workers,
+                        "run_envs": self.lammps_run_envs},
+            with_param=argo_range(propsschedule.outputs.parameters["njobs"]),
+            key=self.key_prefix + "props-lammps-cal-{{item}}",
             executor=self.dispatcher_executor
         )
         self.propscal = propscal
 
         propspost = Step(
             name="Propspost",
+            key=self.key_prefix + "propspost",
             template=PythonOPTemplate(PropsPostLAMMPS, image=self.dpgen_image_name, command=["python3"]),
             artifacts={"input_post": propscal.outputs.artifacts["output_lammps"],
                        "input_all": propsmake.outputs.artifacts["output"],
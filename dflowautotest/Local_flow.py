@@ -0,0 +1,183 @@
+import os, shutil, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from monty.serialization import loadfn, dumpfn
+from dflow.python import OPIO
+from dflow.python import upload_packages
+from dflowautotest.Flow import Flow
+from dflowautotest.lib.manifest import input_manifest, model_files, _link
+
+upload_packages.append(__file__)
+
+
+def run_op(op_class, op_in):
+    """
+    Execute the OP on op_in in this process, return its outputs and the wall time
+    """
+    start = time.time()
+    op_out = op_class().execute(OPIO(op_in))
+    return dict(op_out), time.time() - start
+
+
+class LocalFlow(Flow):
+    """
+    Run the autotest workflow on this machine with the same OPs as the dflow workflows.
+    The work directory is staged from the same input files as the uploaded bundle,
+    every artifact passed between two steps is copied into the stage directory of the
+    receiving step, keeping its absolute path as dflow does, and the calculation
+    slices run concurrently in a process pool.
+    """
+    def __init__(self, args, engine):
+        super().__init__(args)
+        if self.pipeline or self.resume:
+            raise RuntimeError('--pipeline and --resume are not supported by the local executor')
+        global_param = loadfn("global.json")
+        self.engine = engine
+        # the LAMMPS OPs take the models as an artifact, as in LAMMPSFlow
+        self.separate_models = engine == 'lammps'
+        self.run_command = global_param.get(f"{engine}_run_command", None)
+        self.lammps_run_workers = global_param.get("lammps_run_workers", 1)
+        self.lammps_run_envs = global_param.get("lammps_run_envs", [])
+        # concurrent calculation slices
+        self.local_workers = global_param.get("local_workers", os.cpu_count())
+        self.stage_dir = global_param.get("local_stage_dir", None)
+        self.timings = []
+
+    def init_steps(self):
+        """
+        The OPs of the steps, and the artifact and parameters of the calculation slices
+        """
+        if self.engine == 'lammps':
+            from dflowautotest.LAMMPS_OPs import (RelaxMakeLAMMPS, RelaxLAMMPS, RelaxPostLAMMPS,
+                                                  PropsMakeLAMMPS, PropsScheduleLAMMPS,
+                                                  PropsLAMMPS, PropsPostLAMMPS)
+            self.relaxmake, self.relaxcal, self.relaxpost = RelaxMakeLAMMPS, RelaxLAMMPS, RelaxPostLAMMPS
+            self.propsmake, self.propsschedule = PropsMakeLAMMPS, PropsScheduleLAMMPS
+            self.propscal, self.propspost = PropsLAMMPS, PropsPostLAMMPS
+            self.cal_artifact = 'input_lammps'
+            self.cal_parameters = {'run_command': self.run_command,
+                                   'run_workers': self.lammps_run_workers,
+                                   'run_envs': self.lammps_run_envs}
+        elif self.engine == 'abacus':
+            from dflowautotest.ABACUS_OPs import (RelaxMakeABACUS, RelaxABACUS, RelaxPostABACUS,
+                                                  PropsMakeABACUS, PropsABACUS, PropsPostABACUS)
+            self.relaxmake, self.relaxcal, self.relaxpost = RelaxMakeABACUS, RelaxABACUS, RelaxPostABACUS
+            self.propsmake, self.propscal, self.propspost = PropsMakeABACUS, PropsABACUS, PropsPostABACUS
+            self.cal_artifact = 'input_abacus'
+            self.cal_parameters = {'run_command': self.run_command}
+        else:
+            # VASP is run by the RunVasp OP of fpop in the dflow workflow
+            raise RuntimeError('the local executor supports --lammps and --abacus')
+
+    def stage(self, src, src_root, dst_root):
+        """
+        Copy the artifact src, stored under src_root, to the same relative path under dst_root
+        """
+        def ignore(path, names):
+            # the stage directory may be in the work directory, the links are followed
+            return [ii for ii in names if os.path.join(path, ii) == self.stage_root or
+                    not os.path.exists(os.path.join(path, ii))]
+
+        dst = os.path.join(dst_root, os.path.relpath(src, src_root))
+        shutil.copytree(src, dst, ignore=ignore, dirs_exist_ok=True)
+        return dst
+
+    def stage_inputs(self, work_dir):
+        """
+        Link the files of the input manifest into the stage under their absolute
+        paths, return the staged work directory and its root
+        """
+        src_root = os.path.join(self.stage_root, 'input')
+        src = os.path.join(src_root, work_dir.lstrip(os.sep))
+        # the stage directory may be reused, the inputs of an earlier run are not kept
+        shutil.rmtree(src_root, ignore_errors=True)
+        files = input_manifest(self.relax_param, self.props_param, model=not self.separate_models)
+        for ii in files:
+            dst = os.path.join(src, ii)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if not os.path.exists(dst):
+                _link(ii, dst)
+        print('staged %d input files of %s' % (len(files), work_dir))
+        return src, src_root
+
+    def timed(self, name, op_class, op_in):
+        op_out, wall = run_op(op_class, op_in)
+        self.timings.append({'step': name, 'wall': wall})
+        return op_out
+
+    def run_stage(self, name, make, schedule, cal, post, param, src, src_root):
+        """
+        Run the make, schedule, cal and post steps of the relaxation or the properties
+        on the work directory src, return the outputs of the post step
+        """
+        work_dir = os.getcwd()
+        stage_dir = os.path.join(self.stage_root, name)
+        # the model artifact of the LAMMPS steps
+        models = {}
+        if self.separate_models:
+            models['model'] = [Path(os.path.abspath(ii)) for ii in model_files(loadfn(param)['interaction'])]
+
+        make_root = os.path.join(stage_dir, 'make')
+        make_out = self.timed(name + 'make', make, dict(models, **{
+            'input': Path(self.stage(src, src_root, make_root)),
+            'param': Path(param)
+        }))
+        task_root, task_paths = make_root, make_out['task_paths']
+        if schedule is not None:
+            task_root = os.path.join(stage_dir, 'schedule')
+            task_paths = self.timed(name + 'schedule', schedule, {
+                'input': Path(self.stage(str(make_out['output']), make_root, task_root)),
+                'param': Path(param)
+            })['task_paths']
+
+        # the outputs of all the slices make the input_post artifact
+        cal_root = os.path.join(stage_dir, 'cal')
+        start = time.time()
+        with ProcessPoolExecutor(max_workers=self.local_workers) as pool:
+            futures = [pool.submit(run_op, cal, dict(self.cal_parameters, **models, **{
+                self.cal_artifact: Path(self.stage(str(ii), task_root, cal_root))
+            })) for ii in task_paths]
+            walls = [ii.result()[1] for ii in futures]
+        self.timings.append({'step': name + 'cal', 'wall': time.time() - start, 'slices': walls})
+
+        post_root = os.path.join(stage_dir, 'post')
+        input_all = os.path.join(post_root, 'input_all')
+        self.stage(str(make_out['output']), make_root, input_all)
+        os.chdir(post_root)
+        try:
+            post_out = self.timed(name + 'post', post, {
+                'input_post': Path(cal_root),
+                'input_all': Path(input_all),
+                'param': Path(param),
+                'path': work_dir
+            })
+        finally:
+            os.chdir(work_dir)
+        return {kk: os.path.join(post_root, vv) for kk, vv in post_out.items() if vv is not None}
+
+    def report(self):
+        print('%-16s %10s %8s %10s %10s' % ('step', 'wall (s)', 'slices', 'max (s)', 'sum (s)'))
+        for ii in self.timings:
+            if 'slices' in ii:
+                print('%-16s %10.2f %8d %10.2f %10.2f'
+                      % (ii['step'], ii['wall'], len(ii['slices']), max(ii['slices'] + [0]), sum(ii['slices'])))
+            else:
+                print('%-16s %10.2f' % (ii['step'], ii['wall']))
+        dumpfn(self.timings, os.path.join(self.stage_root, 'timings.json'), indent=4)
+
+    def generate_flow(self):
+        work_dir = os.getcwd()
+        self.stage_root = os.path.abspath(self.stage_dir or tempfile.mkdtemp(prefix='dflowautotest-local-'))
+        print('staging the artifacts in %s' % self.stage_root)
+        src, src_root = self.stage_inputs(work_dir)
+        if self.flow_type in ['relax', 'joint']:
+            post_out = self.run_stage('relax', self.relaxmake, None, self.relaxcal, self.relaxpost,
+                                      os.path.abspath(self.relax_param), src, src_root)
+            # the relaxed work directory in the input_all of the relax post step
+            src, src_root = post_out['output_all'], os.path.join(self.stage_root, 'relax', 'post', 'input_all')
+        if self.flow_type in ['props', 'joint']:
+            post_out = self.run_stage('props', self.propsmake, self.propsschedule, self.propscal,
+                                      self.propspost, os.path.abspath(self.props_param), src, src_root)
+        # the output_post artifact of the last post step, as downloaded by Flow.assertion
+        shutil.copytree(post_out['output_post'], os.path.join(work_dir, 'confs'), dirs_exist_ok=True)
+        self.report()
@@ -0,0 +1,61 @@
+from dflow.python import (
+    OP,
+    OPIO,
+    OPIOSign,
+    Artifact,
+    upload_packages
+)
+
+import os
+from pathlib import Path
+from typing import List
+from dflow.python import upload_packages
+upload_packages.append(__file__)
+
+from dflowautotest.lib.utils import overlay_tree
+
+
+def find_conf(post, conf):
+    """
+    The directory of conf in the artifact post, which may be rooted at any parent of conf
+    """
+    parts = Path(conf).parts
+    for ii in range(len(parts)):
+        src = sorted([jj for jj in Path(post).glob(os.path.join('**', *parts[ii:])) if jj.is_dir()],
+                     key=lambda jj: len(jj.parts))
+        if len(src) > 0:
+            return src[0]
+    raise RuntimeError('cannot find %s in %s' % (conf, post))
+
+
+class MergeConfs(OP):
+    """
+    class for merging the results of the per-conf pipelines
+    """
+
+    def __init__(self):
+        pass
+
+    @classmethod
+    def get_input_sign(cls):
+        return OPIOSign({
+            'input_posts': Artifact(List[Path], sub_path=False),
+            'conf_dirs': List[str]
+        })
+
+    @classmethod
+    def get_output_sign(cls):
+        return OPIOSign({
+            'output_post': Artifact(Path, sub_path=False)
+        })
+
+    @OP.exec_sign_check
+    def execute(self, op_in: OPIO) -> OPIO:
+        # the output_post of a pipeline holds all the confs, only its own conf is computed
+        for post, conf in zip(op_in['input_posts'], op_in['conf_dirs']):
+            overlay_tree(find_conf(post, conf), conf)
+
+        op_out = OPIO({
+            'output_post': Path('./confs')
+        })
+        return op_out
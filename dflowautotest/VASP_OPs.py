@@ -18,7 +18,9 @@ try:
     from dflowautotest.auto_test.common_prop import (make_property, post_property)
 except:
     pass
-from dflowautotest.lib.utils import return_prop_list
+from dflowautotest.lib.utils import return_prop_list, copy_post_output, overlay_tree
+from dflowautotest.lib.cache import (list_task_dirs, mark_cache_hits, is_cache_hit,
+                                     restore_cache_hits, store_cache_misses)
 upload_packages.append(__file__)
 
 
@@ -59,7 +61,9 @@ class RelaxMakeVASP(OP):
         inter_parameter = loadfn(param_argv)["interaction"]
         parameter = loadfn(param_argv)["relaxation"]
 
-        make_equi(structures, inter_parameter, parameter)
+        make_equi(structures, inter_parameter, parameter, loadfn(param_argv).get("make_workers", 1))
+        # the tasks found in the result cache are not computed again
+        mark_cache_hits(list_task_dirs(structures), loadfn(param_argv).get("result_cache", None))
 
         conf_dirs = []
         for conf in structures:
@@ -70,6 +74,8 @@ class RelaxMakeVASP(OP):
         task_list_str = []
         for ii in conf_dirs:
             conf_dir_global = os.path.join(work_d, ii)
+            if is_cache_hit(os.path.join(ii, 'relaxation/relax_task')):
+                continue
             task_list.append(os.path.join(conf_dir_global, 'relaxation/relax_task'))
             task_list_str.append(os.path.join(ii, 'relaxation'))
 
@@ -98,7 +104,7 @@ class RelaxPostVASP(OP):
     @classmethod
     def get_input_sign(cls):
         return OPIOSign({
-            'input_post': Artifact(Path, sub_path=False),
+            'input_post': Artifact(Path, sub_path=False, optional=True),
             'input_all': Artifact(Path, sub_path=False),
             'param': Artifact(Path),
             'path': str
@@ -108,6 +114,7 @@ class RelaxPostVASP(OP):
     def get_output_sign(cls):
         return OPIOSign({
             'output_post': Artifact(Path, sub_path=False),
+            'output_raw': Artifact(Path, sub_path=False, optional=True),
             'output_all': Artifact(Path, sub_path=False)
         })
 
@@ -115,16 +122,25 @@ class RelaxPostVASP(OP):
     def execute(self, op_in: OPIO) -> OPIO:
         cwd = os.getcwd()
         os.chdir(str(op_in['input_all']) + op_in['path'])
-        shutil.copytree(str(op_in['input_post']), './', dirs_exist_ok=True)
+        # without input_post every task is a result cache hit, nothing was computed
+        if op_in['input_post'] is not None:
+            overlay_tree(str(op_in['input_post']), './')
 
         param_argv = op_in['param']
-        post_equi(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"])
+        result_cache = loadfn(param_argv).get("result_cache", None)
+        if result_cache is not None:
+            restore_cache_hits(list_task_dirs(loadfn(param_argv)["structures"]), result_cache)
+        post_equi(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"], loadfn(param_argv).get("post_workers", 1))
+        if result_cache is not None:
+            store_cache_misses(list_task_dirs(loadfn(param_argv)["structures"]), result_cache)
 
         os.chdir(cwd)
-        shutil.copytree(str(op_in['input_all']) + op_in['path'] + '/confs', './confs', dirs_exist_ok=True)
+        raw = copy_post_output(str(op_in['input_all']) + op_in['path'], loadfn(param_argv)["structures"],
+                               loadfn(param_argv).get("compact_post", False))
 
         op_out = OPIO({
             'output_post': Path("./confs"),
+            'output_raw': Path(raw) if raw is not None else None,
             'output_all': Path(str(op_in['input_all']) + op_in['path'])
         })
         return op_out
@@ -166,7 +182,9 @@ class PropsMakeVASP(OP):
         structures = loadfn(param_argv)["structures"]
         inter_parameter = loadfn(param_argv)["interaction"]
         parameter = loadfn(param_argv)["properties"]
-        make_property(structures, inter_parameter, parameter)
+        make_property(structures, inter_parameter, parameter, loadfn(param_argv).get("make_workers", 1))
+        # the tasks found in the result cache are not computed again
+        mark_cache_hits(list_task_dirs(structures, parameter), loadfn(param_argv).get("result_cache", None))
 
         conf_dirs = []
         for conf in structures:
@@ -180,11 +198,10 @@ class PropsMakeVASP(OP):
             conf_dir_global = os.path.join(work_d, ii)
             for jj in prop_list:
                 prop = os.path.join(conf_dir_global, jj)
-                prop_tasks = glob.glob(os.path.join(prop, 'task.*'))
-                prop_tasks.sort()
-                task_list.extend(prop_tasks)
                 prop_tasks_str = glob.glob(os.path.join(ii, jj, 'task.*'))
                 prop_tasks_str.sort()
+                prop_tasks_str = [kk for kk in prop_tasks_str if not is_cache_hit(kk)]
+                task_list.extend([os.path.join(work_d, kk) for kk in prop_tasks_str])
                 task_list_str.extend(prop_tasks_str)
 
         all_jobs = task_list
@@ -212,7 +229,7 @@ class PropsPostVASP(OP):
     @classmethod
     def get_input_sign(cls):
         return OPIOSign({
-            'input_post': Artifact(Path, sub_path=False),
+            'input_post': Artifact(Path, sub_path=False, optional=True),
             'input_all': Artifact(Path, sub_path=False),
             'param': Artifact(Path),
             'path': str,
@@ -222,27 +239,37 @@ class PropsPostVASP(OP):
     @classmethod
     def get_output_sign(cls):
         return OPIOSign({
-            'output_post': Artifact(Path, sub_path=False)
+            'output_post': Artifact(Path, sub_path=False),
+            'output_raw': Artifact(Path, sub_path=False, optional=True)
         })
 
     @OP.exec_sign_check
     def execute(self, op_in: OPIO) -> OPIO:
         cwd = os.getcwd()
-        os.chdir(str(op_in['input_post']))
-        for ii in op_in['task_names']:
-            shutil.copytree(os.path.join(ii, "backward_dir"), ii, dirs_exist_ok=True)
-            shutil.rmtree(os.path.join(ii, "backward_dir"))
-
         os.chdir(str(op_in['input_all']) + op_in['path'])
-        shutil.copytree(str(op_in['input_post']), './', dirs_exist_ok=True)
+        # without input_post every task is a result cache hit, nothing was computed
+        if op_in['input_post'] is not None:
+            for ii in op_in['task_names']:
+                task_post = os.path.join(str(op_in['input_post']), ii)
+                overlay_tree(os.path.join(task_post, "backward_dir"), task_post)
+                shutil.rmtree(os.path.join(task_post, "backward_dir"))
+            overlay_tree(str(op_in['input_post']), './')
 
         param_argv = op_in['param']
-        post_property(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"], loadfn(param_argv)["properties"])
+        result_cache = loadfn(param_argv).get("result_cache", None)
+        task_dirs = list_task_dirs(loadfn(param_argv)["structures"], loadfn(param_argv)["properties"])
+        if result_cache is not None:
+            restore_cache_hits(task_dirs, result_cache)
+        post_property(loadfn(param_argv)["structures"], loadfn(param_argv)["interaction"], loadfn(param_argv)["properties"], loadfn(param_argv).get("post_workers", 1))
+        if result_cache is not None:
+            store_cache_misses(task_dirs, result_cache)
 
         os.chdir(cwd)
-        shutil.copytree(str(op_in['input_all']) + op_in['path'] + '/confs', './confs', dirs_exist_ok=True)
+        raw = copy_post_output(str(op_in['input_all']) + op_in['path'], loadfn(param_argv)["structures"],
+                               loadfn(param_argv).get("compact_post", False))
 
         op_out = OPIO({
-            'output_post': Path("./confs")
+            'output_post': Path("./confs"),
+            'output_raw': Path(raw) if raw is not None else None
         })
         return op_out
@@ -111,8 +111,9 @@ class VASPFlow(Flow):
 
         relaxmake = Step(
             name="Relaxmake",
+            key=self.key_prefix + "relaxmake",
             template=PythonOPTemplate(RelaxMakeVASP, image=self.dpgen_image_name, command=["python3"]),
-            artifacts={"input": upload_artifact(work_dir),
+            artifacts={"input": self.upload_work_dir(work_dir),
                        "param": upload_artifact(self.relax_param)},
         )
         self.relaxmake = relaxmake
@@ -139,14 +140,15 @@ class VASPFlow(Flow):
                 "task_path": relaxmake.outputs.artifacts["task_paths"]
             },
             with_param=argo_range(argo_len(relaxmake.outputs.parameters["task_names"])),
-            key="RelaxVASP-Cal-{{item}}",
-            executor=init_executor(self.run_step_config_relax.pop("executor")),
-            **self.run_step_config_relax
+            key=self.key_prefix + "relax-vasp-cal-{{item}}",
+            executor=init_executor(self.run_step_config_relax["executor"]),
+            **{kk: vv for kk, vv in self.run_step_config_relax.items() if kk != "executor"}
         )
         self.relaxcal = relaxcal
 
         relaxpost = Step(
             name="Relaxpost",
+            key=self.key_prefix + "relaxpost",
             template=PythonOPTemplate(RelaxPostVASP, image=self.dpgen_image_name, command=["python3"]),
             artifacts={"input_post": self.relaxcal.outputs.artifacts["backward_dir"], "input_all": self.relaxmake.outputs.artifacts["output"],
                        "param": upload_artifact(self.relax_param)},
@@ -157,6 +159,7 @@ class VASPFlow(Flow):
         if self.do_relax:
             propsmake = Step(
                 name="Propsmake",
+                key=self.key_prefix + "propsmake",
                 template=PythonOPTemplate(PropsMakeVASP, image=self.dpgen_image_name, command=["python3"]),
                 artifacts={"input": relaxpost.outputs.artifacts["output_all"],
                            "param": upload_artifact(self.props_param)},
@@ -164,8 +167,9 @@ class VASPFlow(Flow):
         else:
             propsmake = Step(
                 name="Propsmake",
+                key=self.key_prefix + "propsmake",
                 template=PythonOPTemplate(PropsMakeVASP, image=self.dpgen_image_name, command=["python3"]),
-                artifacts={"input": upload_artifact(work_dir),
+                artifacts={"input": self.upload_work_dir(work_dir),
                            "param": upload_artifact(self.props_param)},
             )
         self.propsmake = propsmake
@@ -191,14 +195,15 @@ class VASPFlow(Flow):
                 "task_path": propsmake.outputs.artifacts["task_paths"]
             },
             with_param=argo_range(argo_len(propsmake.outputs.parameters["task_names"])),
-            key="PropsVASP-Cal-{{item}}",
-            executor=init_executor(self.run_step_config_props.pop("executor")),
-            **self.run_step_config_props
+            key=self.key_prefix + "props-vasp-cal-{{item}}",
+            executor=init_executor(self.run_step_config_props["executor"]),
+            **{kk: vv for kk, vv in self.run_step_config_props.items() if kk != "executor"}
         )
         self.propscal = propscal
 
         propspost = Step(
             name="Propspost",
+            key=self.key_prefix + "propspost",
             template=PythonOPTemplate(PropsPostVASP, image=self.dpgen_image_name, command=["python3"]),
             artifacts={"input_post": propscal.outputs.artifacts["backward_dir"], "input_all": self.propsmake.outputs.artifacts["output"],
                        "param": upload_artifact(self.props_param)},
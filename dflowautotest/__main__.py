@@ -2,24 +2,25 @@
 
 from dflow import config, s3_config
 from dflow.plugins import bohrium
-from dflow.plugins.bohrium import TiefblueClient
 from monty.serialization import loadfn
 
-config["host"] = "https://workflows.deepmodeling.com"
-config["k8s_api_server"] = "https://workflows.deepmodeling.com"
-username = loadfn("global.json").get("email", None)
-bohrium.config["username"] = username
-password = loadfn("global.json").get("password", None)
-bohrium.config["password"] = password
-program_id = loadfn("global.json").get("program_id", None)
-bohrium.config["program_id"] = program_id
-s3_config["repo_key"] = "oss-bohrium"
-s3_config["storage_client"] = TiefblueClient()
-
 import argparse
-from dflowautotest.VASP_flow import VASPFlow
-from dflowautotest.LAMMPS_flow import LAMMPSFlow
-from dflowautotest.ABACUS_flow import ABACUSFlow
+import shutil
+
+
+def init_bohrium():
+    from dflow.plugins.bohrium import TiefblueClient
+
+    config["host"] = "https://workflows.deepmodeling.com"
+    config["k8s_api_server"] = "https://workflows.deepmodeling.com"
+    username = loadfn("global.json").get("email", None)
+    bohrium.config["username"] = username
+    password = loadfn("global.json").get("password", None)
+    bohrium.config["password"] = password
+    program_id = loadfn("global.json").get("program_id", None)
+    bohrium.config["program_id"] = program_id
+    s3_config["repo_key"] = "oss-bohrium"
+    s3_config["storage_client"] = TiefblueClient()
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -31,21 +32,48 @@ def parse_args():
                         action="store_true")
     parser.add_argument("--lammps", help="Using LAMMPS to perform autotest",
                         action="store_true")
+    parser.add_argument("--resume", help="Re-attach to the workflow in workflow_record.json, "
+                        "or resubmit it reusing the steps and slices that succeeded",
+                        action="store_true")
+    parser.add_argument("--pipeline", help="Run the relaxation and the properties of each conf "
+                        "as a separate pipeline, without waiting for the other confs",
+                        action="store_true")
+    parser.add_argument("--local", help="Run the workflow on this machine instead of "
+                        "submitting it (--lammps or --abacus)",
+                        action="store_true")
     args = parser.parse_args()
     return args
 
 def main():
     args = parse_args()
-    if args.abacus:
-        flow = ABACUSFlow(args)
-    elif args.lammps:
-        flow = LAMMPSFlow(args)
-    elif args.vasp:
-        flow = VASPFlow(args)
+    if args.local:
+        from dflowautotest.Local_flow import LocalFlow
+        engines = [ii for ii in ['abacus', 'lammps', 'vasp'] if getattr(args, ii)]
+        if len(engines) == 0:
+            raise RuntimeError('Must indicate how to preform the calculation by indicating --lammps; --abacus')
+        flow = LocalFlow(args, engines[0])
+    else:
+        init_bohrium()
+        if args.abacus:
+            from dflowautotest.ABACUS_flow import ABACUSFlow
+            flow = ABACUSFlow(args)
+        elif args.lammps:
+            from dflowautotest.LAMMPS_flow import LAMMPSFlow
+            flow = LAMMPSFlow(args)
+        elif args.vasp:
+            from dflowautotest.VASP_flow import VASPFlow
+            flow = VASPFlow(args)
+        else:
+            raise RuntimeError('Must indicate how to preform the calculation by indicating --lammps; --vasp; --abacus')
+    if args.pipeline:
+        flow.init_pipeline()
     else:
-        raise RuntimeError('Must indicate how to preform the calculation by indicating --lammps; --vasp; --abacus')
-    flow.init_steps()
-    flow.generate_flow()
+        flow.init_steps()
+    try:
+        flow.generate_flow()
+    finally:
+        if flow.param_dir is not None:
+            shutil.rmtree(flow.param_dir, ignore_errors=True)
 
 
 if __name__ == '__main__':
@@ -6,6 +6,7 @@ from monty.serialization import dumpfn
 
 import dflowautotest.auto_test.lib.abacus as abacus
 import dflowautotest.lib.abacus_scf as abacus_scf
+from dflowautotest.auto_test.lib.utils import select_frames
 #from dpgen import dlog
 from dflowautotest.auto_test.Task import Task
 from dflowautotest.lib.util import sepline
@@ -46,10 +47,9 @@ class ABACUS(Task):
             raise RuntimeError("No pseudopotential information in STRU file")
 
         pp_dir = os.path.abspath(self.potcar_prefix)
-        cwd = os.getcwd()
-        os.chdir(output_dir)
-        if not os.path.isdir("./pp_orb"):
-            os.mkdir("./pp_orb")
+        pp_orb_dir = os.path.join(output_dir, "pp_orb")
+        if not os.path.isdir(pp_orb_dir):
+            os.mkdir(pp_orb_dir)
         for i in range(len(atom_names)):
             pp_orb_file = [[pp_files[i], self.potcars]]
             if orb_files != None:
@@ -67,7 +67,8 @@ class ABACUS(Task):
 
             for tmpf, tmpdict in pp_orb_file:
                 atom = atom_names[i]
-                if os.path.isfile(os.path.join(stru_path, tmpf)):
+                # a relative stru_path is relative to the task directory
+                if os.path.isfile(os.path.join(output_dir, stru_path, tmpf)):
                     linked_file = os.path.join(stru_path, tmpf)
                 elif tmpdict != None and os.path.isfile(
                     os.path.join(pp_dir, tmpdict[atom])
@@ -75,13 +76,11 @@ class ABACUS(Task):
                     linked_file = os.path.join(pp_dir, tmpdict[atom])
                 else:
                     raise RuntimeError("Can not find file %s" % tmpf.split("/")[-1])
-                target_file = os.path.join("./pp_orb/", tmpf.split("/")[-1])
+                target_file = os.path.join(pp_orb_dir, tmpf.split("/")[-1])
                 if os.path.isfile(target_file):
                     os.remove(target_file)
                 os.symlink(linked_file, target_file)
 
-        os.chdir(cwd)
-
         dumpfn(self.inter, os.path.join(output_dir, "inter.json"), indent=4)
 
     def modify_input(self, incar, x, y):
@@ -176,14 +175,12 @@ class ABACUS(Task):
             )
             raise RuntimeError(mess)
         abacus.write_input(os.path.join(output_dir, "../INPUT"), incar)
-        cwd = os.getcwd()
-        os.chdir(output_dir)
-        if not os.path.islink("INPUT"):
-            os.symlink("../INPUT", "INPUT")
-        elif not "../INPUT" == os.readlink("INPUT"):
-            os.remove("INPUT")
-            os.symlink("../INPUT", "INPUT")
-        os.chdir(cwd)
+        task_input = os.path.join(output_dir, "INPUT")
+        if not os.path.islink(task_input):
+            os.symlink("../INPUT", task_input)
+        elif not "../INPUT" == os.readlink(task_input):
+            os.remove(task_input)
+            os.symlink("../INPUT", task_input)
 
         if "kspacing" in incar:
             kspacing = float(incar["kspacing"])
@@ -203,12 +200,17 @@ class ABACUS(Task):
             raise RuntimeError(mess)
         abacus.write_kpt(os.path.join(output_dir, "KPT"), kpt)
 
-    def compute(self, output_dir):
+    def compute(self, output_dir, result_frames="all"):
         if not os.path.isfile(os.path.join(output_dir, "INPUT")):
             print("cannot find INPUT in " + output_dir + " skip")
             #dlog.warning("cannot find INPUT in " + output_dir + " skip")
             return None
+        logf = abacus.running_log(output_dir)
+        if not os.path.isfile(logf) or not abacus.check_finished(logf):
+            print("abacus not finished " + logf)
         ls = LabeledSystem(output_dir, fmt="abacus/relax")
+        # dpdata parses the whole log, the frames are selected afterwards
+        ls = ls.sub_system(select_frames(ls.get_nframes(), result_frames))
         outcar_dict = ls.as_dict()
         return outcar_dict
 
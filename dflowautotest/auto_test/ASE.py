@@ -0,0 +1,216 @@
+import os
+import warnings
+
+import numpy as np
+from ase import units
+from ase.calculators.emt import EMT
+from ase.calculators.lj import LennardJones
+from ase.constraints import FixCartesian
+from ase.io import read, write
+from ase.optimize import BFGS
+
+try:
+    from ase.filters import UnitCellFilter
+except ImportError:
+    from ase.constraints import UnitCellFilter
+from monty.serialization import dumpfn, loadfn
+
+import dflowautotest.auto_test.lib.lammps as lammps
+from dflowautotest.auto_test.lib.utils import select_frames
+from dflowautotest.auto_test.Task import Task
+from dflow.python import upload_packages
+upload_packages.append(__file__)
+
+supported_calculator = ["deepmd", "emt", "lj"]
+
+
+def make_ase_calculator(inter_parameter, output_dir):
+    """
+    The ASE calculator of the interaction, the model is looked up in output_dir
+    """
+    calculator = inter_parameter.get("calculator", "deepmd")
+    calculator_param = inter_parameter.get("calculator_param", {})
+    if calculator == "deepmd":
+        from deepmd.calculator import DP
+
+        model = os.path.join(output_dir, os.path.basename(inter_parameter["model"]))
+        return DP(
+            model=model, type_dict=inter_parameter["type_map"], **calculator_param
+        )
+    elif calculator == "emt":
+        return EMT(**calculator_param)
+    elif calculator == "lj":
+        return LennardJones(**calculator_param)
+    else:
+        raise RuntimeError(f"unsupported ase calculator {calculator}")
+
+
+def run_ase_task(output_dir):
+    """
+    Compute the task in output_dir in the current process, the frames of the
+    relaxation (or the single frame of a static computation) are stored in
+    output_dir/ase_frames.npz and the last configuration in CONTCAR
+    """
+    inter_parameter = loadfn(os.path.join(output_dir, "inter.json"))
+    ase_param = loadfn(os.path.join(output_dir, "ase.json"))
+    atoms = read(os.path.join(output_dir, "POSCAR"), format="vasp")
+    atoms.calc = make_ase_calculator(inter_parameter, output_dir)
+    if ase_param["fix"] is not None:
+        atoms.set_constraint(
+            FixCartesian(
+                range(len(atoms)), mask=[ii == "true" for ii in ase_param["fix"]]
+            )
+        )
+
+    frames = {kk: [] for kk in ["cells", "coords", "energies", "forces", "stress"]}
+
+    def record():
+        frames["cells"].append(atoms.get_cell().array.copy())
+        frames["coords"].append(atoms.get_positions())
+        frames["energies"].append(atoms.get_potential_energy())
+        frames["forces"].append(atoms.get_forces())
+        frames["stress"].append(atoms.get_stress(voigt=False))
+
+    if ase_param["relax_pos"]:
+        if ase_param["relax_shape"]:
+            target = UnitCellFilter(atoms, constant_volume=not ase_param["relax_vol"])
+        else:
+            target = atoms
+        opt = BFGS(target, logfile=os.path.join(output_dir, "outlog"))
+        opt.attach(record)
+        opt.run(fmax=ase_param["fmax"], steps=ase_param["maxiter"])
+    else:
+        record()
+    np.savez_compressed(
+        os.path.join(output_dir, "ase_frames.npz"),
+        **{kk: np.array(vv) for kk, vv in frames.items()},
+    )
+    write(os.path.join(output_dir, "CONTCAR"), atoms, format="vasp", direct=True)
+
+
+class ASE(Task):
+    def __init__(self, inter_parameter, path_to_poscar):
+        self.inter = inter_parameter
+        self.inter_type = inter_parameter["type"]
+        self.type_map = inter_parameter["type_map"]
+        self.calculator = inter_parameter.get("calculator", "deepmd")
+        if "model" in inter_parameter:
+            self.model = os.path.abspath(inter_parameter["model"])
+        else:
+            self.model = None
+        self.path_to_poscar = path_to_poscar
+        assert self.calculator in supported_calculator
+        if self.calculator == "deepmd":
+            assert self.model is not None
+
+    def make_potential_files(self, output_dir):
+        if self.model is not None:
+            model_file = os.path.basename(self.model)
+            task_file = os.path.join(output_dir, model_file)
+            if os.path.islink(task_file):
+                os.remove(task_file)
+            os.symlink(os.path.relpath(self.model, output_dir), task_file)
+
+        dumpfn(self.inter, os.path.join(output_dir, "inter.json"), indent=4)
+
+    def make_input_file(self, output_dir, task_type, task_param):
+        fmax = 1e-4
+        maxiter = 5000
+
+        cal_type = task_param["cal_type"]
+        cal_setting = task_param["cal_setting"]
+
+        if "fmax" in cal_setting:
+            print(
+                "%s setting fmax to %s"
+                % (self.make_input_file.__name__, cal_setting["fmax"])
+            )
+            fmax = cal_setting["fmax"]
+        if "maxiter" in cal_setting:
+            print(
+                "%s setting maxiter to %s"
+                % (self.make_input_file.__name__, cal_setting["maxiter"])
+            )
+            maxiter = cal_setting["maxiter"]
+
+        if cal_type == "relaxation":
+            relax_pos = cal_setting["relax_pos"]
+            relax_shape = cal_setting["relax_shape"]
+            relax_vol = cal_setting["relax_vol"]
+            if [relax_pos, relax_shape, relax_vol] not in [
+                [True, False, False],
+                [True, True, False],
+                [True, True, True],
+                [False, False, False],
+            ]:
+                raise RuntimeError("not supported calculation setting for ASE")
+        elif cal_type == "static":
+            relax_pos = False
+            relax_shape = False
+            relax_vol = False
+        else:
+            raise RuntimeError("not supported calculation type for ASE")
+
+        # the x y z constraint of the gamma line slabs
+        fix = task_param.get("add_fix", None) if task_type == "gamma" else None
+
+        dumpfn(task_param, os.path.join(output_dir, "task.json"), indent=4)
+        dumpfn(
+            {
+                "relax_pos": relax_pos,
+                "relax_shape": relax_shape,
+                "relax_vol": relax_vol,
+                "fmax": fmax,
+                "maxiter": maxiter,
+                "fix": fix,
+            },
+            os.path.join(output_dir, "ase.json"),
+            indent=4,
+        )
+
+    def compute(self, output_dir, result_frames="all"):
+        ase_frames = os.path.join(output_dir, "ase_frames.npz")
+        if not os.path.isfile(ase_frames):
+            warnings.warn("cannot find ase_frames.npz in " + output_dir + " skip")
+            return None
+        with np.load(ase_frames) as data:
+            idx = select_frames(len(data["energies"]), result_frames)
+            frames = {kk: data[kk][idx] for kk in data.files}
+        atoms = read(os.path.join(output_dir, "CONTCAR"), format="vasp")
+
+        type_map_list = lammps.element_list(self.type_map)
+        type_list = [type_map_list.index(ii) for ii in atoms.get_chemical_symbols()]
+        atom_numbs = [type_list.count(ii) for ii in range(len(type_map_list))]
+        # ase stress (eV/A^3, positive in tension) -> kbar, positive in compression
+        vol = np.abs(np.linalg.det(frames["cells"]))
+        stress = -frames["stress"] / (units.GPa / 10)
+        virial = -frames["stress"] * vol[:, None, None]
+
+        return {
+            "@module": "dpdata.system",
+            "@class": "LabeledSystem",
+            "data": {
+                "atom_numbs": atom_numbs,
+                "atom_names": type_map_list,
+                "atom_types": np.array(type_list, dtype=int),
+                "orig": np.zeros(3, dtype=int),
+                "cells": frames["cells"],
+                "coords": frames["coords"],
+                "energies": frames["energies"],
+                "forces": frames["forces"],
+                "virials": virial,
+                "stress": stress,
+            },
+        }
+
+    def forward_files(self, property_type="relaxation"):
+        if self.model is not None:
+            return ["POSCAR", "ase.json", os.path.basename(self.model)]
+        else:
+            return ["POSCAR", "ase.json"]
+
+    def forward_common_files(self, property_type="relaxation"):
+        return []
+
+    def backward_files(self, property_type="relaxation"):
+        return ["outlog", "ase_frames.npz", "CONTCAR"]
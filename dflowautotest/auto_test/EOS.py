@@ -10,6 +10,8 @@ import dflowautotest.auto_test.lib.abacus as abacus
 import dflowautotest.auto_test.lib.vasp as vasp
 import dflowautotest.lib.abacus_scf as abacus_scf
 #from dpgen import dlog
+from dflowautotest.auto_test.lib.result_store import load_result
+from dflowautotest.auto_test.Lammps import supported_inter
 from dflowautotest.auto_test.Property import Property
 from dflowautotest.auto_test.refine import make_refine
 from dflowautotest.auto_test.reproduce import make_repro, post_repro
@@ -28,6 +30,8 @@ class EOS(Property):
                 self.vol_step = parameter["vol_step"]
                 parameter["vol_abs"] = parameter.get("vol_abs", False)
                 self.vol_abs = parameter["vol_abs"]
+            # compute all the volumes in one lammps run
+            parameter["lammps_batch"] = parameter.get("lammps_batch", False)
             parameter["cal_type"] = parameter.get("cal_type", "relaxation")
             self.cal_type = parameter["cal_type"]
             default_cal_setting = {
@@ -79,6 +83,17 @@ class EOS(Property):
             self.init_from_suffix = parameter["init_from_suffix"]
         self.parameter = parameter
         self.inter_param = inter_param if inter_param != None else {"type": "vasp"}
+        self.lammps_batch = parameter.get("lammps_batch", False)
+        if self.lammps_batch and self.inter_param["type"] not in supported_inter:
+            print(
+                "lammps_batch is not supported by %s, one task per volume"
+                % self.inter_param["type"]
+            )
+            parameter["lammps_batch"] = False
+            self.lammps_batch = False
+        if self.lammps_batch:
+            # every volume is a frame of the task result
+            self.default_result_frames = "all"
 
     def make_confs(self, path_to_work, path_to_equi, refine=False):
         path_to_work = os.path.abspath(path_to_work)
@@ -109,7 +124,6 @@ class EOS(Property):
                 )
             )
 
-        cwd = os.getcwd()
         task_list = []
         if self.reprod:
             print("eos reproduce starts")
@@ -123,17 +137,17 @@ class EOS(Property):
                 path_to_work,
                 self.parameter.get("reprod_last_frame", True),
             )
-            os.chdir(cwd)
 
         else:
             if refine:
                 print("eos refine starts")
+                if self.lammps_batch:
+                    raise RuntimeError("eos refine does not support lammps_batch")
                 task_list = make_refine(
                     self.parameter["init_from_suffix"],
                     self.parameter["output_suffix"],
                     path_to_work,
                 )
-                os.chdir(cwd)
 
                 init_from_path = re.sub(
                     self.parameter["output_suffix"][::-1],
@@ -146,16 +160,17 @@ class EOS(Property):
                 for ii in task_list_basename:
                     init_from_task = os.path.join(init_from_path, ii)
                     output_task = os.path.join(path_to_work, ii)
-                    os.chdir(output_task)
-                    if os.path.isfile("eos.json"):
-                        os.remove("eos.json")
-                    if os.path.islink("eos.json"):
-                        os.remove("eos.json")
+                    task_eos = os.path.join(output_task, "eos.json")
+                    if os.path.isfile(task_eos):
+                        os.remove(task_eos)
+                    if os.path.islink(task_eos):
+                        os.remove(task_eos)
                     os.symlink(
-                        os.path.relpath(os.path.join(init_from_task, "eos.json")),
-                        "eos.json",
+                        os.path.relpath(
+                            os.path.join(init_from_task, "eos.json"), output_task
+                        ),
+                        task_eos,
                     )
-                os.chdir(cwd)
 
             else:
                 print(
@@ -196,6 +211,10 @@ class EOS(Property):
                         equi_contcar
                     )
                 self.parameter["scale2equi"] = []
+                if self.lammps_batch:
+                    return self._make_batch_confs(
+                        path_to_work, equi_contcar, vol_to_poscar
+                    )
 
                 task_num = 0
                 while self.vol_start + self.vol_step * task_num < self.vol_end:
@@ -205,7 +224,6 @@ class EOS(Property):
                     # task_num = int((vol - self.vol_start) / self.vol_step)
                     output_task = os.path.join(path_to_work, "task.%06d" % task_num)
                     os.makedirs(output_task, exist_ok=True)
-                    os.chdir(output_task)
                     if self.inter_param["type"] == "abacus":
                         POSCAR = "STRU"
                         POSCAR_orig = "STRU.orig"
@@ -223,10 +241,13 @@ class EOS(Property):
                         "conf.lmp",
                         "in.lammps",
                     ]:
-                        if os.path.exists(ii):
-                            os.remove(ii)
+                        if os.path.exists(os.path.join(output_task, ii)):
+                            os.remove(os.path.join(output_task, ii))
                     task_list.append(output_task)
-                    os.symlink(os.path.relpath(equi_contcar), POSCAR_orig)
+                    task_poscar_orig = os.path.join(output_task, POSCAR_orig)
+                    os.symlink(
+                        os.path.relpath(equi_contcar, output_task), task_poscar_orig
+                    )
                     # scale = (vol / vol_to_poscar) ** (1. / 3.)
 
                     if self.vol_abs:
@@ -235,13 +256,50 @@ class EOS(Property):
                     else:
                         scale = vol ** (1.0 / 3.0)
                         eos_params = {"volume": vol * vol_to_poscar, "scale": scale}
-                    dumpfn(eos_params, "eos.json", indent=4)
+                    dumpfn(eos_params, os.path.join(output_task, "eos.json"), indent=4)
                     self.parameter["scale2equi"].append(scale)  # 06/22
-                    scale_func(POSCAR_orig, POSCAR, scale)
+                    task_poscar = os.path.join(output_task, POSCAR)
+                    scale_func(task_poscar_orig, task_poscar, scale)
                     task_num += 1
-                os.chdir(cwd)
         return task_list
 
+    def _make_batch_confs(self, path_to_work, equi_contcar, vol_to_poscar):
+        """
+        Make the single task of the lammps_batch mode. The task starts from
+        the equilibrium configuration, its eos.json lists the volume and
+        the scale of every eos point, batch_cells.json the scaled cells.
+        """
+        equi_cell = vasp.get_poscar_cell(equi_contcar)
+        eos_params = {"volume": [], "scale": []}
+        task_num = 0
+        while self.vol_start + self.vol_step * task_num < self.vol_end:
+            vol = self.vol_start + task_num * self.vol_step
+            if self.vol_abs:
+                scale = (vol / vol_to_poscar) ** (1.0 / 3.0)
+                eos_params["volume"].append(vol)
+            else:
+                scale = vol ** (1.0 / 3.0)
+                eos_params["volume"].append(vol * vol_to_poscar)
+            eos_params["scale"].append(scale)
+            self.parameter["scale2equi"].append(scale)
+            task_num += 1
+        print("batch %d volumes in one lammps task" % task_num)
+
+        output_task = os.path.join(path_to_work, "task.%06d" % 0)
+        os.makedirs(output_task, exist_ok=True)
+        for ii in ["POSCAR", "conf.lmp", "in.lammps", "eos.json", "batch_cells.json"]:
+            task_file = os.path.join(output_task, ii)
+            if os.path.isfile(task_file) or os.path.islink(task_file):
+                os.remove(task_file)
+        os.symlink(
+            os.path.relpath(equi_contcar, output_task),
+            os.path.join(output_task, "POSCAR"),
+        )
+        dumpfn(eos_params, os.path.join(output_task, "eos.json"), indent=4)
+        cells = [(equi_cell * ii).tolist() for ii in eos_params["scale"]]
+        dumpfn(cells, os.path.join(output_task, "batch_cells.json"), indent=4)
+        return [output_task]
+
     def post_process(self, task_list):
         pass
 
@@ -260,14 +318,25 @@ class EOS(Property):
             for ii in range(len(all_tasks)):
                 # vol = self.vol_start + ii * self.vol_step
                 vol = loadfn(os.path.join(all_tasks[ii], "eos.json"))["volume"]
-                task_result = loadfn(all_res[ii])
-                res_data[vol] = task_result["energies"][-1] / sum(
-                    task_result["atom_numbs"]
-                )
-                ptr_data += "%7.3f  %8.4f \n" % (
-                    vol,
-                    task_result["energies"][-1] / sum(task_result["atom_numbs"]),
-                )
+                task_result = load_result(all_res[ii])
+                if isinstance(vol, list):
+                    # lammps_batch: one frame per volume
+                    energies = task_result["energies"]
+                    if len(energies) != len(vol):
+                        raise RuntimeError(
+                            "%d frames for %d volumes in %s, "
+                            'lammps_batch needs "result_frames": "all"'
+                            % (len(energies), len(vol), all_tasks[ii])
+                        )
+                    points = list(zip(vol, energies))
+                else:
+                    points = [(vol, task_result["energies"][-1])]
+                for vv, ee in points:
+                    res_data[vv] = ee / sum(task_result["atom_numbs"])
+                    ptr_data += "%7.3f  %8.4f \n" % (
+                        vv,
+                        ee / sum(task_result["atom_numbs"]),
+                    )
                 # res_data[vol] = all_res[ii]['energy'] / len(all_res[ii]['force'])
                 # ptr_data += '%7.3f  %8.4f \n' % (vol, all_res[ii]['energy'] / len(all_res[ii]['force']))
 
@@ -14,6 +14,8 @@ import dflowautotest.auto_test.lib.abacus as abacus
 import dflowautotest.auto_test.lib.vasp as vasp
 import dflowautotest.lib.abacus_scf as abacus_scf
 #from dflowautotest import dlog
+from dflowautotest.auto_test.lib.result_store import find_result, load_result
+from dflowautotest.auto_test.Lammps import supported_inter
 from dflowautotest.auto_test.Property import Property
 from dflowautotest.auto_test.refine import make_refine
 from dflowautotest.lib.vasp import incar_upper
@@ -49,10 +51,23 @@ class Elastic(Property):
             if "relax_vol" not in parameter["cal_setting"]:
                 parameter["cal_setting"]["relax_vol"] = default_cal_setting["relax_vol"]
         self.cal_setting = parameter["cal_setting"]
+        # compute all the strains in one lammps run
+        parameter["lammps_batch"] = parameter.get("lammps_batch", False)
         # parameter['reproduce'] = False
         # self.reprod = parameter['reproduce']
         self.parameter = parameter
         self.inter_param = inter_param if inter_param != None else {"type": "vasp"}
+        self.lammps_batch = parameter["lammps_batch"]
+        if self.lammps_batch and self.inter_param["type"] not in supported_inter:
+            print(
+                "lammps_batch is not supported by %s, one task per strain"
+                % self.inter_param["type"]
+            )
+            parameter["lammps_batch"] = False
+            self.lammps_batch = False
+        if self.lammps_batch:
+            # every strain is a frame of the task result
+            self.default_result_frames = "all"
 
     def make_confs(self, path_to_work, path_to_equi, refine=False):
         path_to_work = os.path.abspath(path_to_work)
@@ -84,7 +99,6 @@ class Elastic(Property):
             )
 
         task_list = []
-        cwd = os.getcwd()
 
         if self.inter_param["type"] == "abacus":
             CONTCAR = abacus.final_stru(path_to_equi)
@@ -95,12 +109,12 @@ class Elastic(Property):
 
         equi_contcar = os.path.join(path_to_equi, CONTCAR)
 
-        os.chdir(path_to_work)
-        if os.path.isfile(POSCAR):
-            os.remove(POSCAR)
-        if os.path.islink(POSCAR):
-            os.remove(POSCAR)
-        os.symlink(os.path.relpath(equi_contcar), POSCAR)
+        work_poscar = os.path.join(path_to_work, POSCAR)
+        if os.path.isfile(work_poscar):
+            os.remove(work_poscar)
+        if os.path.islink(work_poscar):
+            os.remove(work_poscar)
+        os.symlink(os.path.relpath(equi_contcar, path_to_work), work_poscar)
         #           task_poscar = os.path.join(output, 'POSCAR')
 
         # stress, deal with unsupported stress in dpdata
@@ -109,11 +123,12 @@ class Elastic(Property):
         # equi_stress = np.array(equi_result['stress']['data'])[-1]
         equi_result = loadfn(os.path.join(path_to_equi, "result.json"))
         equi_stress = equi_result["stress"][-1]
-        dumpfn(equi_stress, "equi.stress.json", indent=4)
-        os.chdir(cwd)
+        dumpfn(equi_stress, os.path.join(path_to_work, "equi.stress.json"), indent=4)
 
         if refine:
             print("elastic refine starts")
+            if self.lammps_batch:
+                raise RuntimeError("elastic refine does not support lammps_batch")
             task_list = make_refine(
                 self.parameter["init_from_suffix"],
                 self.parameter["output_suffix"],
@@ -134,15 +149,14 @@ class Elastic(Property):
             for ii in task_list_basename:
                 init_from_task = os.path.join(init_from_path, ii)
                 output_task = os.path.join(path_to_work, ii)
-                os.chdir(output_task)
-                if os.path.isfile("strain.json"):
-                    os.remove("strain.json")
-                copyfile(os.path.join(init_from_task, "strain.json"), "strain.json")
+                task_strain = os.path.join(output_task, "strain.json")
+                if os.path.isfile(task_strain):
+                    os.remove(task_strain)
+                copyfile(os.path.join(init_from_task, "strain.json"), task_strain)
                 # os.symlink(os.path.relpath(
                 #    os.path.join((re.sub(self.parameter['output_suffix'], self.parameter['init_from_suffix'], ii)),
                 #                 'strain.json')),
                 #           'strain.json')
-            os.chdir(cwd)
         else:
             norm_def = self.norm_deform
             shear_def = self.shear_deform
@@ -166,10 +180,11 @@ class Elastic(Property):
 
             print("gen with norm " + str(norm_strains))
             print("gen with shear " + str(shear_strains))
+            if self.lammps_batch:
+                return self._make_batch_confs(path_to_work, equi_contcar, dfm_ss)
             for ii in range(n_dfm):
                 output_task = os.path.join(path_to_work, "task.%06d" % ii)
                 os.makedirs(output_task, exist_ok=True)
-                os.chdir(output_task)
                 for jj in [
                     "INCAR",
                     "POTCAR",
@@ -178,19 +193,54 @@ class Elastic(Property):
                     "in.lammps",
                     "STRU",
                 ]:
-                    if os.path.exists(jj):
-                        os.remove(jj)
+                    if os.path.exists(os.path.join(output_task, jj)):
+                        os.remove(os.path.join(output_task, jj))
                 task_list.append(output_task)
-                dfm_ss.deformed_structures[ii].to("POSCAR", "POSCAR")
+                task_poscar = os.path.join(output_task, "POSCAR")
+                dfm_ss.deformed_structures[ii].to(task_poscar, "POSCAR")
                 if self.inter_param["type"] == "abacus":
-                    abacus.poscar2stru("POSCAR", self.inter_param, "STRU")
-                    os.remove("POSCAR")
+                    task_stru = os.path.join(output_task, "STRU")
+                    abacus.poscar2stru(task_poscar, self.inter_param, task_stru)
+                    os.remove(task_poscar)
                 # record strain
                 df = Strain.from_deformation(dfm_ss.deformations[ii])
-                dumpfn(df.as_dict(), "strain.json", indent=4)
-            os.chdir(cwd)
+                task_strain = os.path.join(output_task, "strain.json")
+                dumpfn(df.as_dict(), task_strain, indent=4)
         return task_list
 
+    def _make_batch_confs(self, path_to_work, equi_contcar, dfm_ss):
+        """
+        Make the single task of the lammps_batch mode. The task starts from
+        the equilibrium configuration, its strain.json lists the strain and
+        batch_cells.json the deformed cell of every deformation.
+        """
+        print("batch %d strains in one lammps task" % len(dfm_ss))
+        output_task = os.path.join(path_to_work, "task.%06d" % 0)
+        os.makedirs(output_task, exist_ok=True)
+        for ii in [
+            "POSCAR",
+            "conf.lmp",
+            "in.lammps",
+            "strain.json",
+            "batch_cells.json",
+        ]:
+            task_file = os.path.join(output_task, ii)
+            if os.path.isfile(task_file) or os.path.islink(task_file):
+                os.remove(task_file)
+        os.symlink(
+            os.path.relpath(equi_contcar, output_task),
+            os.path.join(output_task, "POSCAR"),
+        )
+        strains = []
+        cells = []
+        for ii in range(len(dfm_ss)):
+            df = Strain.from_deformation(dfm_ss.deformations[ii])
+            strains.append(df.as_dict())
+            cells.append(dfm_ss.deformed_structures[ii].lattice.matrix.tolist())
+        dumpfn(strains, os.path.join(output_task, "strain.json"), indent=4)
+        dumpfn(cells, os.path.join(output_task, "batch_cells.json"), indent=4)
+        return [output_task]
+
     def post_process(self, task_list):
         if self.inter_param["type"] == "abacus":
             POSCAR = "STRU"
@@ -201,22 +251,24 @@ class Elastic(Property):
             INCAR = "INCAR"
             KPOINTS = "KPOINTS"
 
-        cwd = os.getcwd()
-        poscar_start = os.path.abspath(os.path.join(task_list[0], "..", POSCAR))
-        os.chdir(os.path.join(task_list[0], ".."))
+        work_dir = os.path.abspath(os.path.join(task_list[0], ".."))
+        poscar_start = os.path.join(work_dir, POSCAR)
         if os.path.isfile(os.path.join(task_list[0], INCAR)):
             if self.inter_param["type"] == "abacus":
-                input_aba = abacus_scf.get_abacus_input_parameters("INPUT")
+                work_input = os.path.join(work_dir, "INPUT")
+                input_aba = abacus_scf.get_abacus_input_parameters(work_input)
                 if "kspacing" in input_aba:
                     kspacing = float(input_aba["kspacing"])
                     kpt = abacus.make_kspacing_kpt(poscar_start, kspacing)
                     kpt += [0, 0, 0]
-                    abacus.write_kpt("KPT", kpt)
+                    abacus.write_kpt(os.path.join(work_dir, "KPT"), kpt)
                     del input_aba["kspacing"]
-                    os.remove("INPUT")
-                    abacus.write_input("INPUT", input_aba)
+                    os.remove(work_input)
+                    abacus.write_input(work_input, input_aba)
                 else:
-                    os.rename(os.path.join(task_list[0], "KPT"), "./KPT")
+                    os.rename(
+                        os.path.join(task_list[0], "KPT"), os.path.join(work_dir, "KPT")
+                    )
             else:
                 incar = incar_upper(
                     Incar.from_file(os.path.join(task_list[0], "INCAR"))
@@ -225,11 +277,11 @@ class Elastic(Property):
                 kgamma = incar.get("KGAMMA", False)
                 ret = vasp.make_kspacing_kpoints(poscar_start, kspacing, kgamma)
                 kp = Kpoints.from_string(ret)
-                if os.path.isfile("KPOINTS"):
-                    os.remove("KPOINTS")
-                kp.write_file("KPOINTS")
+                work_kpoints = os.path.join(work_dir, "KPOINTS")
+                if os.path.isfile(work_kpoints):
+                    os.remove(work_kpoints)
+                kp.write_file(work_kpoints)
 
-            os.chdir(cwd)
             kpoints_universal = os.path.abspath(
                 os.path.join(task_list[0], "..", KPOINTS)
             )
@@ -238,10 +290,9 @@ class Elastic(Property):
                     os.remove(os.path.join(ii, KPOINTS))
                 if os.path.islink(os.path.join(ii, KPOINTS)):
                     os.remove(os.path.join(ii, KPOINTS))
-                os.chdir(ii)
-                os.symlink(os.path.relpath(kpoints_universal), KPOINTS)
-
-        os.chdir(cwd)
+                os.symlink(
+                    os.path.relpath(kpoints_universal, ii), os.path.join(ii, KPOINTS)
+                )
 
     def task_type(self):
         return self.parameter["type"]
@@ -265,7 +316,19 @@ class Elastic(Property):
             # with open(os.path.join(ii, 'result_task.json')) as fin:
             #    task_result = json.load(fin)
             # stress = np.array(task_result['stress']['data'])[-1]
-            stress = loadfn(os.path.join(ii, "result_task.json"))["stress"][-1]
+            if isinstance(strain, list):
+                # lammps_batch: one frame per strain
+                stress = load_result(find_result(ii))["stress"]
+                if len(stress) != len(strain):
+                    raise RuntimeError(
+                        "%d frames for %d strains in %s, "
+                        'lammps_batch needs "result_frames": "all"'
+                        % (len(stress), len(strain), ii)
+                    )
+                lst_strain += strain
+                lst_stress += [Stress(jj * -1000) for jj in stress]
+                continue
+            stress = load_result(find_result(ii))["stress"][-1]
             lst_strain.append(strain)
             lst_stress.append(Stress(stress * -1000))
 
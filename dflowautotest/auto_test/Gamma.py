@@ -14,8 +14,11 @@ from pymatgen.core.surface import SlabGenerator
 from pymatgen.io.ase import AseAtomsAdaptor
 
 import dflowautotest.auto_test.lib.abacus as abacus
+import dflowautotest.auto_test.lib.lammps as lammps
 import dflowautotest.auto_test.lib.vasp as vasp
 #from dpgen import dlog
+from dflowautotest.auto_test.lib.result_store import find_result, load_result
+from dflowautotest.auto_test.Lammps import supported_inter
 from dflowautotest.auto_test.Property import Property
 from dflowautotest.auto_test.refine import make_refine
 from dflowautotest.auto_test.reproduce import make_repro, post_repro
@@ -28,6 +31,9 @@ class Gamma(Property):
     Calculation of common gamma lines for bcc and fcc
     """
 
+    # the area is computed from the cell of the first frame
+    default_result_frames = "all"
+
     def __init__(self, parameter, inter_param=None):
         parameter["reproduce"] = parameter.get("reproduce", False)
         self.reprod = parameter["reproduce"]
@@ -47,6 +53,8 @@ class Gamma(Property):
                 parameter["n_steps"] = parameter.get("n_steps", 10)
                 self.n_steps = parameter["n_steps"]
                 self.atom_num = None
+            # scan all the steps in one lammps run
+            parameter["lammps_batch"] = parameter.get("lammps_batch", False)
             parameter["cal_type"] = parameter.get("cal_type", "relaxation")
             self.cal_type = parameter["cal_type"]
             default_cal_setting = {
@@ -98,6 +106,14 @@ class Gamma(Property):
             self.init_from_suffix = parameter["init_from_suffix"]
         self.parameter = parameter
         self.inter_param = inter_param if inter_param != None else {"type": "vasp"}
+        self.lammps_batch = parameter.get("lammps_batch", False)
+        if self.lammps_batch and self.inter_param["type"] not in supported_inter:
+            print(
+                "lammps_batch is not supported by %s, one task per step"
+                % self.inter_param["type"]
+            )
+            parameter["lammps_batch"] = False
+            self.lammps_batch = False
 
     def make_confs(self, path_to_work, path_to_equi, refine=False):
         path_to_work = os.path.abspath(path_to_work)
@@ -128,7 +144,6 @@ class Gamma(Property):
             )
 
         task_list = []
-        cwd = os.getcwd()
 
         if self.reprod:
             print("gamma line reproduce starts")
@@ -141,17 +156,19 @@ class Gamma(Property):
                 path_to_work,
                 self.parameter.get("reprod_last_frame", True),
             )
-            os.chdir(cwd)
 
         else:
             if refine:
                 print("gamma line refine starts")
+                if self.lammps_batch:
+                    raise RuntimeError(
+                        "gamma line refine does not support lammps_batch"
+                    )
                 task_list = make_refine(
                     self.parameter["init_from_suffix"],
                     self.parameter["output_suffix"],
                     path_to_work,
                 )
-                os.chdir(cwd)
                 # record miller
                 init_from_path = re.sub(
                     self.parameter["output_suffix"][::-1],
@@ -164,16 +181,17 @@ class Gamma(Property):
                 for ii in task_list_basename:
                     init_from_task = os.path.join(init_from_path, ii)
                     output_task = os.path.join(path_to_work, ii)
-                    os.chdir(output_task)
-                    if os.path.isfile("miller.json"):
-                        os.remove("miller.json")
-                    if os.path.islink("miller.json"):
-                        os.remove("miller.json")
+                    task_miller = os.path.join(output_task, "miller.json")
+                    if os.path.isfile(task_miller):
+                        os.remove(task_miller)
+                    if os.path.islink(task_miller):
+                        os.remove(task_miller)
                     os.symlink(
-                        os.path.relpath(os.path.join(init_from_task, "miller.json")),
-                        "miller.json",
+                        os.path.relpath(
+                            os.path.join(init_from_task, "miller.json"), output_task
+                        ),
+                        task_miller,
                     )
-                os.chdir(cwd)
 
             else:
                 if self.inter_param["type"] == "abacus":
@@ -195,20 +213,21 @@ class Gamma(Property):
 
                 if self.inter_param["type"] == "abacus":
                     stru = dpdata.System(equi_contcar, fmt="stru")
-                    stru.to("contcar", "CONTCAR.tmp")
-                    ptypes = vasp.get_poscar_types("CONTCAR.tmp")
-                    ss = Structure.from_file("CONTCAR.tmp")
-                    os.remove("CONTCAR.tmp")
+                    contcar_tmp = os.path.join(path_to_work, "CONTCAR.tmp")
+                    stru.to("contcar", contcar_tmp)
+                    ptypes = vasp.get_poscar_types(contcar_tmp)
+                    ss = Structure.from_file(contcar_tmp)
+                    os.remove(contcar_tmp)
                 else:
                     ptypes = vasp.get_poscar_types(equi_contcar)
                     # read structure from relaxed CONTCAR
                     ss = Structure.from_file(equi_contcar)
 
                 # rewrite new CONTCAR with direct coords
-                os.chdir(path_to_equi)
-                ss.to("CONTCAR.direct", "POSCAR")
+                contcar_direct = os.path.join(path_to_equi, "CONTCAR.direct")
+                ss.to(contcar_direct, "POSCAR")
                 # re-read new CONTCAR
-                ss = Structure.from_file("CONTCAR.direct")
+                ss = Structure.from_file(contcar_direct)
                 relax_a = ss.lattice.a
                 relax_b = ss.lattice.b
                 relax_c = ss.lattice.c
@@ -222,20 +241,23 @@ class Gamma(Property):
                 all_slabs = self.__displace_slab(slab, disp_vector=disp_vector)
                 self.atom_num = len(all_slabs[0].sites)
 
-                os.chdir(path_to_work)
-                if os.path.isfile(POSCAR):
-                    os.remove(POSCAR)
-                if os.path.islink(POSCAR):
-                    os.remove(POSCAR)
-                os.symlink(os.path.relpath(equi_contcar), POSCAR)
+                work_poscar = os.path.join(path_to_work, POSCAR)
+                if os.path.isfile(work_poscar):
+                    os.remove(work_poscar)
+                if os.path.islink(work_poscar):
+                    os.remove(work_poscar)
+                os.symlink(os.path.relpath(equi_contcar, path_to_work), work_poscar)
+                if self.lammps_batch:
+                    return self._make_batch_confs(
+                        path_to_work, all_slabs[0], ptypes, disp_vector
+                    )
                 #           task_poscar = os.path.join(output, 'POSCAR')
                 for ii in range(len(all_slabs)):
                     output_task = os.path.join(path_to_work, "task.%06d" % ii)
                     os.makedirs(output_task, exist_ok=True)
-                    os.chdir(output_task)
                     for jj in ["INCAR", "POTCAR", POSCAR, "conf.lmp", "in.lammps"]:
-                        if os.path.exists(jj):
-                            os.remove(jj)
+                        if os.path.exists(os.path.join(output_task, jj)):
+                            os.remove(os.path.join(output_task, jj))
                     task_list.append(output_task)
                     # print("# %03d generate " % ii, output_task)
                     print(
@@ -244,19 +266,46 @@ class Gamma(Property):
                         " \t %d atoms" % self.atom_num,
                     )
                     # make confs
-                    all_slabs[ii].to("POSCAR.tmp", "POSCAR")
-                    vasp.regulate_poscar("POSCAR.tmp", "POSCAR")
-                    vasp.sort_poscar("POSCAR", "POSCAR", ptypes)
+                    task_poscar = os.path.join(output_task, "POSCAR")
+                    task_poscar_tmp = os.path.join(output_task, "POSCAR.tmp")
+                    all_slabs[ii].to(task_poscar_tmp, "POSCAR")
+                    vasp.regulate_poscar(task_poscar_tmp, task_poscar)
+                    vasp.sort_poscar(task_poscar, task_poscar, ptypes)
                     if self.inter_param["type"] == "abacus":
-                        abacus.poscar2stru("POSCAR", self.inter_param, "STRU")
-                        os.remove("POSCAR")
+                        task_stru = os.path.join(output_task, "STRU")
+                        abacus.poscar2stru(task_poscar, self.inter_param, task_stru)
+                        os.remove(task_poscar)
                     # vasp.perturb_xz('POSCAR', 'POSCAR', self.pert_xz)
                     # record miller
-                    dumpfn(self.miller_index, "miller.json")
-                os.chdir(cwd)
+                    dumpfn(self.miller_index, os.path.join(output_task, "miller.json"))
 
         return task_list
 
+    def _make_batch_confs(self, path_to_work, slab, ptypes, disp_vector):
+        """
+        Make the single task of the lammps_batch mode. The task holds the
+        undisplaced slab, its batch_disps.json lists the fractional
+        displacement of the upper half at every step.
+        """
+        print("batch %d steps in one lammps task" % (self.n_steps + 1))
+        output_task = os.path.join(path_to_work, "task.%06d" % 0)
+        os.makedirs(output_task, exist_ok=True)
+        for ii in ["POSCAR", "conf.lmp", "in.lammps", "batch_disps.json"]:
+            if os.path.exists(os.path.join(output_task, ii)):
+                os.remove(os.path.join(output_task, ii))
+        task_poscar = os.path.join(output_task, "POSCAR")
+        task_poscar_tmp = os.path.join(output_task, "POSCAR.tmp")
+        slab.to(task_poscar_tmp, "POSCAR")
+        vasp.regulate_poscar(task_poscar_tmp, task_poscar)
+        vasp.sort_poscar(task_poscar, task_poscar, ptypes)
+        disps = [
+            (ii / self.n_steps * np.array(disp_vector)).tolist()
+            for ii in range(self.n_steps + 1)
+        ]
+        dumpfn(disps, os.path.join(output_task, "batch_disps.json"), indent=4)
+        dumpfn(self.miller_index, os.path.join(output_task, "miller.json"))
+        return [output_task]
+
     @staticmethod
     def centralize_slab(slab) -> None:
         z_pos_list = list(set([site.position[2] for site in slab]))
@@ -379,17 +428,7 @@ class Gamma(Property):
 
     def __inLammpes_fix(self, inLammps) -> None:
         # add position fix condition of x and y of in.lammps
-        fix_dict = {"true": "0", "false": "NULL"}
-        add_fix_str = (
-            "fix             1 all setforce"
-            + " "
-            + fix_dict[self.add_fix[0]]
-            + " "
-            + fix_dict[self.add_fix[1]]
-            + " "
-            + fix_dict[self.add_fix[2]]
-            + "\n"
-        )
+        add_fix_str = lammps.make_setforce_fix(self.add_fix)
         with open(inLammps, "r") as fin1:
             contents = fin1.readlines()
             for ii in range(len(contents)):
@@ -408,7 +447,8 @@ class Gamma(Property):
                 fin2.write(contents[ii])
 
     def post_process(self, task_list):
-        if self.add_fix:
+        # the lammps_batch input has the fix already
+        if self.add_fix and not self.lammps_batch:
             count = 0
             for ii in task_list:
                 count += 1
@@ -419,6 +459,9 @@ class Gamma(Property):
                     self.__poscar_fix(poscar)
                 elif calc_type == "abacus":
                     self.__stru_fix(os.path.join(ii, "STRU"))
+                elif calc_type == "ase":
+                    # the fix is in ase.json already
+                    pass
                 else:
                     inLammps = os.path.join(ii, "in.lammps")
                     if count == 1:
@@ -443,48 +486,70 @@ class Gamma(Property):
             )
             ptr_data += "No_task: \tDisplacement \tStacking_Fault_E(J/m^2) EpA(eV) slab_equi_EpA(eV)\n"
             all_tasks.sort()
-            task_result_slab_equi = loadfn(
-                os.path.join(all_tasks[0], "result_task.json")
-            )
+            # the energy table, one row per step:
+            # (step name, displacement, energy, area, natoms, miller index)
+            steps = []
             for ii in all_tasks:
-                task_result = loadfn(os.path.join(ii, "result_task.json"))
+                task_result = load_result(find_result(ii))
                 natoms = np.sum(task_result["atom_numbs"])
-                epa = task_result["energies"][-1] / natoms
-                equi_epa_slab = task_result_slab_equi["energies"][-1] / natoms
                 AA = np.linalg.norm(
                     np.cross(task_result["cells"][0][0], task_result["cells"][0][1])
                 )
-
-                equi_path = os.path.abspath(
-                    os.path.join(
-                        os.path.dirname(output_file), "../relaxation/relax_task"
-                    )
-                )
-                equi_result = loadfn(os.path.join(equi_path, "result.json"))
-                equi_epa = equi_result["energies"][-1] / np.sum(
-                    equi_result["atom_numbs"]
-                )
-                structure_dir = os.path.basename(ii)
-
-                Cf = 1.60217657e-16 / 1e-20 * 0.001
-                sfe = (
-                    (
-                        task_result["energies"][-1]
-                        - task_result_slab_equi["energies"][-1]
+                miller_index = loadfn(os.path.join(ii, "miller.json"))
+                batch_disps = os.path.join(ii, "batch_disps.json")
+                if os.path.isfile(batch_disps):
+                    # lammps_batch: one frame per step
+                    energies = task_result["energies"]
+                    n_disps = len(loadfn(batch_disps))
+                    if len(energies) != n_disps:
+                        raise RuntimeError(
+                            "%d frames for %d steps in %s, "
+                            'lammps_batch needs "result_frames": "all"'
+                            % (len(energies), n_disps, ii)
+                        )
+                    for jj in range(n_disps):
+                        steps.append(
+                            (
+                                "task.%06d" % jj,
+                                jj / self.n_steps,
+                                energies[jj],
+                                AA,
+                                natoms,
+                                miller_index,
+                            )
+                        )
+                else:
+                    steps.append(
+                        (
+                            os.path.basename(ii),
+                            int(ii[-4:]) / self.n_steps,
+                            task_result["energies"][-1],
+                            AA,
+                            natoms,
+                            miller_index,
+                        )
                     )
-                    / AA
-                    * Cf
-                )
 
-                miller_index = loadfn(os.path.join(ii, "miller.json"))
+            equi_path = os.path.abspath(
+                os.path.join(os.path.dirname(output_file), "../relaxation/relax_task")
+            )
+            equi_result = loadfn(os.path.join(equi_path, "result.json"))
+            equi_epa = equi_result["energies"][-1] / np.sum(equi_result["atom_numbs"])
+            slab_equi_energy = steps[0][2]
+
+            Cf = 1.60217657e-16 / 1e-20 * 0.001
+            for structure_dir, disp, energy, AA, natoms, miller_index in steps:
+                epa = energy / natoms
+                equi_epa_slab = slab_equi_energy / natoms
+                sfe = (energy - slab_equi_energy) / AA * Cf
                 ptr_data += "%-25s     %7.2f   %7.3f    %8.3f %8.3f\n" % (
                     str(miller_index) + "-" + structure_dir + ":",
-                    int(ii[-4:]) / self.n_steps,
+                    disp,
                     sfe,
                     epa,
                     equi_epa_slab,
                 )
-                res_data[int(ii[-4:]) / self.n_steps] = [sfe, epa, equi_epa]
+                res_data[disp] = [sfe, epa, equi_epa]
 
         else:
             if "init_data_path" not in self.parameter:
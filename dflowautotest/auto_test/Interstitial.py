@@ -11,6 +11,7 @@ from pymatgen.core.structure import Structure
 import dflowautotest.auto_test.lib.abacus as abacus
 import dflowautotest.auto_test.lib.lammps as lammps
 import dflowautotest.lib.abacus_scf as abacus_scf
+from dflowautotest.auto_test.lib.result_store import load_result
 from dflowautotest.auto_test.Property import Property
 from dflowautotest.auto_test.refine import make_refine
 from dflowautotest.auto_test.reproduce import make_repro, post_repro
@@ -105,7 +106,6 @@ class Interstitial(Property):
             )
 
         task_list = []
-        cwd = os.getcwd()
 
         if self.reprod:
             print("interstitial reproduce starts")
@@ -119,7 +119,6 @@ class Interstitial(Property):
                 path_to_work,
                 self.parameter.get("reprod_last_frame", False),
             )
-            os.chdir(cwd)
 
         else:
             if refine:
@@ -138,30 +137,32 @@ class Interstitial(Property):
                 )[::-1]
                 task_list_basename = list(map(os.path.basename, task_list))
 
-                os.chdir(path_to_work)
-                if os.path.isfile("element.out"):
-                    os.remove("element.out")
-                if os.path.islink("element.out"):
-                    os.remove("element.out")
+                work_element = os.path.join(path_to_work, "element.out")
+                if os.path.isfile(work_element):
+                    os.remove(work_element)
+                if os.path.islink(work_element):
+                    os.remove(work_element)
                 os.symlink(
-                    os.path.relpath(os.path.join(init_from_path, "element.out")),
-                    "element.out",
+                    os.path.relpath(
+                        os.path.join(init_from_path, "element.out"), path_to_work
+                    ),
+                    work_element,
                 )
-                os.chdir(cwd)
 
                 for ii in task_list_basename:
                     init_from_task = os.path.join(init_from_path, ii)
                     output_task = os.path.join(path_to_work, ii)
-                    os.chdir(output_task)
-                    if os.path.isfile("supercell.json"):
-                        os.remove("supercell.json")
-                    if os.path.islink("supercell.json"):
-                        os.remove("supercell.json")
+                    task_supercell = os.path.join(output_task, "supercell.json")
+                    if os.path.isfile(task_supercell):
+                        os.remove(task_supercell)
+                    if os.path.islink(task_supercell):
+                        os.remove(task_supercell)
                     os.symlink(
-                        os.path.relpath(os.path.join(init_from_task, "supercell.json")),
-                        "supercell.json",
+                        os.path.relpath(
+                            os.path.join(init_from_task, "supercell.json"), output_task
+                        ),
+                        task_supercell,
                     )
-                os.chdir(cwd)
 
             else:
                 if self.inter_param["type"] == "abacus":
@@ -215,18 +216,17 @@ class Interstitial(Property):
                     + " with element "
                     + str(self.insert_ele)
                 )
-                os.chdir(path_to_work)
-                if os.path.isfile(POSCAR):
-                    os.remove(POSCAR)
-                if os.path.islink(POSCAR):
-                    os.remove(POSCAR)
-                os.symlink(os.path.relpath(equi_contcar), POSCAR)
+                work_poscar = os.path.join(path_to_work, POSCAR)
+                if os.path.isfile(work_poscar):
+                    os.remove(work_poscar)
+                if os.path.islink(work_poscar):
+                    os.remove(work_poscar)
+                os.symlink(os.path.relpath(equi_contcar, path_to_work), work_poscar)
                 #           task_poscar = os.path.join(output, 'POSCAR')
 
                 for ii in range(len(dss)):
                     output_task = os.path.join(path_to_work, "task.%06d" % ii)
                     os.makedirs(output_task, exist_ok=True)
-                    os.chdir(output_task)
                     for jj in [
                         "INCAR",
                         "POTCAR",
@@ -235,13 +235,12 @@ class Interstitial(Property):
                         "in.lammps",
                         "STRU",
                     ]:
-                        if os.path.exists(jj):
-                            os.remove(jj)
+                        if os.path.exists(os.path.join(output_task, jj)):
+                            os.remove(os.path.join(output_task, jj))
                     task_list.append(output_task)
-                    dss[ii].to("POSCAR", "POSCAR")
+                    dss[ii].to(os.path.join(output_task, "POSCAR"), "POSCAR")
                     # np.savetxt('supercell.out', self.supercell, fmt='%d')
-                    dumpfn(self.supercell, "supercell.json")
-                os.chdir(cwd)
+                    dumpfn(self.supercell, os.path.join(output_task, "supercell.json"))
 
                 if "bcc_self" in self.parameter and self.parameter["bcc_self"]:
                     super_size = (
@@ -249,28 +248,27 @@ class Interstitial(Property):
                     )
                     num_atom = super_size * 2
                     chl = -num_atom - 2
-                    os.chdir(path_to_work)
-                    with open("POSCAR", "r") as fin:
+                    with open(os.path.join(path_to_work, "POSCAR"), "r") as fin:
                         fin.readline()
                         scale = float(fin.readline().split()[0])
                         latt_param = float(fin.readline().split()[0])
                         latt_param *= scale
 
-                    if not os.path.isfile("task.000000/POSCAR"):
+                    ref_poscar = os.path.join(path_to_work, "task.000000/POSCAR")
+                    if not os.path.isfile(ref_poscar):
                         raise RuntimeError("need task.000000 structure as reference")
 
-                    with open("task.000000/POSCAR", "r") as fin:
+                    with open(ref_poscar, "r") as fin:
                         pos_line = fin.read().split("\n")
 
                     super_latt_param = float(pos_line[2].split()[0])
 
                     output_task1 = os.path.join(path_to_work, "task.%06d" % (len(dss)))
                     os.makedirs(output_task1, exist_ok=True)
-                    os.chdir(output_task1)
                     task_list.append(output_task1)
                     with open(insert_element_task, "a+") as fout:
                         print(self.insert_ele[0], file=fout)
-                    dumpfn(self.supercell, "supercell.json")
+                    dumpfn(self.supercell, os.path.join(output_task1, "supercell.json"))
                     pos_line[chl] = (
                         "%.6f" % float(latt_param / 4 / super_latt_param)
                         + " "
@@ -278,21 +276,19 @@ class Interstitial(Property):
                         + " 0.000000 "
                         + self.insert_ele[0]
                     )
-                    with open("POSCAR", "w+") as fout:
+                    with open(os.path.join(output_task1, "POSCAR"), "w+") as fout:
                         for ii in pos_line:
                             print(ii, file=fout)
                     print("gen bcc tetrahedral")
-                    os.chdir(cwd)
 
                     output_task2 = os.path.join(
                         path_to_work, "task.%06d" % (len(dss) + 1)
                     )
                     os.makedirs(output_task2, exist_ok=True)
-                    os.chdir(output_task2)
                     task_list.append(output_task2)
                     with open(insert_element_task, "a+") as fout:
                         print(self.insert_ele[0], file=fout)
-                    dumpfn(self.supercell, "supercell.json")
+                    dumpfn(self.supercell, os.path.join(output_task2, "supercell.json"))
                     pos_line[chl] = (
                         "%.6f" % float(latt_param / 2 / super_latt_param)
                         + " "
@@ -300,21 +296,19 @@ class Interstitial(Property):
                         + " 0.000000 "
                         + self.insert_ele[0]
                     )
-                    with open("POSCAR", "w+") as fout:
+                    with open(os.path.join(output_task2, "POSCAR"), "w+") as fout:
                         for ii in pos_line:
                             print(ii, file=fout)
                     print("gen bcc octahedral")
-                    os.chdir(cwd)
 
                     output_task3 = os.path.join(
                         path_to_work, "task.%06d" % (len(dss) + 2)
                     )
                     os.makedirs(output_task3, exist_ok=True)
-                    os.chdir(output_task3)
                     task_list.append(output_task3)
                     with open(insert_element_task, "a+") as fout:
                         print(self.insert_ele[0], file=fout)
-                    dumpfn(self.supercell, "supercell.json")
+                    dumpfn(self.supercell, os.path.join(output_task3, "supercell.json"))
                     pos_line[chl] = (
                         "%.6f" % float(latt_param / 4 / super_latt_param)
                         + " "
@@ -324,11 +318,10 @@ class Interstitial(Property):
                         + " "
                         + self.insert_ele[0]
                     )
-                    with open("POSCAR", "w+") as fout:
+                    with open(os.path.join(output_task3, "POSCAR"), "w+") as fout:
                         for ii in pos_line:
                             print(ii, file=fout)
                     print("gen bcc crowdion")
-                    os.chdir(cwd)
 
                     for idx, ii in enumerate(pos_line):
                         ss = ii.split()
@@ -351,11 +344,10 @@ class Interstitial(Property):
                         path_to_work, "task.%06d" % (len(dss) + 3)
                     )
                     os.makedirs(output_task4, exist_ok=True)
-                    os.chdir(output_task4)
                     task_list.append(output_task4)
                     with open(insert_element_task, "a+") as fout:
                         print(self.insert_ele[0], file=fout)
-                    dumpfn(self.supercell, "supercell.json")
+                    dumpfn(self.supercell, os.path.join(output_task4, "supercell.json"))
                     pos_line[chl] = (
                         "%.6f" % float(latt_param / 3 / super_latt_param)
                         + " "
@@ -375,21 +367,19 @@ class Interstitial(Property):
                         + self.insert_ele[0]
                     )
 
-                    with open("POSCAR", "w+") as fout:
+                    with open(os.path.join(output_task4, "POSCAR"), "w+") as fout:
                         for ii in pos_line:
                             print(ii, file=fout)
                     print("gen bcc <111> dumbbell")
-                    os.chdir(cwd)
 
                     output_task5 = os.path.join(
                         path_to_work, "task.%06d" % (len(dss) + 4)
                     )
                     os.makedirs(output_task5, exist_ok=True)
-                    os.chdir(output_task5)
                     task_list.append(output_task5)
                     with open(insert_element_task, "a+") as fout:
                         print(self.insert_ele[0], file=fout)
-                    dumpfn(self.supercell, "supercell.json")
+                    dumpfn(self.supercell, os.path.join(output_task5, "supercell.json"))
                     pos_line[chl] = (
                         "%.6f"
                         % float((latt_param + 2.1 / 2**0.5) / 2 / super_latt_param)
@@ -413,21 +403,19 @@ class Interstitial(Property):
                         + self.insert_ele[0]
                     )
 
-                    with open("POSCAR", "w+") as fout:
+                    with open(os.path.join(output_task5, "POSCAR"), "w+") as fout:
                         for ii in pos_line:
                             print(ii, file=fout)
                     print("gen bcc <110> dumbbell")
-                    os.chdir(cwd)
 
                     output_task6 = os.path.join(
                         path_to_work, "task.%06d" % (len(dss) + 5)
                     )
                     os.makedirs(output_task6, exist_ok=True)
-                    os.chdir(output_task6)
                     task_list.append(output_task6)
                     with open(insert_element_task, "a+") as fout:
                         print(self.insert_ele[0], file=fout)
-                    dumpfn(self.supercell, "supercell.json")
+                    dumpfn(self.supercell, os.path.join(output_task6, "supercell.json"))
                     pos_line[chl] = (
                         "%.6f" % float(latt_param / 2 / super_latt_param)
                         + " "
@@ -447,11 +435,10 @@ class Interstitial(Property):
                         + self.insert_ele[0]
                     )
 
-                    with open("POSCAR", "w+") as fout:
+                    with open(os.path.join(output_task6, "POSCAR"), "w+") as fout:
                         for ii in pos_line:
                             print(ii, file=fout)
                     print("gen bcc <100> dumbbell")
-                    os.chdir(cwd)
 
                     total_task = len(dss) + 6
                 else:
@@ -460,10 +447,10 @@ class Interstitial(Property):
                 if self.inter_param["type"] == "abacus":
                     for ii in range(total_task):
                         output_task = os.path.join(path_to_work, "task.%06d" % ii)
-                        os.chdir(output_task)
-                        abacus.poscar2stru("POSCAR", self.inter_param, "STRU")
-                        os.remove("POSCAR")
-                    os.chdir(cwd)
+                        task_poscar = os.path.join(output_task, "POSCAR")
+                        task_stru = os.path.join(output_task, "STRU")
+                        abacus.poscar2stru(task_poscar, self.inter_param, task_stru)
+                        os.remove(task_poscar)
 
         return task_list
 
@@ -516,7 +503,7 @@ class Interstitial(Property):
             for ii in all_tasks:
                 idid += 1
                 structure_dir = os.path.basename(ii)
-                task_result = loadfn(all_res[idid])
+                task_result = load_result(all_res[idid])
                 natoms = task_result["atom_numbs"][0]
                 equi_path = os.path.abspath(
                     os.path.join(
@@ -1,9 +1,12 @@
 import os
 import warnings
 
+import numpy as np
+
 from monty.serialization import dumpfn, loadfn
 
 import dflowautotest.auto_test.lib.lammps as lammps
+import dflowautotest.auto_test.lib.vasp as vasp
 #from dpgen import dlog
 from dflowautotest.auto_test.lib.lammps import (
     inter_deepmd,
@@ -64,57 +67,57 @@ class Lammps(Task):
             self.model_param = {"model_name": [model_name], "param_type": self.type_map}
 
     def make_potential_files(self, output_dir):
-        cwd = os.getcwd()
+        parent_dir = os.path.join(output_dir, "../")
         if self.inter_type == "meam":
             model_lib = os.path.basename(self.model[0])
             model_file = os.path.basename(self.model[1])
-            os.chdir(os.path.join(output_dir, "../"))
-            if os.path.islink(model_lib):
-                link_lib = os.readlink(model_lib)
+            parent_lib = os.path.join(parent_dir, model_lib)
+            parent_file = os.path.join(parent_dir, model_file)
+            if os.path.islink(parent_lib):
+                link_lib = os.path.join(parent_dir, os.readlink(parent_lib))
                 if not os.path.abspath(link_lib) == self.model[0]:
-                    os.remove(model_lib)
-                    os.symlink(os.path.relpath(self.model[0]), model_lib)
+                    os.remove(parent_lib)
+                    os.symlink(os.path.relpath(self.model[0], parent_dir), parent_lib)
             else:
-                os.symlink(os.path.relpath(self.model[0]), model_lib)
+                os.symlink(os.path.relpath(self.model[0], parent_dir), parent_lib)
 
-            if os.path.islink(model_file):
-                link_file = os.readlink(model_file)
+            if os.path.islink(parent_file):
+                link_file = os.path.join(parent_dir, os.readlink(parent_file))
                 if not os.path.abspath(link_file) == self.model[1]:
-                    os.remove(model_file)
-                    os.symlink(os.path.relpath(self.model[1]), model_file)
+                    os.remove(parent_file)
+                    os.symlink(os.path.relpath(self.model[1], parent_dir), parent_file)
             else:
-                os.symlink(os.path.relpath(self.model[1]), model_file)
-            os.chdir(output_dir)
-            if not os.path.islink(model_lib):
-                os.symlink(os.path.join("..", model_lib), model_lib)
-            elif not os.path.join("..", model_lib) == os.readlink(model_lib):
-                os.remove(model_lib)
-                os.symlink(os.path.join("..", model_lib), model_lib)
-
-            if not os.path.islink(model_file):
-                os.symlink(os.path.join("..", model_file), model_file)
-            elif not os.path.join("..", model_file) == os.readlink(model_file):
-                os.remove(model_file)
-                os.symlink(os.path.join("..", model_file), model_file)
-            os.chdir(cwd)
+                os.symlink(os.path.relpath(self.model[1], parent_dir), parent_file)
+            task_lib = os.path.join(output_dir, model_lib)
+            task_file = os.path.join(output_dir, model_file)
+            if not os.path.islink(task_lib):
+                os.symlink(os.path.join("..", model_lib), task_lib)
+            elif not os.path.join("..", model_lib) == os.readlink(task_lib):
+                os.remove(task_lib)
+                os.symlink(os.path.join("..", model_lib), task_lib)
+
+            if not os.path.islink(task_file):
+                os.symlink(os.path.join("..", model_file), task_file)
+            elif not os.path.join("..", model_file) == os.readlink(task_file):
+                os.remove(task_file)
+                os.symlink(os.path.join("..", model_file), task_file)
 
         else:
             model_file = os.path.basename(self.model)
-            os.chdir(os.path.join(output_dir, "../"))
-            if os.path.islink(model_file):
-                link_file = os.readlink(model_file)
+            parent_file = os.path.join(parent_dir, model_file)
+            if os.path.islink(parent_file):
+                link_file = os.path.join(parent_dir, os.readlink(parent_file))
                 if not os.path.abspath(link_file) == self.model:
-                    os.remove(model_file)
-                    os.symlink(os.path.relpath(self.model), model_file)
+                    os.remove(parent_file)
+                    os.symlink(os.path.relpath(self.model, parent_dir), parent_file)
             else:
-                os.symlink(os.path.relpath(self.model), model_file)
-            os.chdir(output_dir)
-            if not os.path.islink(model_file):
-                os.symlink(os.path.join("..", model_file), model_file)
-            elif not os.path.join("..", model_file) == os.readlink(model_file):
-                os.remove(model_file)
-                os.symlink(os.path.join("..", model_file), model_file)
-            os.chdir(cwd)
+                os.symlink(os.path.relpath(self.model, parent_dir), parent_file)
+            task_file = os.path.join(output_dir, model_file)
+            if not os.path.islink(task_file):
+                os.symlink(os.path.join("..", model_file), task_file)
+            elif not os.path.join("..", model_file) == os.readlink(task_file):
+                os.remove(task_file)
+                os.symlink(os.path.join("..", model_file), task_file)
 
         dumpfn(self.inter, os.path.join(output_dir, "inter.json"), indent=4)
 
@@ -178,7 +181,50 @@ class Lammps(Task):
                 )
                 maxeval = cal_setting["maxeval"]
 
-            if cal_type == "relaxation":
+            if task_param.get("lammps_batch", False):
+                # one run for all the cells in batch_cells.json,
+                # or all the steps of a gamma line
+                if cal_type == "relaxation":
+                    relax_pos = cal_setting["relax_pos"]
+                    relax_shape = cal_setting["relax_shape"] and task_type != "eos"
+                    if relax_shape or cal_setting["relax_vol"]:
+                        raise RuntimeError("lammps_batch only relaxes the positions")
+                elif cal_type == "static":
+                    relax_pos = False
+                else:
+                    raise RuntimeError("not supported calculation type for LAMMPS")
+                if task_type == "gamma":
+                    # the displacements of the upper half of the slab
+                    disps = loadfn(os.path.join(output_dir, "batch_disps.json"))
+                    fc = lammps.make_lammps_gamma(
+                        "conf.lmp",
+                        self.type_map,
+                        self.inter_func,
+                        self.model_param,
+                        disps,
+                        task_param["add_fix"],
+                        relax_pos,
+                        etol,
+                        ftol,
+                        maxiter,
+                        maxeval,
+                    )
+                else:
+                    cells = loadfn(os.path.join(output_dir, "batch_cells.json"))
+                    fc = lammps.make_lammps_batch(
+                        "conf.lmp",
+                        self.type_map,
+                        self.inter_func,
+                        self.model_param,
+                        [lammps.cell_to_box(ii) for ii in cells],
+                        relax_pos,
+                        etol,
+                        ftol,
+                        maxiter,
+                        maxeval,
+                    )
+
+            elif cal_type == "relaxation":
                 relax_pos = cal_setting["relax_pos"]
                 relax_shape = cal_setting["relax_shape"]
                 relax_vol = cal_setting["relax_vol"]
@@ -278,19 +324,17 @@ class Lammps(Task):
         if task_type not in in_lammps_not_link_list:
             with open(os.path.join(output_dir, "../in.lammps"), "w") as fp:
                 fp.write(fc)
-            cwd = os.getcwd()
-            os.chdir(output_dir)
-            if not (os.path.islink("in.lammps") or os.path.isfile("in.lammps")):
-                os.symlink("../in.lammps", "in.lammps")
+            task_in = os.path.join(output_dir, "in.lammps")
+            if not (os.path.islink(task_in) or os.path.isfile(task_in)):
+                os.symlink("../in.lammps", task_in)
             else:
-                os.remove("in.lammps")
-                os.symlink("../in.lammps", "in.lammps")
-            os.chdir(cwd)
+                os.remove(task_in)
+                os.symlink("../in.lammps", task_in)
         else:
             with open(os.path.join(output_dir, "in.lammps"), "w") as fp:
                 fp.write(fc)
 
-    def compute(self, output_dir):
+    def compute(self, output_dir, result_frames="all"):
         log_lammps = os.path.join(output_dir, "log.lammps")
         dump_lammps = os.path.join(output_dir, "dump.relax")
         if not os.path.isfile(log_lammps):
@@ -300,134 +344,37 @@ class Lammps(Task):
             warnings.warn("cannot find dump.relax in " + output_dir + " skip")
             return None
         else:
-            box = []
-            coord = []
-            vol = []
-            energy = []
-            force = []
-            virial = []
-            stress = []
-            with open(dump_lammps, "r") as fin:
-                dump = fin.read().split("\n")
-            dumptime = []
-            for idx, ii in enumerate(dump):
-                if ii == "ITEM: TIMESTEP":
-                    box.append([])
-                    coord.append([])
-                    force.append([])
-                    dumptime.append(int(dump[idx + 1]))
-                    natom = int(dump[idx + 3])
-                    xlo_bound = float(dump[idx + 5].split()[0])
-                    xhi_bound = float(dump[idx + 5].split()[1])
-                    xy = float(dump[idx + 5].split()[2])
-                    ylo_bound = float(dump[idx + 6].split()[0])
-                    yhi_bound = float(dump[idx + 6].split()[1])
-                    xz = float(dump[idx + 6].split()[2])
-                    zlo = float(dump[idx + 7].split()[0])
-                    zhi = float(dump[idx + 7].split()[1])
-                    yz = float(dump[idx + 7].split()[2])
-                    xx = (
-                        xhi_bound
-                        - max([0, xy, xz, xy + xz])
-                        - (xlo_bound - min([0, xy, xz, xy + xz]))
-                    )
-                    yy = yhi_bound - max([0, yz]) - (ylo_bound - min([0, yz]))
-                    zz = zhi - zlo
-                    box[-1].append([xx, 0.0, 0.0])
-                    box[-1].append([xy, yy, 0.0])
-                    box[-1].append([xz, yz, zz])
-                    vol.append(xx * yy * zz)
-                    type_list = []
-                    for jj in range(natom):
-                        type_list.append(int(dump[idx + 9 + jj].split()[1]) - 1)
-                        if "xs ys zs" in dump[idx + 8]:
-                            a_x = (
-                                float(dump[idx + 9 + jj].split()[2]) * xx
-                                + float(dump[idx + 9 + jj].split()[3]) * xy
-                                + float(dump[idx + 9 + jj].split()[4]) * xz
-                            )
-                            a_y = (
-                                float(dump[idx + 9 + jj].split()[3]) * yy
-                                + float(dump[idx + 9 + jj].split()[4]) * yz
-                            )
-                            a_z = float(dump[idx + 9 + jj].split()[4]) * zz
-                        else:
-                            a_x = float(dump[idx + 9 + jj].split()[2])
-                            a_y = float(dump[idx + 9 + jj].split()[3])
-                            a_z = float(dump[idx + 9 + jj].split()[4])
-                        coord[-1].append([a_x, a_y, a_z])
-                        fx = float(dump[idx + 9 + jj].split()[5])
-                        fy = float(dump[idx + 9 + jj].split()[6])
-                        fz = float(dump[idx + 9 + jj].split()[7])
-                        force[-1].append([fx, fy, fz])
-
-            with open(log_lammps, "r") as fp:
-                if "Total wall time:" not in fp.read():
-                    warnings.warn("lammps not finished " + log_lammps + " skip")
-                    return None
-                else:
-                    fp.seek(0)
-                    lines = fp.read().split("\n")
-                    idid = -1
-                    for ii in dumptime:
-                        idid += 1
-                        for jj in lines:
-                            line = jj.split()
-                            if len(line) and str(ii) == line[0]:
-                                try:
-                                    [float(kk) for kk in line]
-                                except Exception:
-                                    continue
-                                stress.append([])
-                                virial.append([])
-                                energy.append(float(line[1]))
-                                # virials = stress * vol * 1e5 *1e-30 * 1e19/1.6021766208
-                                stress[-1].append(
-                                    [
-                                        float(line[2]) / 1000.0,
-                                        float(line[5]) / 1000.0,
-                                        float(line[6]) / 1000.0,
-                                    ]
-                                )
-                                stress[-1].append(
-                                    [
-                                        float(line[5]) / 1000.0,
-                                        float(line[3]) / 1000.0,
-                                        float(line[7]) / 1000.0,
-                                    ]
-                                )
-                                stress[-1].append(
-                                    [
-                                        float(line[6]) / 1000.0,
-                                        float(line[7]) / 1000.0,
-                                        float(line[4]) / 1000.0,
-                                    ]
-                                )
-                                stress_to_virial = (
-                                    vol[idid] * 1e5 * 1e-30 * 1e19 / 1.6021766208
-                                )
-                                virial[-1].append(
-                                    [
-                                        float(line[2]) * stress_to_virial,
-                                        float(line[5]) * stress_to_virial,
-                                        float(line[6]) * stress_to_virial,
-                                    ]
-                                )
-                                virial[-1].append(
-                                    [
-                                        float(line[5]) * stress_to_virial,
-                                        float(line[3]) * stress_to_virial,
-                                        float(line[7]) * stress_to_virial,
-                                    ]
-                                )
-                                virial[-1].append(
-                                    [
-                                        float(line[6]) * stress_to_virial,
-                                        float(line[7]) * stress_to_virial,
-                                        float(line[4]) * stress_to_virial,
-                                    ]
-                                )
-                                break
+            dumptime, box, vol, coord, force, type_list = lammps.read_dump_frames(
+                dump_lammps, result_frames
+            )
+
+            if not lammps.check_finished(log_lammps):
+                warnings.warn("lammps not finished " + log_lammps + " skip")
+                return None
+            steps, thermo = lammps.read_thermo_table(log_lammps)
+
+            # join the thermo rows to the dump frames by timestep
+            pos = np.searchsorted(steps, dumptime)
+            found = pos < len(steps)
+            found[found] = steps[pos[found]] == dumptime[found]
+            thermo = thermo[pos[found]]
+            energy = thermo[:, 1]
+            # pxx pyy pzz pxy pxz pyz -> 3x3 stress tensor
+            press = thermo[:, [[2, 5, 6], [5, 3, 7], [6, 7, 4]]]
+            stress = press / 1000.0
+            # virials = stress * vol * 1e5 *1e-30 * 1e19/1.6021766208
+            stress_to_virial = vol[found] * 1e5 * 1e-30 * 1e19 / 1.6021766208
+            virial = press * stress_to_virial[:, None, None]
+
+            dumptime = dumptime.tolist()
+            box = box.tolist()
+            vol = vol.tolist()
+            coord = coord.tolist()
+            force = force.tolist()
+            type_list = type_list.tolist()
+            energy = energy.tolist()
+            stress = stress.tolist()
+            virial = virial.tolist()
 
             _tmp = self.type_map
             #dlog.debug(_tmp)
@@ -436,11 +383,7 @@ class Lammps(Task):
             type_map_idx = list(range(len(type_map_list)))
             atom_numbs = []
             for ii in type_map_idx:
-                count = 0
-                for jj in type_list:
-                    if jj == ii:
-                        count += 1
-                atom_numbs.append(count)
+                atom_numbs.append(type_list.count(ii))
 
             # d_dump = dpdata.System(dump_lammps, fmt='lammps/dump', type_map=type_map_list)
             # d_dump.to('vasp/poscar', contcar, frame_idx=-1)
@@ -503,9 +446,7 @@ class Lammps(Task):
             }
 
             contcar = os.path.join(output_dir, "CONTCAR")
-            dumpfn(result_dict, contcar, indent=4)
-            d_dump = loadfn(contcar)
-            d_dump.to("vasp/poscar", contcar, frame_idx=-1)
+            vasp.write_poscar(contcar, box[-1], coord[-1], type_list, type_map_list)
 
             return result_dict
 
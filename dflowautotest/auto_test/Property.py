@@ -3,14 +3,33 @@ import json
 import os
 from abc import ABC, abstractmethod
 
-from monty.serialization import dumpfn
-
 from dflowautotest.auto_test.calculator import make_calculator
+from dflowautotest.auto_test.lib.result_store import dump_result
 from dflow.python import upload_packages
 upload_packages.append(__file__)
 
 
+def compute_task(task_dir, result_frames="all", result_format="npz"):
+    """
+    Compute the output of one finished task and store it in the task directory
+
+    Returns
+    -------
+    res_path: str
+        The path of the stored result
+    """
+    with open(os.path.join(task_dir, "inter.json")) as fp:
+        idata = json.load(fp)
+    poscar = os.path.join(task_dir, "POSCAR")
+    task = make_calculator(idata, poscar)
+    res = task.compute(task_dir, result_frames)
+    return dump_result(res, task_dir, result_format)
+
+
 class Property(ABC):
+    # frames kept in the task results when "result_frames" is not given
+    default_result_frames = "last"
+
     @abstractmethod
     def __init__(self, parameter):
         """
@@ -70,6 +89,28 @@ class Property(ABC):
         """
         pass
 
+    def get_task_dirs(self, path_to_work):
+        """
+        The sorted task directories in path_to_work
+        """
+        path_to_work = os.path.abspath(path_to_work)
+        task_dirs = glob.glob(os.path.join(path_to_work, "task.[0-9]*[0-9]"))
+        task_dirs.sort()
+        return task_dirs
+
+    def get_result_settings(self):
+        """
+        The frames and the format of the stored task results
+        """
+        # the reproduced tasks need every frame
+        if self.parameter.get("reproduce", False):
+            default_frames = "all"
+        else:
+            default_frames = self.default_result_frames
+        result_frames = self.parameter.get("result_frames", default_frames)
+        result_format = self.parameter.get("result_format", "npz")
+        return result_frames, result_format
+
     def compute(self, output_file, print_file, path_to_work):
         """
         Postprocess the finished tasks to compute the property.
@@ -84,20 +125,29 @@ class Property(ABC):
         path_to_work:
             The working directory where the computational tasks locate.
         """
-        path_to_work = os.path.abspath(path_to_work)
-        task_dirs = glob.glob(os.path.join(path_to_work, "task.[0-9]*[0-9]"))
-        task_dirs.sort()
+        task_dirs = self.get_task_dirs(path_to_work)
+        result_frames, result_format = self.get_result_settings()
         all_res = []
         for ii in task_dirs:
-            with open(os.path.join(ii, "inter.json")) as fp:
-                idata = json.load(fp)
-            poscar = os.path.join(ii, "POSCAR")
-            task = make_calculator(idata, poscar)
-            res = task.compute(ii)
-            dumpfn(res, os.path.join(ii, "result_task.json"), indent=4)
             # all_res.append(res)
-            all_res.append(os.path.join(ii, "result_task.json"))
+            all_res.append(compute_task(ii, result_frames, result_format))
+        self.compute_from_results(output_file, print_file, task_dirs, all_res)
 
+    def compute_from_results(self, output_file, print_file, task_dirs, all_res):
+        """
+        Compute the property from the stored task results and write the outputs
+
+        Parameters
+        ----------
+        output_file:
+            The file to output the property in json format
+        print_file:
+            The file to output the property in txt format
+        task_dirs : list of str
+            The list of directories to the tasks
+        all_res : list of str
+            The list of paths to the stored task results
+        """
         # cwd = os.getcwd()
         # os.chdir(path_to_work)
         res, ptr = self._compute_lower(output_file, task_dirs, all_res)
@@ -13,6 +13,7 @@ import dflowautotest.auto_test.lib.abacus as abacus
 import dflowautotest.auto_test.lib.vasp as vasp
 import dflowautotest.lib.abacus_scf as abacus_scf
 #from dpgen import dlog
+from dflowautotest.auto_test.lib.result_store import find_result, load_result
 from dflowautotest.auto_test.Property import Property
 from dflowautotest.auto_test.refine import make_refine
 from dflowautotest.auto_test.reproduce import make_repro, post_repro
@@ -21,6 +22,9 @@ upload_packages.append(__file__)
 
 
 class Surface(Property):
+    # the area is computed from the cell of the first frame
+    default_result_frames = "all"
+
     def __init__(self, parameter, inter_param=None):
         parameter["reproduce"] = parameter.get("reproduce", False)
         self.reprod = parameter["reproduce"]
@@ -117,7 +121,6 @@ class Surface(Property):
             )
 
         task_list = []
-        cwd = os.getcwd()
 
         if self.reprod:
             print("surface reproduce starts")
@@ -131,7 +134,6 @@ class Surface(Property):
                 path_to_work,
                 self.parameter.get("reprod_last_frame", True),
             )
-            os.chdir(cwd)
 
         else:
             if refine:
@@ -141,7 +143,6 @@ class Surface(Property):
                     self.parameter["output_suffix"],
                     path_to_work,
                 )
-                os.chdir(cwd)
                 # record miller
                 init_from_path = re.sub(
                     self.parameter["output_suffix"][::-1],
@@ -154,16 +155,17 @@ class Surface(Property):
                 for ii in task_list_basename:
                     init_from_task = os.path.join(init_from_path, ii)
                     output_task = os.path.join(path_to_work, ii)
-                    os.chdir(output_task)
-                    if os.path.isfile("miller.json"):
-                        os.remove("miller.json")
-                    if os.path.islink("miller.json"):
-                        os.remove("miller.json")
+                    task_miller = os.path.join(output_task, "miller.json")
+                    if os.path.isfile(task_miller):
+                        os.remove(task_miller)
+                    if os.path.islink(task_miller):
+                        os.remove(task_miller)
                     os.symlink(
-                        os.path.relpath(os.path.join(init_from_task, "miller.json")),
-                        "miller.json",
+                        os.path.relpath(
+                            os.path.join(init_from_task, "miller.json"), output_task
+                        ),
+                        task_miller,
                     )
-                os.chdir(cwd)
 
             else:
                 if self.inter_param["type"] == "abacus":
@@ -179,10 +181,11 @@ class Surface(Property):
 
                 if self.inter_param["type"] == "abacus":
                     stru = dpdata.System(equi_contcar, fmt="stru")
-                    stru.to("contcar", "CONTCAR.tmp")
-                    ptypes = vasp.get_poscar_types("CONTCAR.tmp")
-                    ss = Structure.from_file("CONTCAR.tmp")
-                    os.remove("CONTCAR.tmp")
+                    contcar_tmp = os.path.join(path_to_work, "CONTCAR.tmp")
+                    stru.to("contcar", contcar_tmp)
+                    ptypes = vasp.get_poscar_types(contcar_tmp)
+                    ss = Structure.from_file(contcar_tmp)
+                    os.remove(contcar_tmp)
                 else:
                     ptypes = vasp.get_poscar_types(equi_contcar)
                     # gen structure
@@ -193,17 +196,16 @@ class Surface(Property):
                     ss, self.miller, self.min_slab_size, self.min_vacuum_size
                 )
 
-                os.chdir(path_to_work)
-                if os.path.isfile(POSCAR):
-                    os.remove(POSCAR)
-                if os.path.islink(POSCAR):
-                    os.remove(POSCAR)
-                os.symlink(os.path.relpath(equi_contcar), POSCAR)
+                work_poscar = os.path.join(path_to_work, POSCAR)
+                if os.path.isfile(work_poscar):
+                    os.remove(work_poscar)
+                if os.path.islink(work_poscar):
+                    os.remove(work_poscar)
+                os.symlink(os.path.relpath(equi_contcar, path_to_work), work_poscar)
                 #           task_poscar = os.path.join(output, 'POSCAR')
                 for ii in range(len(all_slabs)):
                     output_task = os.path.join(path_to_work, "task.%06d" % ii)
                     os.makedirs(output_task, exist_ok=True)
-                    os.chdir(output_task)
                     for jj in [
                         "INCAR",
                         "POTCAR",
@@ -212,8 +214,8 @@ class Surface(Property):
                         "in.lammps",
                         "STRU",
                     ]:
-                        if os.path.exists(jj):
-                            os.remove(jj)
+                        if os.path.exists(os.path.join(output_task, jj)):
+                            os.remove(os.path.join(output_task, jj))
                     task_list.append(output_task)
                     print(
                         "# %03d generate " % ii,
@@ -221,16 +223,19 @@ class Surface(Property):
                         " \t %d atoms" % len(all_slabs[ii].sites),
                     )
                     # make confs
-                    all_slabs[ii].to("POSCAR.tmp", "POSCAR")
-                    vasp.regulate_poscar("POSCAR.tmp", "POSCAR")
-                    vasp.sort_poscar("POSCAR", "POSCAR", ptypes)
-                    vasp.perturb_xz("POSCAR", "POSCAR", self.pert_xz)
+                    task_poscar = os.path.join(output_task, "POSCAR")
+                    task_poscar_tmp = os.path.join(output_task, "POSCAR.tmp")
+                    all_slabs[ii].to(task_poscar_tmp, "POSCAR")
+                    vasp.regulate_poscar(task_poscar_tmp, task_poscar)
+                    vasp.sort_poscar(task_poscar, task_poscar, ptypes)
+                    vasp.perturb_xz(task_poscar, task_poscar, self.pert_xz)
                     if self.inter_param["type"] == "abacus":
-                        abacus.poscar2stru("POSCAR", self.inter_param, "STRU")
-                        os.remove("POSCAR")
+                        task_stru = os.path.join(output_task, "STRU")
+                        abacus.poscar2stru(task_poscar, self.inter_param, task_stru)
+                        os.remove(task_poscar)
                     # record miller
-                    dumpfn(all_slabs[ii].miller_index, "miller.json")
-                os.chdir(cwd)
+                    task_miller = os.path.join(output_task, "miller.json")
+                    dumpfn(all_slabs[ii].miller_index, task_miller)
 
         return task_list
 
@@ -251,7 +256,7 @@ class Surface(Property):
         if not self.reprod:
             ptr_data += "Miller_Indices: \tSurf_E(J/m^2) EpA(eV) equi_EpA(eV)\n"
             for ii in all_tasks:
-                task_result = loadfn(os.path.join(ii, "result_task.json"))
+                task_result = load_result(find_result(ii))
                 natoms = np.sum(task_result["atom_numbs"])
                 epa = task_result["energies"][-1] / natoms
                 AA = np.linalg.norm(
@@ -63,7 +63,7 @@ class Task(ABC):
         pass
 
     @abstractmethod
-    def compute(self, output_dir):
+    def compute(self, output_dir, result_frames="all"):
         """
         Compute output of the task.
         IMPORTANT: The output configuration should be converted and stored in a CONTCAR file.
@@ -72,6 +72,8 @@ class Task(ABC):
         ----------
         output_dir : str
             The directory storing the input and output files.
+        result_frames : str
+            The frames kept in the result: "last", "stride:N" (every N-th and the last) or "all"
 
         Returns
         -------
@@ -6,6 +6,7 @@ from pymatgen.core.structure import Structure
 from pymatgen.io.vasp import Incar, Kpoints
 
 import dflowautotest.auto_test.lib.vasp as vasp
+from dflowautotest.auto_test.lib.utils import select_frames
 #from dpgen import dlog
 from dflowautotest.auto_test.Task import Task
 from dflowautotest.lib.vasp import incar_upper
@@ -60,14 +61,12 @@ class VASP(Task):
                                 ) as fin:
                                     for line in fin:
                                         print(line.strip("\n"), file=fp)
-            cwd = os.getcwd()
-            os.chdir(output_dir)
-            if not os.path.islink("POTCAR"):
-                os.symlink("../POTCAR", "POTCAR")
-            elif not "../POTCAR" == os.readlink("POTCAR"):
-                os.remove("POTCAR")
-                os.symlink("../POTCAR", "POTCAR")
-            os.chdir(cwd)
+            task_potcar = os.path.join(output_dir, "POTCAR")
+            if not os.path.islink(task_potcar):
+                os.symlink("../POTCAR", task_potcar)
+            elif not "../POTCAR" == os.readlink(task_potcar):
+                os.remove(task_potcar)
+                os.symlink("../POTCAR", task_potcar)
 
         dumpfn(self.inter, os.path.join(output_dir, "inter.json"), indent=4)
 
@@ -186,41 +185,31 @@ class VASP(Task):
             kgamma = False
 
         incar.write_file(os.path.join(output_dir, "../INCAR"))
-        cwd = os.getcwd()
-        os.chdir(output_dir)
-        if not os.path.islink("INCAR"):
-            os.symlink("../INCAR", "INCAR")
-        elif not "../INCAR" == os.readlink("INCAR"):
-            os.remove("INCAR")
-            os.symlink("../INCAR", "INCAR")
-        os.chdir(cwd)
+        task_incar = os.path.join(output_dir, "INCAR")
+        if not os.path.islink(task_incar):
+            os.symlink("../INCAR", task_incar)
+        elif not "../INCAR" == os.readlink(task_incar):
+            os.remove(task_incar)
+            os.symlink("../INCAR", task_incar)
         ret = vasp.make_kspacing_kpoints(self.path_to_poscar, kspacing, kgamma)
         kp = Kpoints.from_string(ret)
         kp.write_file(os.path.join(output_dir, "KPOINTS"))
 
-    def compute(self, output_dir):
+    def compute(self, output_dir, result_frames="all"):
         outcar = os.path.join(output_dir, "OUTCAR")
         if not os.path.isfile(outcar):
             #dlog.warning("cannot find OUTCAR in " + output_dir + " skip")
             print("cannot find OUTCAR in " + output_dir + " skip")
             return None
         else:
-            ls = LabeledSystem(outcar)
-            stress = []
-            with open(outcar, "r") as fin:
-                lines = fin.read().split("\n")
-            for line in lines:
-                if "in kB" in line:
-                    stress_xx = float(line.split()[2])
-                    stress_yy = float(line.split()[3])
-                    stress_zz = float(line.split()[4])
-                    stress_xy = float(line.split()[5])
-                    stress_yz = float(line.split()[6])
-                    stress_zx = float(line.split()[7])
-                    stress.append([])
-                    stress[-1].append([stress_xx, stress_xy, stress_zx])
-                    stress[-1].append([stress_xy, stress_yy, stress_yz])
-                    stress[-1].append([stress_zx, stress_yz, stress_zz])
+            reader = vasp.OutcarReader(outcar, result_frames)
+            ls = LabeledSystem(data=reader.to_system_data())
+            # the same convention as dpdata's vasp/outcar reader
+            ls.rot_lower_triangular()
+            stress = [
+                reader.stresses[ii]
+                for ii in select_frames(len(reader.stresses), result_frames)
+            ]
 
             outcar_dict = ls.as_dict()
             outcar_dict["data"]["stress"] = {
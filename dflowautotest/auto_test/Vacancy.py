@@ -11,6 +11,7 @@ from pymatgen.core.structure import Structure
 import dflowautotest.auto_test.lib.abacus as abacus
 import dflowautotest.lib.abacus_scf as abacus_scf
 #from dpgen import dlog
+from dflowautotest.auto_test.lib.result_store import load_result
 from dflowautotest.auto_test.Property import Property
 from dflowautotest.auto_test.refine import make_refine
 from dflowautotest.auto_test.reproduce import make_repro, post_repro
@@ -109,7 +110,6 @@ class Vacancy(Property):
             )
 
         task_list = []
-        cwd = os.getcwd()
 
         if self.reprod:
             print("vacancy reproduce starts")
@@ -123,7 +123,6 @@ class Vacancy(Property):
                 path_to_work,
                 self.parameter.get("reprod_last_frame", False),
             )
-            os.chdir(cwd)
 
         else:
             if refine:
@@ -145,16 +144,17 @@ class Vacancy(Property):
                 for ii in task_list_basename:
                     init_from_task = os.path.join(init_from_path, ii)
                     output_task = os.path.join(path_to_work, ii)
-                    os.chdir(output_task)
-                    if os.path.isfile("supercell.json"):
-                        os.remove("supercell.json")
-                    if os.path.islink("supercell.json"):
-                        os.remove("supercell.json")
+                    task_supercell = os.path.join(output_task, "supercell.json")
+                    if os.path.isfile(task_supercell):
+                        os.remove(task_supercell)
+                    if os.path.islink(task_supercell):
+                        os.remove(task_supercell)
                     os.symlink(
-                        os.path.relpath(os.path.join(init_from_task, "supercell.json")),
-                        "supercell.json",
+                        os.path.relpath(
+                            os.path.join(init_from_task, "supercell.json"), output_task
+                        ),
+                        task_supercell,
                     )
-                os.chdir(cwd)
             else:
                 if self.inter_param["type"] == "abacus":
                     CONTCAR = abacus.final_stru(path_to_equi)
@@ -181,18 +181,17 @@ class Vacancy(Property):
                     )
 
                 print("gen vacancy with supercell " + str(self.supercell))
-                os.chdir(path_to_work)
-                if os.path.isfile(POSCAR):
-                    os.remove(POSCAR)
-                if os.path.islink(POSCAR):
-                    os.remove(POSCAR)
-                os.symlink(os.path.relpath(equi_contcar), POSCAR)
+                work_poscar = os.path.join(path_to_work, POSCAR)
+                if os.path.isfile(work_poscar):
+                    os.remove(work_poscar)
+                if os.path.islink(work_poscar):
+                    os.remove(work_poscar)
+                os.symlink(os.path.relpath(equi_contcar, path_to_work), work_poscar)
                 #           task_poscar = os.path.join(output, 'POSCAR')
 
                 for ii in range(len(dss)):
                     output_task = os.path.join(path_to_work, "task.%06d" % ii)
                     os.makedirs(output_task, exist_ok=True)
-                    os.chdir(output_task)
                     for jj in [
                         "INCAR",
                         "POTCAR",
@@ -201,16 +200,17 @@ class Vacancy(Property):
                         "in.lammps",
                         "STRU",
                     ]:
-                        if os.path.exists(jj):
-                            os.remove(jj)
+                        if os.path.exists(os.path.join(output_task, jj)):
+                            os.remove(os.path.join(output_task, jj))
                     task_list.append(output_task)
-                    dss[ii].to("POSCAR", "POSCAR")
+                    task_poscar = os.path.join(output_task, "POSCAR")
+                    dss[ii].to(task_poscar, "POSCAR")
                     if self.inter_param["type"] == "abacus":
-                        abacus.poscar2stru("POSCAR", self.inter_param, "STRU")
-                        os.remove("POSCAR")
+                        task_stru = os.path.join(output_task, "STRU")
+                        abacus.poscar2stru(task_poscar, self.inter_param, task_stru)
+                        os.remove(task_poscar)
                     # np.savetxt('supercell.out', self.supercell, fmt='%d')
-                    dumpfn(self.supercell, "supercell.json")
-                os.chdir(cwd)
+                    dumpfn(self.supercell, os.path.join(output_task, "supercell.json"))
         return task_list
 
     def post_process(self, task_list):
@@ -233,7 +233,7 @@ class Vacancy(Property):
             for ii in all_tasks:
                 idid += 1
                 structure_dir = os.path.basename(ii)
-                task_result = loadfn(all_res[idid])
+                task_result = load_result(all_res[idid])
                 natoms = task_result["atom_numbs"][0]
                 equi_path = os.path.abspath(
                     os.path.join(
@@ -1,4 +1,5 @@
 from dflowautotest.auto_test.ABACUS import ABACUS
+from dflowautotest.auto_test.ASE import ASE
 from dflowautotest.auto_test.Lammps import Lammps
 from dflowautotest.auto_test.VASP import VASP
 from dflow.python import upload_packages
@@ -16,6 +17,8 @@ def make_calculator(inter_parameter, path_to_poscar):
         return ABACUS(inter_parameter, path_to_poscar)
     elif inter_type in ["deepmd", "meam", "eam_fs", "eam_alloy"]:
         return Lammps(inter_parameter, path_to_poscar)
+    elif inter_type == "ase":
+        return ASE(inter_parameter, path_to_poscar)
     #    if inter_type == 'siesta':
     #        return Siesta(inter_parameter, path_to_poscar)
     #        pass
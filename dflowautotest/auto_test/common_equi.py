@@ -21,7 +21,7 @@ lammps_task_type = ["deepmd", "meam", "eam_fs", "eam_alloy"]
 
 
 
-def make_equi(confs, inter_param, relax_param):
+def make_equi(confs, inter_param, relax_param, n_workers=1):
     # find all POSCARs and their name like mp-xxx
     # ...
     #dlog.debug("debug info make equi")
@@ -40,7 +40,6 @@ def make_equi(confs, inter_param, relax_param):
 
     # generate a list of task names like mp-xxx/relaxation/relax_task
     # ...
-    cwd = os.getcwd()
     # generate poscar for single element crystal
     if len(ele_list) == 1 or "single" in inter_param:
         if "single" in inter_param:
@@ -48,36 +47,36 @@ def make_equi(confs, inter_param, relax_param):
         else:
             element_label = 0
         for ii in conf_dirs:
-            os.chdir(ii)
             crys_type = ii.split("/")[-1]
+            conf_poscar = os.path.join(ii, "POSCAR")
             #dlog.debug("crys_type: %s" % crys_type)
             print("crys_type: %s" % crys_type)
-            #dlog.debug("pwd: %s" % os.getcwd())
-            print("pwd: %s" % os.getcwd())
+            #dlog.debug("pwd: %s" % os.path.abspath(ii))
+            print("pwd: %s" % os.path.abspath(ii))
             if crys_type == "std-fcc":
-                if not os.path.exists("POSCAR"):
-                    crys.fcc1(ele_list[element_label]).to("POSCAR", "POSCAR")
+                if not os.path.exists(conf_poscar):
+                    crys.fcc1(ele_list[element_label]).to(conf_poscar, "POSCAR")
             elif crys_type == "std-hcp":
-                if not os.path.exists("POSCAR"):
-                    crys.hcp(ele_list[element_label]).to("POSCAR", "POSCAR")
+                if not os.path.exists(conf_poscar):
+                    crys.hcp(ele_list[element_label]).to(conf_poscar, "POSCAR")
             elif crys_type == "std-dhcp":
-                if not os.path.exists("POSCAR"):
-                    crys.dhcp(ele_list[element_label]).to("POSCAR", "POSCAR")
+                if not os.path.exists(conf_poscar):
+                    crys.dhcp(ele_list[element_label]).to(conf_poscar, "POSCAR")
             elif crys_type == "std-bcc":
-                if not os.path.exists("POSCAR"):
-                    crys.bcc(ele_list[element_label]).to("POSCAR", "POSCAR")
+                if not os.path.exists(conf_poscar):
+                    crys.bcc(ele_list[element_label]).to(conf_poscar, "POSCAR")
             elif crys_type == "std-diamond":
-                if not os.path.exists("POSCAR"):
-                    crys.diamond(ele_list[element_label]).to("POSCAR", "POSCAR")
+                if not os.path.exists(conf_poscar):
+                    crys.diamond(ele_list[element_label]).to(conf_poscar, "POSCAR")
             elif crys_type == "std-sc":
-                if not os.path.exists("POSCAR"):
-                    crys.sc(ele_list[element_label]).to("POSCAR", "POSCAR")
+                if not os.path.exists(conf_poscar):
+                    crys.sc(ele_list[element_label]).to(conf_poscar, "POSCAR")
 
-            if inter_param["type"] == "abacus" and not os.path.exists("STRU"):
-                abacus.poscar2stru("POSCAR", inter_param, "STRU")
-                os.remove("POSCAR")
+            conf_stru = os.path.join(ii, "STRU")
+            if inter_param["type"] == "abacus" and not os.path.exists(conf_stru):
+                abacus.poscar2stru(conf_poscar, inter_param, conf_stru)
+                os.remove(conf_poscar)
 
-            os.chdir(cwd)
     task_dirs = []
     # make task directories like mp-xxx/relaxation/relax_task
     # if mp-xxx/exists then print a warning and exit.
@@ -112,13 +111,12 @@ def make_equi(confs, inter_param, relax_param):
         )  # to be consistent with property in make dispatcher
         create_path(relax_dirs)
         task_dirs.append(relax_dirs)
-        os.chdir(relax_dirs)
         # copy POSCARs to mp-xxx/relaxation/relax_task
         # ...
-        if os.path.isfile(POSCAR):
-            os.remove(POSCAR)
-        os.symlink(os.path.relpath(poscar), POSCAR)
-        os.chdir(cwd)
+        task_poscar = os.path.join(relax_dirs, POSCAR)
+        if os.path.isfile(task_poscar):
+            os.remove(task_poscar)
+        os.symlink(os.path.relpath(poscar, relax_dirs), task_poscar)
     task_dirs.sort()
     # generate task files
     relax_param["cal_type"] = "relaxation"
@@ -136,15 +134,26 @@ def make_equi(confs, inter_param, relax_param):
         if "relax_vol" not in relax_param["cal_setting"]:
             relax_param["cal_setting"]["relax_vol"] = True
 
-    for ii in task_dirs:
-        poscar = os.path.join(ii, "POSCAR")
-        #dlog.debug("task_dir %s" % ii)
-        inter = make_calculator(inter_param, poscar)
-        inter.make_potential_files(ii)
-        inter.make_input_file(ii, "relaxation", relax_param)
+    if n_workers <= 1:
+        for ii in task_dirs:
+            _make_equi_task(ii, inter_param, relax_param)
+    else:
+        with Pool(n_workers) as pool:
+            pool.starmap(
+                _make_equi_task,
+                [(ii, inter_param, relax_param) for ii in task_dirs],
+            )
+
+
+def _make_equi_task(task_dir, inter_param, relax_param):
+    poscar = os.path.join(task_dir, "POSCAR")
+    #dlog.debug("task_dir %s" % ii)
+    inter = make_calculator(inter_param, poscar)
+    inter.make_potential_files(task_dir)
+    inter.make_input_file(task_dir, "relaxation", relax_param)
 
 
-def post_equi(confs, inter_param):
+def post_equi(confs, inter_param, n_workers=1):
     # find all POSCARs and their name like mp-xxx
     # ...
     conf_dirs = []
@@ -160,8 +169,16 @@ def post_equi(confs, inter_param):
     # ...
 
     # dump the relaxation result.
-    for ii in task_dirs:
-        poscar = os.path.join(ii, "POSCAR")
-        inter = make_calculator(inter_param, poscar)
-        res = inter.compute(ii)
-        dumpfn(res, os.path.join(ii, "result.json"), indent=4)
+    if n_workers <= 1:
+        for ii in task_dirs:
+            _post_equi_task(ii, inter_param)
+    else:
+        with Pool(n_workers) as pool:
+            pool.starmap(_post_equi_task, [(ii, inter_param) for ii in task_dirs])
+
+
+def _post_equi_task(task_dir, inter_param):
+    poscar = os.path.join(task_dir, "POSCAR")
+    inter = make_calculator(inter_param, poscar)
+    res = inter.compute(task_dir)
+    dumpfn(res, os.path.join(task_dir, "result.json"), indent=4)
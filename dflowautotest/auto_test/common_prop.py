@@ -13,6 +13,7 @@ from dflowautotest.auto_test.EOS import EOS
 from dflowautotest.auto_test.Gamma import Gamma
 from dflowautotest.auto_test.Interstitial import Interstitial
 from dflowautotest.auto_test.lib.utils import create_path
+from dflowautotest.auto_test.Property import compute_task
 from dflowautotest.auto_test.Surface import Surface
 from dflowautotest.auto_test.Vacancy import Vacancy
 #from dpgen.dispatcher.Dispatcher import make_submission
@@ -45,7 +46,7 @@ def make_property_instance(parameters, inter_param):
         raise RuntimeError(f"unknown property type {prop_type}")
 
 
-def make_property(confs, inter_param, property_list):
+def make_property(confs, inter_param, property_list, n_workers=1):
     # find all POSCARs and their name like mp-xxx
     # ...
     # conf_dirs = glob.glob(confs)
@@ -54,53 +55,67 @@ def make_property(confs, inter_param, property_list):
     for conf in confs:
         conf_dirs.extend(glob.glob(conf))
     conf_dirs.sort()
+    all_units = []
     for ii in conf_dirs:
-        sepline(ch=ii, screen=True)
+        if n_workers <= 1:
+            sepline(ch=ii, screen=True)
         for jj in property_list:
             if jj.get("skip", False):
                 continue
-            if "init_from_suffix" and "output_suffix" in jj:
-                do_refine = True
-                suffix = jj["output_suffix"]
-            elif "reproduce" in jj and jj["reproduce"]:
-                do_refine = False
-                suffix = "reprod"
+            if n_workers <= 1:
+                _make_property_unit(ii, jj, inter_param)
             else:
-                do_refine = False
-                suffix = "00"
-            # generate working directory like mp-xxx/eos_00 if jj['type'] == 'eos'
-            # handel the exception that the working directory exists
-            # ...
+                all_units.append((ii, jj, inter_param))
 
-            # determine the suffix: from scratch or refine
-            # ...
+    if len(all_units) > 0:
+        # every (conf, property) writes its own working directory
+        with Pool(n_workers) as pool:
+            pool.starmap(_make_property_unit, all_units)
 
-            property_type = jj["type"]
-            path_to_equi = os.path.join(ii, "relaxation", "relax_task")
-            path_to_work = os.path.join(ii, property_type + "_" + suffix)
 
-            create_path(path_to_work)
+def _make_property_unit(ii, jj, inter_param):
+    if "init_from_suffix" and "output_suffix" in jj:
+        do_refine = True
+        suffix = jj["output_suffix"]
+    elif "reproduce" in jj and jj["reproduce"]:
+        do_refine = False
+        suffix = "reprod"
+    else:
+        do_refine = False
+        suffix = "00"
+    # generate working directory like mp-xxx/eos_00 if jj['type'] == 'eos'
+    # handel the exception that the working directory exists
+    # ...
+
+    # determine the suffix: from scratch or refine
+    # ...
 
-            inter_param_prop = inter_param
-            if "cal_setting" in jj and "overwrite_interaction" in jj["cal_setting"]:
-                inter_param_prop = jj["cal_setting"]["overwrite_interaction"]
+    property_type = jj["type"]
+    path_to_equi = os.path.join(ii, "relaxation", "relax_task")
+    path_to_work = os.path.join(ii, property_type + "_" + suffix)
 
-            prop = make_property_instance(jj, inter_param_prop)
-            task_list = prop.make_confs(path_to_work, path_to_equi, do_refine)
+    create_path(path_to_work)
 
-            for kk in task_list:
-                poscar = os.path.join(kk, "POSCAR")
-                inter = make_calculator(inter_param_prop, poscar)
-                inter.make_potential_files(kk)
-                #dlog.debug(prop.task_type())  ### debug
-                inter.make_input_file(kk, prop.task_type(), prop.task_param())
+    inter_param_prop = inter_param
+    if "cal_setting" in jj and "overwrite_interaction" in jj["cal_setting"]:
+        inter_param_prop = jj["cal_setting"]["overwrite_interaction"]
 
-            prop.post_process(
-                task_list
-            )  # generate same KPOINTS file for elastic when doing VASP
+    prop = make_property_instance(jj, inter_param_prop)
+    task_list = prop.make_confs(path_to_work, path_to_equi, do_refine)
 
+    for kk in task_list:
+        poscar = os.path.join(kk, "POSCAR")
+        inter = make_calculator(inter_param_prop, poscar)
+        inter.make_potential_files(kk)
+        #dlog.debug(prop.task_type())  ### debug
+        inter.make_input_file(kk, prop.task_type(), prop.task_param())
 
-def post_property(confs, inter_param, property_list):
+    prop.post_process(
+        task_list
+    )  # generate same KPOINTS file for elastic when doing VASP
+
+
+def post_property(confs, inter_param, property_list, n_workers=1):
     # find all POSCARs and their name like mp-xxx
     # ...
     #    task_list = []
@@ -110,6 +125,7 @@ def post_property(confs, inter_param, property_list):
     for conf in confs:
         conf_dirs.extend(glob.glob(conf))
     conf_dirs.sort()
+    all_props = []
     for ii in conf_dirs:
         for jj in property_list:
             # determine the suffix: from scratch or refine
@@ -130,8 +146,44 @@ def post_property(confs, inter_param, property_list):
             property_type = jj["type"]
             path_to_work = os.path.join(ii, property_type + "_" + suffix)
             prop = make_property_instance(jj, inter_param_prop)
+            all_props.append((prop, path_to_work))
+
+    if n_workers <= 1:
+        for prop, path_to_work in all_props:
             prop.compute(
                 os.path.join(path_to_work, "result.json"),
                 os.path.join(path_to_work, "result.out"),
                 path_to_work,
             )
+        return
+
+    # the tasks of all the properties are computed first, then the properties.
+    # pool.starmap keeps the order, so the outputs are the same as the serial ones
+    all_task_dirs = []
+    task_args = []
+    for prop, path_to_work in all_props:
+        task_dirs = prop.get_task_dirs(path_to_work)
+        result_frames, result_format = prop.get_result_settings()
+        all_task_dirs.append(task_dirs)
+        task_args += [(kk, result_frames, result_format) for kk in task_dirs]
+    with Pool(n_workers) as pool:
+        task_res = pool.starmap(compute_task, task_args)
+        lower_args = []
+        start = 0
+        for (prop, path_to_work), task_dirs in zip(all_props, all_task_dirs):
+            all_res = task_res[start : start + len(task_dirs)]
+            start += len(task_dirs)
+            lower_args.append(
+                (
+                    prop,
+                    os.path.join(path_to_work, "result.json"),
+                    os.path.join(path_to_work, "result.out"),
+                    task_dirs,
+                    all_res,
+                )
+            )
+        pool.starmap(_compute_from_results, lower_args)
+
+
+def _compute_from_results(prop, output_file, print_file, task_dirs, all_res):
+    prop.compute_from_results(output_file, print_file, task_dirs, all_res)
@@ -8,6 +8,7 @@ import numpy as np
 from pymatgen.core.structure import Structure
 
 import dflowautotest.lib.abacus_scf as abacus_scf
+from dflowautotest.auto_test.lib.utils import file_tail_contains
 from dflow.python import upload_packages
 upload_packages.append(__file__)
 
@@ -392,11 +393,10 @@ def make_kspacing_kpt(struf, kspacing):
 
 
 def check_finished(fname):
-    with open(fname, "r") as fp:
-        return "Total  Time  :" in fp.read()
+    return file_tail_contains(fname, "Total  Time  :")
 
 
-def final_stru(abacus_path):
+def _read_input_settings(abacus_path):
     with open(os.path.join(abacus_path, "INPUT")) as f1:
         lines = f1.readlines()
     suffix = "ABACUS"
@@ -409,7 +409,17 @@ def final_stru(abacus_path):
             calculation = line.split()[1]
         elif "out_stru" in line and line.split()[0] == "out_stru":
             out_stru = bool(line.split()[1])
-    logf = os.path.join(abacus_path, "OUT.%s/running_%s.log" % (suffix, calculation))
+    return suffix, calculation, out_stru
+
+
+def running_log(abacus_path):
+    suffix, calculation, _ = _read_input_settings(abacus_path)
+    return os.path.join(abacus_path, "OUT.%s/running_%s.log" % (suffix, calculation))
+
+
+def final_stru(abacus_path):
+    suffix, calculation, out_stru = _read_input_settings(abacus_path)
+    logf = running_log(abacus_path)
     if calculation in ["relax", "cell-relax"]:
         if not out_stru:
             return "OUT.%s/STRU_ION_D" % suffix
@@ -6,10 +6,12 @@ import subprocess as sp
 import sys
 
 import dpdata
+import numpy as np
 from dpdata.periodic_table import Element
 from packaging.version import Version
 
 import dflowautotest.auto_test.lib.util as util
+from dflowautotest.auto_test.lib.utils import file_tail_contains, select_frames
 from dflow.python import upload_packages
 upload_packages.append(__file__)
 
@@ -104,6 +106,32 @@ def _get_conf_natom(conf):
     raise RuntimeError("cannot find line indicate atom types in ", conf)
 
 
+def cell_to_box(cell):
+    """
+    The lammps box [xlo, xhi, ylo, yhi, zlo, zhi, xy, xz, yz] of a cell,
+    the cell is rotated to the lower triangular form as dpdata does
+    """
+    qq, rr = np.linalg.qr(np.transpose(cell))
+    if np.linalg.det(qq) < 0:
+        rr = -rr
+    lower = np.transpose(rr)
+    # flip the axes with negative lengths
+    lower = lower * np.where(np.diag(lower) < 0, -1, 1)
+    return np.array(
+        [
+            0,
+            lower[0][0],
+            0,
+            lower[1][1],
+            0,
+            lower[2][2],
+            lower[1][0],
+            lower[2][0],
+            lower[2][1],
+        ]
+    )
+
+
 def inter_deepmd(param):
     models = param["model_name"]
     deepmd_version = param["deepmd_version"]
@@ -404,6 +432,179 @@ def make_lammps_press_relax(
     return ret
 
 
+def make_lammps_batch(
+    conf,
+    type_map,
+    interaction,
+    param,
+    boxes,
+    relax_pos=True,
+    etol=0,
+    ftol=1e-10,
+    maxiter=5000,
+    maxeval=500000,
+):
+    type_map_list = element_list(type_map)
+
+    """
+    make lammps input that computes conf in a batch of boxes in one run
+    boxes: [xlo, xhi, ylo, yhi, zlo, zhi, xy, xz, yz] of each computation, see cell_to_box.
+           The atoms are put back to the fractional coordinates of conf in
+           each box, and relaxed (relax_pos) or evaluated.
+    Each box is dumped as one frame of dump.relax, the timestep is reset to
+    ii * (maxiter + 1) for the ii-th box, so the frames and the thermo outputs
+    can be matched by timestep.
+    """
+    ret = ""
+    ret += "clear\n"
+    ret += "units 	metal\n"
+    ret += "dimension	3\n"
+    ret += "boundary	p p p\n"
+    ret += "atom_style	atomic\n"
+    ret += "box         tilt large\n"
+    ret += "read_data   %s\n" % conf
+    for ii in range(len(type_map)):
+        ret += "mass            %d %.3f\n" % (ii + 1, Element(type_map_list[ii]).mass)
+    ret += "neigh_modify    every 1 delay 0 check no\n"
+    ret += interaction(param)
+    ret += "compute         mype all pe\n"
+    ret += "thermo          100\n"
+    ret += (
+        "thermo_style    custom step pe pxx pyy pzz pxy pxz pyz lx ly lz vol c_mype\n"
+    )
+    ret += "min_style       cg\n"
+    # the fractional coordinates of conf
+    ret += "fix             ref all store/state 0 xs ys zs\n"
+    ret += "variable        xref atom xlo+f_ref[1]*lx+f_ref[2]*xy+f_ref[3]*xz\n"
+    ret += "variable        yref atom ylo+f_ref[2]*ly+f_ref[3]*yz\n"
+    ret += "variable        zref atom zlo+f_ref[3]*lz\n"
+    ret += "variable        N equal count(all)\n"
+    ret += "variable        V equal vol\n"
+    ret += 'variable        E equal "c_mype"\n'
+    ret += "variable        Pxx equal pxx\n"
+    ret += "variable        Pyy equal pyy\n"
+    ret += "variable        Pzz equal pzz\n"
+    ret += "variable        Pxy equal pxy\n"
+    ret += "variable        Pxz equal pxz\n"
+    ret += "variable        Pyz equal pyz\n"
+    for ii, box in enumerate(boxes):
+        ret += "reset_timestep  %d\n" % (ii * (maxiter + 1))
+        ret += (
+            "change_box      all x final %.10f %.10f y final %.10f %.10f "
+            "z final %.10f %.10f xy final %.10f xz final %.10f yz final %.10f "
+            "units box\n" % tuple(box)
+        )
+        ret += "set             group all x v_xref y v_yref z v_zref\n"
+        if relax_pos:
+            ret += "minimize        %e %e %d %d\n" % (etol, ftol, maxiter, maxeval)
+        else:
+            ret += "run    0\n"
+        ret += (
+            "write_dump      all custom dump.relax id type xs ys zs fx fy fz "
+            "modify append %s\n" % ("no" if ii == 0 else "yes")
+        )
+        ret += "variable        Epa equal ${E}/${N}\n"
+        ret += "variable        Vpa equal ${V}/${N}\n"
+        ret += 'print "Batch %d: volume per atoms = ${Vpa}"\n' % ii
+        ret += 'print "Batch %d: energy per atoms = ${Epa}"\n' % ii
+        ret += (
+            'print "Batch %d: Stress (xx yy zz xy xz yz) = '
+            '${Pxx} ${Pyy} ${Pzz} ${Pxy} ${Pxz} ${Pyz}"\n' % ii
+        )
+    ret += 'print "All done"\n'
+    ret += 'print "Total number of atoms = ${N}"\n'
+    return ret
+
+
+def make_setforce_fix(add_fix):
+    """
+    The setforce fix that keeps the atoms from moving along the directions
+    with "true" in add_fix, e.g. ["true", "true", "false"]
+    """
+    fix_dict = {"true": "0", "false": "NULL"}
+    return "fix             1 all setforce %s %s %s\n" % tuple(
+        fix_dict[ii] for ii in add_fix
+    )
+
+
+def make_lammps_gamma(
+    conf,
+    type_map,
+    interaction,
+    param,
+    disps,
+    add_fix,
+    relax_pos=True,
+    etol=0,
+    ftol=1e-10,
+    maxiter=5000,
+    maxeval=500000,
+):
+    type_map_list = element_list(type_map)
+
+    """
+    make lammps input that scans a gamma line of the slab conf in one run
+    disps: the fractional displacement of the upper half (zs > 0.5) of the
+           slab at each step. The atoms are put back to conf before each
+           step, then the upper half is displaced and the slab is relaxed
+           (relax_pos) under the setforce fix of add_fix, or evaluated.
+    Each step is dumped as one frame of dump.relax, the timestep is reset to
+    ii * (maxiter + 1) for the ii-th step.
+    """
+    ret = ""
+    ret += "clear\n"
+    ret += "units 	metal\n"
+    ret += "dimension	3\n"
+    ret += "boundary	p p p\n"
+    ret += "atom_style	atomic\n"
+    ret += "box         tilt large\n"
+    ret += "read_data   %s\n" % conf
+    for ii in range(len(type_map)):
+        ret += "mass            %d %.3f\n" % (ii + 1, Element(type_map_list[ii]).mass)
+    ret += "neigh_modify    every 1 delay 0 check no\n"
+    ret += interaction(param)
+    ret += "compute         mype all pe\n"
+    ret += "thermo          100\n"
+    ret += (
+        "thermo_style    custom step pe pxx pyy pzz pxy pxz pyz lx ly lz vol c_mype\n"
+    )
+    ret += "min_style       cg\n"
+    ret += make_setforce_fix(add_fix)
+    # the coordinates of conf and its upper half
+    ret += "fix             ref all store/state 0 x y z zs\n"
+    ret += "variable        xref atom f_ref[1]\n"
+    ret += "variable        yref atom f_ref[2]\n"
+    ret += "variable        zref atom f_ref[3]\n"
+    ret += "variable        upper atom f_ref[4]>0.5\n"
+    ret += "group           upper variable upper\n"
+    ret += "variable        N equal count(all)\n"
+    ret += 'variable        E equal "c_mype"\n'
+    ret += "variable        tmplx equal lx\n"
+    ret += "variable        tmply equal ly\n"
+    ret += "variable        AA equal (${tmplx}*${tmply})\n"
+    for ii, disp in enumerate(disps):
+        ret += "reset_timestep  %d\n" % (ii * (maxiter + 1))
+        ret += "set             group all x v_xref y v_yref z v_zref\n"
+        ret += "variable        dx equal %.10f*lx+%.10f*xy+%.10f*xz\n" % tuple(disp)
+        ret += "variable        dy equal %.10f*ly+%.10f*yz\n" % tuple(disp[1:])
+        ret += "variable        dz equal %.10f*lz\n" % disp[2]
+        ret += "displace_atoms  upper move v_dx v_dy v_dz units box\n"
+        if relax_pos:
+            ret += "minimize        %e %e %d %d\n" % (etol, ftol, maxiter, maxeval)
+        else:
+            ret += "run    0\n"
+        ret += (
+            "write_dump      all custom dump.relax id type xs ys zs fx fy fz "
+            "modify append %s\n" % ("no" if ii == 0 else "yes")
+        )
+        ret += "variable        Epa equal ${E}/${N}\n"
+        ret += 'print "Step %d: energy per atoms = ${Epa}"\n' % ii
+    ret += 'print "All done"\n'
+    ret += 'print "Total number of atoms = ${N}"\n'
+    ret += 'print "Final Base area = ${AA}"\n'
+    return ret
+
+
 def make_lammps_phonon(
     conf, masses, interaction, param, etol=0, ftol=1e-10, maxiter=5000, maxeval=500000
 ):
@@ -513,6 +714,128 @@ def poscar_from_last_dump(dump, poscar_out, deepmd_type_map):
         lines = fp.write("\n".join(lines))
 
 
+def read_dump_frames(dump, result_frames="all"):
+    """
+    read the frames of a lammps custom dump (id type x y z fx fy fz, scaled or not)
+    kept by the result_frames policy (last, stride:N or all),
+    each atom block is converted to a numpy array in one pass
+
+    Returns
+    -------
+    dumptime: int array of the timesteps, shape [nframes]
+    box: float array of the cells, shape [nframes, 3, 3]
+    vol: float array of the volumes, shape [nframes]
+    coord: float array of the cartesian coordinates, shape [nframes, natoms, 3]
+    force: float array of the forces, shape [nframes, natoms, 3]
+    atype: int array of the (zero based) atom types of the last frame, shape [natoms]
+    """
+    with open(dump, "r") as fp:
+        lines = fp.read().split("\n")
+    step_idx = [idx for idx, ii in enumerate(lines) if ii == "ITEM: TIMESTEP"]
+    # the atom blocks of the dropped frames are never parsed
+    step_idx = [step_idx[ii] for ii in select_frames(len(step_idx), result_frames)]
+    nframes = len(step_idx)
+    dumptime = np.zeros(nframes, dtype=int)
+    bounds = np.zeros([nframes, 3, 3])
+    scaled = np.zeros(nframes, dtype=bool)
+    blocks = []
+    for ff, idx in enumerate(step_idx):
+        dumptime[ff] = int(lines[idx + 1])
+        natom = int(lines[idx + 3])
+        for dd in range(3):
+            words = lines[idx + 5 + dd].split()
+            bounds[ff][dd][: len(words)] = [float(ww) for ww in words]
+        scaled[ff] = "xs ys zs" in lines[idx + 8]
+        block = np.fromstring(
+            "\n".join(lines[idx + 9 : idx + 9 + natom]), dtype=float, sep=" "
+        )
+        blocks.append(block.reshape([natom, -1]))
+
+    # lammps restricted triclinic box from the bounding box and the tilt factors
+    xy = bounds[:, 0, 2]
+    xz = bounds[:, 1, 2]
+    yz = bounds[:, 2, 2]
+    zeros = np.zeros(nframes)
+    xtilt = np.stack([zeros, xy, xz, xy + xz])
+    ytilt = np.stack([zeros, yz])
+    xx = (
+        bounds[:, 0, 1]
+        - np.max(xtilt, axis=0)
+        - (bounds[:, 0, 0] - np.min(xtilt, axis=0))
+    )
+    yy = (
+        bounds[:, 1, 1]
+        - np.max(ytilt, axis=0)
+        - (bounds[:, 1, 0] - np.min(ytilt, axis=0))
+    )
+    zz = bounds[:, 2, 1] - bounds[:, 2, 0]
+    box = np.zeros([nframes, 3, 3])
+    box[:, 0, 0] = xx
+    box[:, 1, 0] = xy
+    box[:, 1, 1] = yy
+    box[:, 2, 0] = xz
+    box[:, 2, 1] = yz
+    box[:, 2, 2] = zz
+    vol = xx * yy * zz
+
+    coord = []
+    force = []
+    for ff, block in enumerate(blocks):
+        posi = block[:, 2:5]
+        if scaled[ff]:
+            posi = np.stack(
+                [
+                    posi[:, 0] * xx[ff] + posi[:, 1] * xy[ff] + posi[:, 2] * xz[ff],
+                    posi[:, 1] * yy[ff] + posi[:, 2] * yz[ff],
+                    posi[:, 2] * zz[ff],
+                ],
+                axis=1,
+            )
+        coord.append(posi)
+        force.append(block[:, 5:8])
+    coord = np.array(coord).reshape([nframes, -1, 3])
+    force = np.array(force).reshape([nframes, -1, 3])
+    if nframes > 0:
+        atype = blocks[-1][:, 1].astype(int) - 1
+    else:
+        atype = np.zeros(0, dtype=int)
+    return dumptime, box, vol, coord, force, atype
+
+
+def read_thermo_table(log):
+    """
+    read all numeric thermo rows of a lammps log in one pass
+    only the first row printed for each timestep is kept
+
+    Returns
+    -------
+    steps: int array of the sorted timesteps, shape [nrows]
+    table: float array of the thermo rows (step in the first column), shape [nrows, ncols]
+    """
+    rows = {}
+    ncols = None
+    with open(log, "r") as fp:
+        for line in fp:
+            words = line.split()
+            if len(words) < 8 or not words[0].isdigit():
+                continue
+            step = int(words[0])
+            if step in rows:
+                continue
+            try:
+                row = [float(ww) for ww in words]
+            except ValueError:
+                continue
+            if ncols is None:
+                ncols = len(row)
+            elif len(row) != ncols:
+                continue
+            rows[step] = row
+    steps = np.array(sorted(rows), dtype=int)
+    table = np.array([rows[ii] for ii in steps]).reshape([len(steps), ncols or 0])
+    return steps, table
+
+
 def check_finished_new(fname, keyword):
     with open(fname, "r") as fp:
         lines = fp.read().split("\n")
@@ -524,5 +847,4 @@ def check_finished_new(fname, keyword):
 
 
 def check_finished(fname):
-    with open(fname, "r") as fp:
-        return "Total wall time:" in fp.read()
+    return file_tail_contains(fname, "Total wall time:")
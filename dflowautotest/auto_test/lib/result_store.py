@@ -0,0 +1,141 @@
+import os
+
+import numpy as np
+from dpdata import LabeledSystem
+from monty.serialization import dumpfn, loadfn
+
+from dflow.python import upload_packages
+upload_packages.append(__file__)
+
+result_formats = ["npz", "json"]
+# the fields that have one entry per frame
+frame_keys = ["cells", "coords", "energies", "forces", "virials", "stress"]
+
+
+def _to_array(value):
+    if isinstance(value, dict) and value.get("@module") == "numpy":
+        return np.array(value["data"], dtype=value["dtype"])
+    return np.asarray(value)
+
+
+def dump_result(res, task_dir, fmt="npz"):
+    """
+    Store the result of a task (a LabeledSystem dict) in task_dir.
+
+    Parameters
+    ----------
+    res : dict
+        The result returned by Task.compute
+    task_dir : str
+        The task directory
+    fmt : str
+        "npz": typed arrays in a compressed numpy archive, one member per field
+        "json": the indented json of the dict
+
+    Returns
+    -------
+    path: str
+        The path of the stored result
+    """
+    if fmt not in result_formats:
+        raise RuntimeError("unsupported result format %s" % fmt)
+    json_path = os.path.join(task_dir, "result_task.json")
+    npz_path = os.path.join(task_dir, "result_task.npz")
+    if fmt == "json" or res is None:
+        path, stale = json_path, npz_path
+        dumpfn(res, path, indent=4)
+    else:
+        path, stale = npz_path, json_path
+        data = {kk: _to_array(vv) for kk, vv in res["data"].items()}
+        np.savez_compressed(path, **data)
+    if os.path.isfile(stale):
+        os.remove(stale)
+    return path
+
+
+def find_result(task_dir):
+    """
+    The path of the stored result in task_dir, npz is preferred to json
+    """
+    npz_path = os.path.join(task_dir, "result_task.npz")
+    if os.path.isfile(npz_path):
+        return npz_path
+    return os.path.join(task_dir, "result_task.json")
+
+
+def load_result(path):
+    """
+    Load a stored result.
+    A json result is loaded as before (a dpdata LabeledSystem);
+    a npz result is wrapped by TaskResult that reads the fields on demand.
+    """
+    if path.endswith(".npz"):
+        return TaskResult(path)
+    return loadfn(path)
+
+
+class TaskResult:
+    """
+    Lazy view of a npz result. It supports the part of the LabeledSystem
+    interface used by the properties: result["energies"], result.to(...)
+    The archive is opened only while fields are read, no file stays open.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with np.load(path, allow_pickle=False) as npz:
+            self._files = list(npz.files)
+        self._cache = {}
+
+    def keys(self):
+        return list(self._files)
+
+    def __contains__(self, key):
+        return key in self._files
+
+    def _read(self, keys):
+        # read the fields that are not cached yet in one opening of the archive
+        keys = [ii for ii in keys if ii not in self._cache]
+        if len(keys) == 0:
+            return
+        with np.load(self.path, allow_pickle=False) as npz:
+            for key in keys:
+                value = npz[key]
+                if key == "atom_names":
+                    value = [str(ii) for ii in value]
+                elif key == "atom_numbs":
+                    value = [int(ii) for ii in value]
+                elif value.ndim == 0:
+                    value = value.item()
+                self._cache[key] = value
+
+    def __getitem__(self, key):
+        self._read([key])
+        return self._cache[key]
+
+    def get(self, key, frames=None):
+        """
+        Read one field, frames selects the frames of a per-frame field
+        """
+        value = self[key]
+        if frames is not None and key in frame_keys:
+            value = value[frames]
+        return value
+
+    def get_nframes(self):
+        return len(self["energies"])
+
+    def to_system(self, frames=None):
+        """
+        The result as a LabeledSystem, frames is a slice or a list of frame indices
+        """
+        self._read(self.keys())
+        data = {kk: self.get(kk, frames) for kk in self.keys()}
+        return LabeledSystem(data=data)
+
+    def to(self, fmt, *args, **kwargs):
+        if "frame_idx" in kwargs:
+            # only the requested frame is read
+            frames = [kwargs.pop("frame_idx")]
+            return self.to_system(frames).to(fmt, *args, frame_idx=0, **kwargs)
+        return self.to_system().to(fmt, *args, **kwargs)
@@ -55,6 +55,66 @@ def cmd_append_log(cmd, log_file):
     return ret
 
 
+def file_tail_contains(fname, keyword, block_size=65536):
+    """
+    check if keyword is in the file by reading it backwards in blocks,
+    the trailer of a finished calculation is found without reading the whole file
+    """
+    key = keyword.encode()
+    overlap = len(key) - 1
+    with open(fname, "rb") as fp:
+        fp.seek(0, os.SEEK_END)
+        end = fp.tell()
+        tail = b""
+        while end > 0:
+            start = max(0, end - block_size)
+            fp.seek(start)
+            block = fp.read(end - start) + tail
+            if key in block:
+                return True
+            # keep the head of this block so a keyword across two blocks is found
+            tail = block[:overlap]
+            end = start
+    return False
+
+
+def parse_result_frames(result_frames):
+    """
+    stride of a result_frames policy:
+    "all" -> 1, "stride:N" -> N, "last" -> None (only the last frame)
+    """
+    if result_frames == "all":
+        return 1
+    elif result_frames == "last":
+        return None
+    elif result_frames.startswith("stride:"):
+        try:
+            stride = int(result_frames.split(":")[1])
+        except ValueError:
+            stride = 0
+        if stride > 0:
+            return stride
+    raise RuntimeError(
+        "unknown result_frames %s, should be last, stride:N or all" % result_frames
+    )
+
+
+def select_frames(nframes, result_frames):
+    """
+    indices of the frames kept by a result_frames policy,
+    the last frame is always kept
+    """
+    stride = parse_result_frames(result_frames)
+    if nframes == 0:
+        return []
+    if stride is None:
+        return [nframes - 1]
+    idx = list(range(0, nframes, stride))
+    if idx[-1] != nframes - 1:
+        idx.append(nframes - 1)
+    return idx
+
+
 def log_iter(task, ii, jj):
     logging.info((log_iter_head + "%s") % (ii, jj, task))
 
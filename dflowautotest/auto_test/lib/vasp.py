@@ -1,5 +1,6 @@
 #!/usr/bin/python3
 import os
+import re
 import warnings
 
 import numpy as np
@@ -7,6 +8,7 @@ from pymatgen.io.vasp import Incar, Kpoints, Potcar
 
 import dflowautotest.auto_test.lib.lammps as lammps
 import dflowautotest.auto_test.lib.util as util
+from dflowautotest.auto_test.lib.utils import file_tail_contains, parse_result_frames
 from dflowautotest.lib.vasp import incar_upper
 from dflow.python import upload_packages
 upload_packages.append(__file__)
@@ -92,6 +94,33 @@ def sort_poscar(poscar_in, poscar_out, new_names):
         fp.write("\n".join(ret))
 
 
+def write_poscar(poscar_out, cell, coord, atom_types, atom_names):
+    """
+    write one frame as a cartesian POSCAR in the same layout as dpdata's vasp/poscar
+
+    cell: [3, 3], coord: [natoms, 3], atom_types: zero based [natoms]
+    """
+    atom_types = np.asarray(atom_types, dtype=int)
+    atom_numbs = [int(np.sum(atom_types == ii)) for ii in range(len(atom_names))]
+    names = [nn for nn, cc in zip(atom_names, atom_numbs) if cc > 0]
+    numbs = [cc for cc in atom_numbs if cc > 0]
+    ret = "".join(["%s%d " % (nn, cc) for nn, cc in zip(names, numbs)]) + "\n"
+    ret += "1.0\n"
+    for ii in cell:
+        ret += "".join(["%.16e " % jj for jj in ii]) + "\n"
+    ret += "".join(["%s " % nn for nn in names]) + "\n"
+    ret += "".join(["%d " % cc for cc in numbs]) + "\n"
+    ret += "Cartesian\n"
+    sort_idx = np.lexsort((np.arange(len(atom_types)), atom_types))
+    posi_list = [
+        "%15.10f %15.10f %15.10f" % tuple(ii) for ii in np.asarray(coord)[sort_idx]
+    ]
+    posi_list.append("")
+    ret += "\n".join(posi_list)
+    with open(poscar_out, "w") as fp:
+        fp.write(ret)
+
+
 def perturb_xz(poscar_in, poscar_out, pert=0.01):
     with open(poscar_in, "r") as fp:
         lines = fp.read().split("\n")
@@ -134,121 +163,252 @@ def make_kspacing_kpoints(poscar, kspacing, kgamma):
     return ret
 
 
+class OutcarReader:
+    """
+    collect the items used by the auto_test from an OUTCAR in one streaming pass
+
+    Attributes
+    ----------
+    finished: the "Elapsed time (sec):" marker is found
+    natoms: total number of atoms (first "ions per type")
+    energies: every "free  energy   TOTEN"
+    boxes: every "direct lattice vectors" block
+    volumes: every "volume of cell"
+    stresses: every "in kB" line as a 3x3 tensor (kB)
+    frames: the converged ionic steps in the dpdata LabeledSystem layout,
+        see ``to_system_data``. Only the frames kept by the result_frames
+        policy (last, stride:N or all) are stored
+    """
+
+    def __init__(self, fname, result_frames="all"):
+        self.fname = fname
+        self._stride = parse_result_frames(result_frames)
+        self._naccepted = 0
+        self._last_frame = None
+        self.finished = False
+        self.natoms = None
+        self.atom_numbs = None
+        self.atom_names = []
+        self.nelm = None
+        self.energies = []
+        self.boxes = []
+        self.volumes = []
+        self.stresses = []
+        self.frame_cells = []
+        self.frame_coords = []
+        self.frame_energies = []
+        self.frame_forces = []
+        self.frame_virials = []
+        self._potcar_names = []
+        self._read()
+
+    def _new_block(self):
+        self._cell = []
+        self._coord = []
+        self._force = []
+        self._virial = None
+        self._converged = True
+        self._broken = False
+
+    def _end_block(self, energy):
+        has_label = (
+            len(self._cell) > 0 and len(self._coord) > 0 and len(self._force) > 0
+        )
+        if self._converged and has_label and not self._broken:
+            frame = (self._cell, self._coord, energy, self._force, self._virial)
+            if self._stride is not None and self._naccepted % self._stride == 0:
+                self._store_frame(frame)
+                self._last_frame = None
+            else:
+                # kept until a later frame is found, the last frame is always stored
+                self._last_frame = frame
+            self._naccepted += 1
+        self._new_block()
+
+    def _store_frame(self, frame):
+        cell, coord, energy, force, virial = frame
+        self.frame_cells.append(cell)
+        self.frame_coords.append(coord)
+        self.frame_energies.append(energy)
+        self.frame_forces.append(force)
+        if virial is not None:
+            self.frame_virials.append(virial)
+
+    def _read(self):
+        self._new_block()
+        # lines still to be consumed by the block that is currently open
+        box_lines = 0
+        cell_skip = cell_lines = 0
+        force_skip = force_lines = 0
+        want_virial = False
+        with open(self.fname, "r") as fp:
+            for line in fp:
+                # the windows may overlap each other, every line is still
+                # checked for the keywords below
+                if box_lines > 0:
+                    self.boxes[-1].append(_split_box_line(line))
+                    box_lines -= 1
+                if cell_skip > 0:
+                    cell_skip -= 1
+                elif cell_lines > 0:
+                    words = line.replace("-", " -").split()[0:3]
+                    self._cell.append([float(ww) for ww in words])
+                    cell_lines -= 1
+                if force_skip > 0:
+                    force_skip -= 1
+                elif force_lines > 0:
+                    try:
+                        info = [float(ww) for ww in line.split()[:6]]
+                    except ValueError:
+                        info = []
+                    if len(info) == 6:
+                        self._coord.append(info[:3])
+                        self._force.append(info[3:6])
+                        force_lines -= 1
+                    else:
+                        # the force table is cut, the frame is dropped
+                        self._broken = True
+                        force_lines = 0
+
+                if "free  energy   TOTEN" in line:
+                    energy = float(line.split()[4])
+                    self.energies.append(energy)
+                    self._end_block(energy)
+                elif "in kB" in line:
+                    words = line.split()
+                    sv = [float(ww) for ww in words[2:8]]
+                    # xx yy zz xy yz zx
+                    self.stresses.append(
+                        [
+                            [sv[0], sv[3], sv[5]],
+                            [sv[3], sv[1], sv[4]],
+                            [sv[5], sv[4], sv[2]],
+                        ]
+                    )
+                    if want_virial and words[0:2] == ["in", "kB"]:
+                        self._virial = self.stresses[-1]
+                        want_virial = False
+                elif "Iteration" in line:
+                    if self.nelm is not None and int(line.split()[3][:-1]) >= self.nelm:
+                        self._converged = False
+                elif "direct lattice vectors" in line:
+                    self.boxes.append([])
+                    box_lines = 3
+                elif "VOLUME and BASIS" in line:
+                    self._cell = []
+                    cell_skip, cell_lines = 4, 3
+                elif "FORCE on cell =-STRESS" in line:
+                    want_virial = True
+                elif "TOTAL-FORCE" in line and "ML" not in line:
+                    self._coord = []
+                    self._force = []
+                    force_skip, force_lines = 1, self.natoms or 0
+                elif "volume of cell" in line:
+                    self.volumes.append(float(line.split()[4]))
+                elif "ions per type" in line:
+                    if self.atom_numbs is None:
+                        self.atom_numbs = [int(ww) for ww in line.split()[4:]]
+                        self.natoms = sum(self.atom_numbs)
+                elif "TITEL" in line:
+                    self.atom_names.append(line.split()[3].split("_")[0])
+                elif "POTCAR:" in line:
+                    self._potcar_names.append(line.split()[2].split("_")[0])
+                elif "Elapsed time (sec):" in line:
+                    self.finished = True
+                elif self.nelm is None:
+                    match = re.search(r"NELM\s*=\s*(\d+)", line)
+                    if match:
+                        self.nelm = int(match.group(1))
+        if self._last_frame is not None:
+            self._store_frame(self._last_frame)
+            self._last_frame = None
+        if len(self.atom_names) == 0:
+            # the POTCAR names are printed twice
+            self.atom_names = self._potcar_names[: len(self._potcar_names) // 2]
+        if self.atom_numbs is not None:
+            self.atom_names = self.atom_names[: len(self.atom_numbs)]
+
+    def to_system_data(self):
+        """
+        the converged frames as the data of a dpdata LabeledSystem,
+        virials are converted from kB to eV
+        """
+        if self.atom_numbs is None or len(self.atom_names) != len(self.atom_numbs):
+            raise OutcarItemError("cannot get the atom names and numbers from OUTCAR")
+        nframes = len(self.frame_energies)
+        # a species repeated in several blocks, e.g. Mo W Mo, is one type as in dpdata
+        atom_names = []
+        for ii in self.atom_names:
+            if ii not in atom_names:
+                atom_names.append(ii)
+        atom_types = []
+        for idx, ii in enumerate(self.atom_numbs):
+            atom_types += [atom_names.index(self.atom_names[idx])] * ii
+        data = {
+            "atom_names": atom_names,
+            "atom_numbs": [atom_types.count(ii) for ii in range(len(atom_names))],
+            "atom_types": np.array(atom_types, dtype=int),
+            "orig": np.zeros(3, dtype=int),
+            "cells": np.array(self.frame_cells).reshape([nframes, 3, 3]),
+            "coords": np.array(self.frame_coords).reshape([nframes, self.natoms, 3]),
+            "energies": np.array(self.frame_energies),
+            "forces": np.array(self.frame_forces).reshape([nframes, self.natoms, 3]),
+        }
+        if len(self.frame_virials) > 0:
+            virials = np.array(self.frame_virials)
+            v_pref = 1 * 1e3 / 1.602176621e6
+            for ii in range(nframes):
+                virials[ii] *= v_pref * np.linalg.det(data["cells"][ii])
+            data["virials"] = virials
+        return data
+
+
 def get_energies(fname):
-    if not check_finished(fname):
+    outcar = OutcarReader(fname)
+    if not outcar.finished:
         warnings.warn("incomplete outcar: " + fname)
-    with open(fname, "r") as fp:
-        lines = fp.read().split("\n")
-    try:
-        ener = _get_energies(lines)
-        return ener
-    except OutcarItemError:
+    if len(outcar.energies) == 0:
         return None
+    return outcar.energies
 
 
 def get_boxes(fname):
-    if not check_finished(fname):
+    outcar = OutcarReader(fname)
+    if not outcar.finished:
         warnings.warn("incomplete outcar: " + fname)
-    with open(fname, "r") as fp:
-        lines = fp.read().split("\n")
-    try:
-        ener = _get_boxes(lines)
-        return ener
-    except OutcarItemError:
-        return None
+    return np.array(outcar.boxes)
 
 
 def get_nev(fname):
-    if not check_finished(fname):
+    outcar = OutcarReader(fname)
+    if not outcar.finished:
         warnings.warn("incomplete outcar: " + fname)
-    with open(fname, "r") as fp:
-        lines = fp.read().split("\n")
-    try:
-        natoms = _get_natoms(lines)
-        vol = _get_volumes(lines)[-1]
-        ener = _get_energies(lines)[-1]
-        return natoms, ener / natoms, vol / natoms
-    except OutcarItemError:
+    if outcar.natoms is None or len(outcar.volumes) == 0 or len(outcar.energies) == 0:
         raise OutcarItemError("cannot find the result, please check the OUTCAR")
+    natoms = outcar.natoms
+    vol = outcar.volumes[-1]
+    ener = outcar.energies[-1]
+    return natoms, ener / natoms, vol / natoms
     # print(fname, natoms, vol, ener)
 
 
 def get_stress(fname):
-    if not check_finished(fname):
+    outcar = OutcarReader(fname)
+    if not outcar.finished:
         warnings.warn("incomplete outcar: " + fname)
-    with open(fname, "r") as fp:
-        lines = fp.read().split("\n")
-    try:
-        stress = _get_stress(lines)[-1]
-        return stress
-    except OutcarItemError:
+    if len(outcar.stresses) == 0:
         return None
+    return np.array(outcar.stresses[-1])
 
 
 def check_finished(fname):
-    with open(fname, "r") as fp:
-        return "Elapsed time (sec):" in fp.read()
-
-
-def _get_natoms(lines):
-    ipt = None
-    for ii in lines:
-        if "ions per type" in ii:
-            ipt = [int(jj) for jj in ii.split()[4:]]
-            return sum(ipt)
-    raise OutcarItemError("cannot find item 'ions per type'")
-
-
-def _get_energies(lines):
-    items = []
-    for ii in lines:
-        if "free  energy   TOTEN" in ii:
-            items.append(float(ii.split()[4]))
-    if len(items) == 0:
-        raise OutcarItemError("cannot find item 'free  energy   TOTEN'")
-    return items
+    return file_tail_contains(fname, "Elapsed time (sec):")
 
 
 def _split_box_line(line):
     return [float(line[0:16]), float(line[16:29]), float(line[29:42])]
 
 
-def _get_boxes(lines):
-    items = []
-    for idx, ii in enumerate(lines):
-        tmp_box = []
-        if "direct lattice vectors" in ii:
-            tmp_box.append(_split_box_line(lines[idx + 1]))
-            tmp_box.append(_split_box_line(lines[idx + 2]))
-            tmp_box.append(_split_box_line(lines[idx + 3]))
-            items.append(tmp_box)
-    return np.array(items)
-
-
-def _get_volumes(lines):
-    items = []
-    for ii in lines:
-        if "volume of cell" in ii:
-            items.append(float(ii.split()[4]))
-    if len(items) == 0:
-        raise OutcarItemError("cannot find item 'volume of cell'")
-    return items
-
-
-def _get_stress(lines):
-    items = []
-    for ii in lines:
-        if "in kB" in ii:
-            sv = [float(jj) for jj in ii.split()[2:8]]
-            tmp = sv[4]
-            sv[4] = sv[5]
-            sv[5] = tmp
-            items.append(util.voigt_to_stress(sv))
-    if len(items) == 0:
-        raise OutcarItemError("cannot find item 'in kB'")
-    return items
-
-
 def _compute_isif(relax_ions, relax_shape, relax_volume):
     if (relax_ions) and (not relax_shape) and (not relax_volume):
         isif = 2
@@ -463,7 +623,7 @@ def poscar_scale(poscar_in, poscar_out, scale):
         fout.write("".join(lines))
 
 
-def poscar_vol(poscar_in):
+def get_poscar_cell(poscar_in):
     with open(poscar_in, "r") as fin:
         lines = list(fin)
     box = []
@@ -474,7 +634,11 @@ def poscar_vol(poscar_in):
     scale = float(lines[1].split()[0])
     box = np.array(box)
     box *= scale
-    return np.linalg.det(box)
+    return box
+
+
+def poscar_vol(poscar_in):
+    return np.linalg.det(get_poscar_cell(poscar_in))
 
 
 def _make_vasp_kp_gamma(kpoints):
@@ -506,12 +670,10 @@ def make_vasp_kpoints(kpoints, kgamma=False):
 
 
 def make_vasp_kpoints_from_incar(work_dir, jdata):
-    cwd = os.getcwd()
     fp_aniso_kspacing = jdata.get("fp_aniso_kspacing")
-    os.chdir(work_dir)
     # get kspacing and kgamma from incar
-    assert os.path.exists("INCAR")
-    with open("INCAR") as fp:
+    assert os.path.exists(os.path.join(work_dir, "INCAR"))
+    with open(os.path.join(work_dir, "INCAR")) as fp:
         incar = fp.read()
     standard_incar = incar_upper(Incar.from_string(incar))
     if fp_aniso_kspacing is None:
@@ -533,9 +695,8 @@ def make_vasp_kpoints_from_incar(work_dir, jdata):
     except KeyError:
         raise RuntimeError("KGAMMA must be given in INCAR")
     # check poscar
-    assert os.path.exists("POSCAR")
+    assert os.path.exists(os.path.join(work_dir, "POSCAR"))
     # make kpoints
-    ret = make_kspacing_kpoints("POSCAR", kspacing, gamma)
+    ret = make_kspacing_kpoints(os.path.join(work_dir, "POSCAR"), kspacing, gamma)
     kp = Kpoints.from_string(ret)
-    kp.write_file("KPOINTS")
-    os.chdir(cwd)
+    kp.write_file(os.path.join(work_dir, "KPOINTS"))
@@ -8,7 +8,6 @@ upload_packages.append(__file__)
 
 
 def make_refine(init_from_suffix, output_suffix, path_to_work):
-    cwd = os.getcwd()
     init_from = re.sub(
         output_suffix[::-1], init_from_suffix[::-1], path_to_work[::-1], count=1
     )[::-1]
@@ -24,7 +23,6 @@ def make_refine(init_from_suffix, output_suffix, path_to_work):
     for ii in range(task_num):
         output_task = os.path.join(output, "task.%06d" % ii)
         os.makedirs(output_task, exist_ok=True)
-        os.chdir(output_task)
         for jj in [
             "INCAR",
             "POTCAR",
@@ -34,8 +32,8 @@ def make_refine(init_from_suffix, output_suffix, path_to_work):
             "in.lammps",
             "STRU",
         ]:
-            if os.path.exists(jj):
-                os.remove(jj)
+            if os.path.exists(os.path.join(output_task, jj)):
+                os.remove(os.path.join(output_task, jj))
         task_list.append(output_task)
         init_from_task = os.path.join(init_from, "task.%06d" % ii)
         if not os.path.exists(init_from_task):
@@ -55,13 +53,17 @@ def make_refine(init_from_suffix, output_suffix, path_to_work):
         contcar = os.path.join(init_from_task, CONTCAR)
         init_poscar = os.path.join(init_from_task, POSCAR)
         if os.path.exists(contcar):
-            os.symlink(os.path.relpath(contcar), POSCAR)
+            os.symlink(
+                os.path.relpath(contcar, output_task), os.path.join(output_task, POSCAR)
+            )
         elif os.path.exists(init_poscar):
-            os.symlink(os.path.relpath(init_poscar), POSCAR)
+            os.symlink(
+                os.path.relpath(init_poscar, output_task),
+                os.path.join(output_task, POSCAR),
+            )
         else:
             raise FileNotFoundError(
                 "no %s or %s in the init_from directory" % (CONTCAR, POSCAR)
             )
-    os.chdir(cwd)
 
     return task_list
@@ -2,9 +2,9 @@ import glob
 import os
 
 import numpy as np
-from monty.serialization import loadfn
 
 import dflowautotest.auto_test.lib.abacus as abacus
+from dflowautotest.auto_test.lib.result_store import find_result, load_result
 from dflow.python import upload_packages
 upload_packages.append(__file__)
 
@@ -19,7 +19,6 @@ def make_repro(
     )
     init_data_path_list = glob.glob(init_data_path)
     init_data_path_list.sort()
-    cwd = os.getcwd()
     struct_init_name_list = []
     for ii in init_data_path_list:
         struct_init_name_list.append(ii.split("/")[-2])
@@ -52,7 +51,7 @@ def make_repro(
 
     for ii in init_data_task_todo:
         # get frame number
-        task_result = loadfn(os.path.join(ii, "result_task.json"))
+        task_result = load_result(find_result(ii))
         if reprod_last_frame:
             nframe = 1
         else:
@@ -66,7 +65,6 @@ def make_repro(
             task_num += 1
             task_list.append(output_task)
             os.makedirs(output_task, exist_ok=True)
-            os.chdir(output_task)
             # clear dir
             for kk in [
                 "INCAR",
@@ -77,18 +75,18 @@ def make_repro(
                 "in.lammps",
                 "STRU",
             ]:
-                if os.path.exists(kk):
-                    os.remove(kk)
+                if os.path.exists(os.path.join(output_task, kk)):
+                    os.remove(os.path.join(output_task, kk))
             # make conf
+            task_poscar = os.path.join(output_task, "POSCAR")
             if reprod_last_frame:
-                task_result.to("vasp/poscar", "POSCAR", frame_idx=-1)
+                task_result.to("vasp/poscar", task_poscar, frame_idx=-1)
             else:
-                task_result.to("vasp/poscar", "POSCAR", frame_idx=jj)
+                task_result.to("vasp/poscar", task_poscar, frame_idx=jj)
             if inter_param["type"] == "abacus":
-                abacus.poscar2stru("POSCAR", inter_param, "STRU")
-                os.remove("POSCAR")
-
-    os.chdir(cwd)
+                task_stru = os.path.join(output_task, "STRU")
+                abacus.poscar2stru(task_poscar, inter_param, task_stru)
+                os.remove(task_poscar)
 
     if property_type == "interstitial":
         fout_element.close()
@@ -135,7 +133,7 @@ def post_repro(
     res_data = {}
 
     for ii in init_data_task_todo:
-        init_task_result = loadfn(os.path.join(ii, "result_task.json"))
+        init_task_result = load_result(find_result(ii))
         if reprod_last_frame:
             nframe = 1
         else:
@@ -149,7 +147,7 @@ def post_repro(
         init_ener_tot.extend(list(init_ener))
         output_ener = []
         for jj in range(idid, idid + nframe):
-            output_task_result = loadfn(os.path.join(all_tasks[jj], "result_task.json"))
+            output_task_result = load_result(find_result(all_tasks[jj]))
             output_epa = output_task_result["energies"] / natoms
             output_ener.append(output_epa)
             output_ener_tot.extend(output_task_result["energies"])
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import glob
+import hashlib
+import os
+import shutil
+import uuid
+from monty.serialization import dumpfn, loadfn
+from dflow.python import upload_packages
+upload_packages.append(__file__)
+
+from dflowautotest.lib.utils import return_prop_list
+
+# the cache record written in each task directory by the make step
+cache_record = 'cache.json'
+# the results computed by the post step, they are not cached
+result_files = ['result.json', 'result_task.json', 'result_task.npz']
+# change it when the layout of the cached outputs changes
+cache_version = 'dflowautotest-result-cache-2'
+
+_file_hashes = {}
+
+
+def list_task_dirs(structures: list, properties: list = None) -> list:
+    """
+    The relaxation tasks of the confs, or their property tasks if properties
+    is given, relative to the working directory
+    """
+    conf_dirs = []
+    for conf in structures:
+        conf_dirs.extend(glob.glob(conf))
+    conf_dirs.sort()
+    task_dirs = []
+    for ii in conf_dirs:
+        if properties is None:
+            task_dirs.append(os.path.join(ii, 'relaxation', 'relax_task'))
+        else:
+            for jj in return_prop_list(properties):
+                task_dirs.extend(sorted(glob.glob(os.path.join(ii, jj, 'task.*'))))
+    return task_dirs
+
+
+def _file_hash(path: str) -> str:
+    # the models are shared by many tasks, hash each file once
+    stat = os.stat(path)
+    stamp = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    if stamp not in _file_hashes:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b''):
+                sha.update(chunk)
+        _file_hashes[stamp] = sha.hexdigest()
+    return _file_hashes[stamp]
+
+
+def task_inputs(task_dir: str) -> list:
+    """
+    The input files of a made task, relative to it: all the files (or links to files)
+    in it and its subdirectories, e.g. POSCAR, conf.lmp, in.lammps, INCAR, the model,
+    task.json, the pp_orb files of ABACUS
+    """
+    inputs = []
+    for root, dirs, files in os.walk(task_dir, followlinks=True):
+        for ii in files:
+            path = os.path.relpath(os.path.join(root, ii), task_dir)
+            if os.path.isfile(os.path.join(root, ii)) and path != cache_record:
+                inputs.append(path)
+    return sorted(inputs)
+
+
+def task_key(task_dir: str) -> str:
+    """
+    The key of a made task: the hash of the names and contents of its inputs
+    """
+    sha = hashlib.sha256(cache_version.encode())
+    for ii in task_inputs(task_dir):
+        sha.update(('%s\0%s\0' % (ii, _file_hash(os.path.join(task_dir, ii)))).encode())
+    return sha.hexdigest()
+
+
+def _entry(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, key[:2], key)
+
+
+def mark_cache_hits(task_dirs: list, cache_dir: str = None) -> list:
+    """
+    Record the key of each made task and whether its outputs are in cache_dir.
+    Without cache_dir the records left by an earlier run are removed.
+    Return whether each task is a hit.
+    """
+    hits = []
+    for ii in task_dirs:
+        record = os.path.join(ii, cache_record)
+        if os.path.isfile(record):
+            os.remove(record)
+        if cache_dir is None:
+            hits.append(False)
+            continue
+        key = task_key(ii)
+        hit = os.path.isdir(_entry(cache_dir, key))
+        dumpfn({'key': key, 'hit': hit, 'inputs': task_inputs(ii)}, record, indent=4)
+        hits.append(hit)
+    if cache_dir is not None:
+        print('result cache: %d of %d tasks are hits' % (sum(hits), len(hits)))
+    return hits
+
+
+def is_cache_hit(task_dir: str) -> bool:
+    record = os.path.join(task_dir, cache_record)
+    return os.path.isfile(record) and loadfn(record)['hit']
+
+
+def restore_cache_hits(task_dirs: list, cache_dir: str):
+    """
+    Copy the cached outputs into the hit tasks
+    """
+    for ii in task_dirs:
+        if is_cache_hit(ii):
+            entry = _entry(cache_dir, loadfn(os.path.join(ii, cache_record))['key'])
+            shutil.copytree(entry, ii, dirs_exist_ok=True)
+
+
+def _finished(task_dir: str) -> bool:
+    # the post step stores null for the tasks that did not finish
+    for ii in result_files:
+        path = os.path.join(task_dir, ii)
+        if os.path.isfile(path):
+            return ii.endswith('.npz') or loadfn(path) is not None
+    return False
+
+
+def store_cache_misses(task_dirs: list, cache_dir: str):
+    """
+    Store the outputs of the finished miss tasks in cache_dir: the files, in the
+    task and its subdirectories (e.g. OUT.ABACUS), that are neither inputs nor
+    results of the post step
+    """
+    for ii in task_dirs:
+        record = os.path.join(ii, cache_record)
+        if not os.path.isfile(record) or loadfn(record)['hit'] or not _finished(ii):
+            continue
+        record = loadfn(record)
+        entry = _entry(cache_dir, record['key'])
+        if os.path.isdir(entry):
+            continue
+        skip = set(record['inputs'] + result_files + [cache_record])
+        tmp_entry = os.path.join(cache_dir, 'tmp.' + uuid.uuid4().hex)
+        os.makedirs(tmp_entry)
+        for root, dirs, files in os.walk(ii):
+            for jj in files:
+                path = os.path.join(root, jj)
+                name = os.path.relpath(path, ii)
+                if name not in skip and os.path.isfile(path) and not os.path.islink(path):
+                    os.makedirs(os.path.dirname(os.path.join(tmp_entry, name)), exist_ok=True)
+                    shutil.copy2(path, os.path.join(tmp_entry, name))
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        try:
+            # another run may have stored the same task meanwhile
+            os.rename(tmp_entry, entry)
+        except OSError:
+            shutil.rmtree(tmp_entry)
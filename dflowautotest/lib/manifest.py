@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from monty.serialization import dumpfn, loadfn
+from dflow import config, upload_artifact, S3Artifact
+from dflow.python import upload_packages
+upload_packages.append(__file__)
+
+from dflowautotest.lib.cache import _file_hash
+
+# the bundles uploaded from the working directory, by content hash
+upload_record = 'upload_record.json'
+# change them when the layout of the bundles changes
+bundle_version = 'dflowautotest-input-bundle-1'
+model_version = 'dflowautotest-model-1'
+
+
+def _files(path: str) -> list:
+    # a file, or all the files under a directory
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, dirs, names in os.walk(path, followlinks=True):
+        files.extend([os.path.join(root, ii) for ii in names])
+    return files
+
+
+def _conf_dirs(structures: list) -> list:
+    conf_dirs = []
+    for conf in structures:
+        conf_dirs.extend([ii for ii in glob.glob(conf) if os.path.isdir(ii)])
+    return sorted(set(conf_dirs))
+
+
+def model_files(inter: dict) -> list:
+    """
+    The model file(s) of the interaction
+    """
+    model = inter.get('model', [])
+    return [model] if isinstance(model, str) else list(model)
+
+
+def _inter_files(inter: dict, model: bool = True) -> list:
+    """
+    The files of the interaction: the model(s), in_lammps, the incar (INCAR or INPUT)
+    and the potcars, orb_files and deepks_desc in potcar_prefix
+    """
+    files = model_files(inter) if model else []
+    for ii in ['in_lammps', 'incar']:
+        if isinstance(inter.get(ii, None), str):
+            files.append(inter[ii])
+    prefix = inter.get('potcar_prefix', '')
+    for ii in ['potcars', 'orb_files']:
+        files.extend([os.path.join(prefix, jj) for jj in (inter.get(ii, None) or {}).values()])
+    if inter.get('deepks_desc', None) is not None:
+        files.append(os.path.join(prefix, inter['deepks_desc']))
+    return files
+
+
+def _input_prop(parameter: dict) -> list:
+    input_prop = parameter.get('cal_setting', {}).get('input_prop', None)
+    return [input_prop] if input_prop is not None else []
+
+
+def input_manifest(relax_param: str = None, props_param: str = None, model: bool = True) -> list:
+    """
+    The files of the working directory referenced by the param files, relative to it:
+    the files of the conf dirs, the interaction files and the input_prop of the
+    relaxation and the properties. Without relax_param the confs are relaxed already,
+    their relaxation directories and the init_from_suffix directories of the refined
+    properties are included. Without model the model files, uploaded by upload_models,
+    are left out.
+    """
+    paths = []
+    models = []
+    for param_file in [relax_param, props_param]:
+        if param_file is None:
+            continue
+        param = loadfn(param_file)
+        for ii in _conf_dirs(param['structures']):
+            # the results of earlier runs in the conf dirs are made again
+            paths.extend([os.path.join(ii, jj) for jj in os.listdir(ii)
+                          if os.path.isfile(os.path.join(ii, jj))])
+        paths.extend(_inter_files(param['interaction'], model))
+        paths.extend(_input_prop(param.get('relaxation', {})))
+        models.extend([os.path.realpath(ii) for ii in model_files(param['interaction'])])
+    if props_param is not None:
+        param = loadfn(props_param)
+        conf_dirs = _conf_dirs(param['structures'])
+        if relax_param is None:
+            paths.extend([os.path.join(ii, 'relaxation') for ii in conf_dirs])
+        for prop in param['properties']:
+            if prop.get('skip', False):
+                continue
+            paths.extend(_input_prop(prop))
+            if 'init_from_suffix' not in prop:
+                continue
+            init_dir = prop['type'] + '_' + prop['init_from_suffix']
+            if prop.get('reproduce', False):
+                paths.extend(glob.glob(os.path.join(prop['init_data_path'], '*', init_dir)))
+            elif relax_param is None:
+                paths.extend([os.path.join(ii, init_dir) for ii in conf_dirs])
+
+    work_dir = os.getcwd()
+    files = set()
+    for ii in paths:
+        if not os.path.exists(ii):
+            continue
+        for jj in _files(ii):
+            path = os.path.relpath(os.path.abspath(jj), work_dir)
+            if path.startswith(os.pardir + os.sep):
+                print('%s is outside of the working directory, it is not uploaded' % jj)
+            elif os.path.isfile(jj) and (model or os.path.realpath(jj) not in models):
+                files.add(path)
+    return sorted(files)
+
+
+def bundle_hash(files: list, version: str = bundle_version) -> str:
+    """
+    The hash of the names and contents of the files of a bundle
+    """
+    sha = hashlib.sha256(version.encode())
+    for ii in files:
+        sha.update(('%s\0%s\0' % (ii, _file_hash(ii))).encode())
+    return sha.hexdigest()
+
+
+def _uploaded(key: str):
+    # the artifact uploaded with the key, the debug artifacts are not recorded
+    if config['mode'] == 'debug' or not os.path.isfile(upload_record):
+        return None
+    record = loadfn(upload_record)
+    if key not in record:
+        return None
+    return S3Artifact(key=record[key]['key'], path_list=record[key]['path_list'])
+
+
+def _record_upload(key: str, artifact):
+    if config['mode'] == 'debug':
+        return
+    record = loadfn(upload_record) if os.path.isfile(upload_record) else {}
+    record[key] = {'key': artifact.key, 'path_list': artifact.path_list}
+    dumpfn(record, upload_record, indent=4)
+
+
+def _link(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # on another file system, the archive follows the link
+        os.symlink(os.path.abspath(src), dst)
+
+
+def upload_manifest(files: list):
+    """
+    Upload the files, relative to the working directory, as one compressed bundle
+    with the same layout as upload_artifact(os.getcwd()). The bundle is keyed by
+    the hash of its contents, an unchanged bundle is not uploaded again and the
+    key in upload_record is reused.
+    """
+    work_dir = os.getcwd()
+    debug = config['mode'] == 'debug'
+    key = bundle_hash(files)
+    artifact = _uploaded(key)
+    if artifact is not None:
+        print('input bundle %s is unchanged, reusing %s' % (key[:12], artifact.key))
+        return artifact
+
+    # the bundle is in the working directory so that the files are hard linked, not copied,
+    # the debug artifact links to the bundle which is kept
+    root = tempfile.mkdtemp(prefix='.dflowautotest-upload-', dir=None if debug else work_dir)
+    bundle = os.path.join(root, work_dir.lstrip(os.sep))
+    for ii in files:
+        dst = os.path.join(bundle, ii)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        _link(ii, dst)
+    print('uploading input bundle %s: %d files, %.1f MB of %s'
+          % (key[:12], len(files), sum([os.path.getsize(ii) for ii in files]) / 1e6, work_dir))
+    os.chdir(root)
+    try:
+        # relative to the cwd, the bundle is stored under the path of the working directory
+        artifact = upload_artifact(os.path.relpath(bundle))
+    finally:
+        os.chdir(work_dir)
+        if not debug:
+            shutil.rmtree(root)
+    _record_upload(key, artifact)
+    return artifact
+
+
+def upload_models(param_file: str):
+    """
+    Upload the model files of the interaction of param_file as one artifact, keyed
+    by their contents as the input bundle. Return None without model.
+    """
+    files = model_files(loadfn(param_file)['interaction'])
+    if len(files) == 0:
+        return None
+    key = bundle_hash(files, model_version)
+    artifact = _uploaded(key)
+    if artifact is not None:
+        print('models %s are unchanged, reusing %s' % (' '.join(files), artifact.key))
+        return artifact
+    print('uploading models %s' % ' '.join(files))
+    artifact = upload_artifact(files)
+    _record_upload(key, artifact)
+    return artifact
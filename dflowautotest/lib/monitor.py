@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import asyncio
+from dflow import download_artifact
+from dflow.argo_objects import ArgoStep
+from dflow.python import upload_packages
+upload_packages.append(__file__)
+
+# the phases of a workflow that has ended
+end_phases = ['Succeeded', 'Failed', 'Error']
+# the fields of a poll, O(1) in the number of steps
+poll_fields = ['metadata.name', 'status.phase', 'status.progress']
+# the fields of the steps fetched when the progress changes
+node_fields = ['metadata.name'] + ['status.nodes.%s' % ii for ii in
+                                   ['id', 'displayName', 'phase', 'startedAt', 'inputs.parameters']]
+
+
+def print_step(wf, step):
+    print('%s: %s %s' % (wf.id, step.get('key', None) or step.displayName, step.phase))
+
+
+class WorkflowMonitor:
+    """
+    Watch many workflows at once from one event loop.
+    Each poll only queries the phase and the progress of a workflow, the
+    phases of its steps are queried when the progress changes. The interval
+    starts at min_interval, is multiplied by backoff while nothing changes
+    (up to max_interval) and goes back to min_interval when the progress changes.
+    on_step(wf, step) is called for each change of a step phase.
+    """
+
+    def __init__(self, min_interval=4., max_interval=60., backoff=2., on_step=print_step):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.on_step = on_step
+        self.watches = []
+
+    def watch(self, wf, post_step=None, artifact='output_post', path='.'):
+        """
+        Watch wf, the artifact of the step named post_step is downloaded
+        to path as soon as the step succeeds
+        """
+        self.watches.append((wf, post_step, artifact, path))
+
+    @staticmethod
+    def _steps(wf):
+        info = wf.query(fields=node_fields)
+        if 'nodes' not in info.status:
+            # the server does not select the fields of each step
+            info = wf.query(fields=['metadata.name', 'status.nodes'])
+        nodes = list(info.status.get('nodes', {}).values())
+        nodes.sort(key=lambda x: x.get('startedAt', None) or '')
+        return [ArgoStep(ii, wf.id) for ii in nodes]
+
+    @staticmethod
+    def _download(wf, step_id, artifact, path):
+        # only the post step is queried with its outputs
+        step = ArgoStep(wf.query(fields=['metadata.name', 'status.nodes.' + step_id]).status.nodes[step_id], wf.id)
+        download_artifact(step.outputs.artifacts[artifact], path=path)
+
+    async def _watch(self, wf, post_step, artifact, path):
+        loop = asyncio.get_running_loop()
+        interval = self.min_interval
+        phases = {}
+        progress = None
+        download = None
+        while True:
+            # dflow is synchronous, query in a worker thread
+            info = await loop.run_in_executor(None, wf.query, poll_fields)
+            phase = info.status.get('phase', None) or 'Pending'
+            new_progress = info.status.get('progress', None)
+            changed = new_progress is not None and new_progress != progress
+            # without progress (debug mode), the steps are queried on each poll
+            if changed or new_progress is None or phase in end_phases:
+                progress = new_progress
+                for step in await loop.run_in_executor(None, self._steps, wf):
+                    if step.get('phase', None) is not None and phases.get(step.id) != step.phase:
+                        phases[step.id] = step.phase
+                        changed = True
+                        if self.on_step is not None:
+                            self.on_step(wf, step)
+                    if download is None and post_step is not None and \
+                            step.displayName == post_step and step.phase == 'Succeeded':
+                        download = loop.run_in_executor(None, self._download, wf, step.id, artifact, path)
+            if phase in end_phases:
+                break
+            interval = self.min_interval if changed else min(interval * self.backoff, self.max_interval)
+            await asyncio.sleep(interval)
+        if download is not None:
+            await download
+        return phase
+
+    async def _run(self):
+        phases = await asyncio.gather(*[self._watch(*ii) for ii in self.watches])
+        return {ii[0].id: jj for ii, jj in zip(self.watches, phases)}
+
+    def run(self):
+        """
+        Watch until all the workflows end, return the final phase of each workflow id
+        """
+        return asyncio.run(self._run())
@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 
-from monty.serialization import loadfn
+import glob
+import heapq
+import os
+import queue
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from monty.serialization import dumpfn, loadfn
 from dflow.python import upload_packages
 upload_packages.append(__file__)
 
@@ -32,3 +39,245 @@ def identify_task(file: str) -> str:
     else:
         raise RuntimeError('Can not recognize type of the input json file')
     return task_type
+
+
+# relative cost per atom of a relaxation task of each property type
+default_cost_weights = {
+    'eos': 1.0,
+    'elastic': 1.0,
+    'vacancy': 2.0,
+    'interstitial': 2.0,
+    'surface': 2.0,
+    'gamma': 2.0,
+}
+# the cost of a static task relative to a relaxation
+static_cost_ratio = 0.05
+
+
+def estimate_task_cost(task_dir: str, cost_weights: dict = None) -> float:
+    """
+    Estimate the cost of a made task from its atom count, property type
+    and calculation type. A lammps_batch task costs one task per frame.
+    """
+    weights = dict(default_cost_weights)
+    if cost_weights is not None:
+        weights.update(cost_weights)
+    task_param = loadfn(os.path.join(task_dir, 'task.json'))
+    with open(os.path.join(task_dir, 'POSCAR')) as fp:
+        lines = fp.read().split('\n')
+    natoms = sum([int(ii) for ii in lines[6].split()])
+    cost = natoms * weights.get(task_param['type'], 1.0)
+    if task_param.get('cal_type', 'relaxation') == 'static':
+        cost *= static_cost_ratio
+    for ii in ['batch_cells.json', 'batch_disps.json']:
+        if os.path.isfile(os.path.join(task_dir, ii)):
+            cost *= len(loadfn(os.path.join(task_dir, ii)))
+    return cost
+
+
+def pack_tasks(costs: list, n_slices: int) -> list:
+    """
+    Pack the tasks into at most n_slices slices of balanced cost by the
+    longest processing time first rule: the costliest remaining task goes
+    to the slice with the lowest load.
+    Return the task indices of each non-empty slice, costliest first.
+    """
+    order = sorted(range(len(costs)), key=lambda ii: -costs[ii])
+    loads = [(0.0, jj) for jj in range(max(n_slices, 1))]
+    slices = [[] for _ in loads]
+    for ii in order:
+        load, jj = heapq.heappop(loads)
+        slices[jj].append(ii)
+        heapq.heappush(loads, (load + costs[ii], jj))
+    return [ii for ii in slices if len(ii) > 0]
+
+
+def stage_slice(task_list: list, slice_dir: str):
+    """
+    Copy the tasks (paths relative to the working directory) into slice_dir
+    at the same relative paths, together with the files of their property
+    directories that the tasks link to, so that the slice is self-contained.
+    The run order is kept in slice.json.
+    """
+    for task in task_list:
+        prop_dir = os.path.dirname(task)
+        slice_prop_dir = os.path.join(slice_dir, prop_dir)
+        if not os.path.isdir(slice_prop_dir):
+            os.makedirs(slice_prop_dir)
+            for ii in os.listdir(prop_dir):
+                src = os.path.join(prop_dir, ii)
+                if not ii.startswith('task.') and os.path.isfile(src):
+                    shutil.copy2(src, slice_prop_dir)
+        shutil.copytree(task, os.path.join(slice_dir, task), symlinks=True)
+        # the links out of the slice are replaced by copies
+        for ii in os.listdir(task):
+            dst = os.path.join(slice_dir, task, ii)
+            if os.path.islink(dst) and not os.path.exists(dst):
+                os.remove(dst)
+                shutil.copy2(os.path.join(task, ii), dst)
+    dumpfn(task_list, os.path.join(slice_dir, 'slice.json'), indent=4)
+
+
+def _place(src: str, dst: str, move: bool = True):
+    # rename, or hard link when the rename is not allowed, or copy across file systems
+    if os.path.lexists(dst) and not os.path.isdir(dst):
+        os.remove(dst)
+    if move and not os.path.islink(src):
+        try:
+            os.rename(src, dst)
+            return
+        except OSError:
+            pass
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+
+
+def overlay_tree(src: str, dst: str, keep_links: bool = False, ignore: list = ()):
+    """
+    Put the files of src at the same relative paths in dst, replacing the files
+    there, instead of copying src over dst: the files are renamed (src is consumed),
+    hard linked, or copied across file systems. The files reached through a link,
+    e.g. the linked artifacts of the dflow debug mode, are copied and left in place.
+    With keep_links the links in dst are not replaced. The names in ignore are skipped.
+    """
+    move = os.path.realpath(src) == os.path.abspath(src)
+    for root, dirs, files in os.walk(src):
+        out = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(out, exist_ok=True)
+        for ii in [jj for jj in dirs if os.path.islink(os.path.join(root, jj))]:
+            dirs.remove(ii)
+            shutil.copytree(os.path.join(root, ii), os.path.join(out, ii), dirs_exist_ok=True)
+        for ii in files:
+            if ii in ignore or (keep_links and os.path.islink(os.path.join(out, ii))):
+                continue
+            _place(os.path.join(root, ii), os.path.join(out, ii), move)
+
+
+def merge_slice(slice_dir: str, work_dir: str):
+    """
+    Move the outputs of a computed slice back to the working directory,
+    the links of the tasks are inputs, they are not replaced
+    """
+    overlay_tree(slice_dir, work_dir, keep_links=True, ignore=['slice.json'])
+
+
+def run_task_pool(cmd: str, task_dirs: list, n_workers: int = 1,
+                  worker_envs: list = None) -> list:
+    """
+    Run the shell command cmd in each of task_dirs, at most n_workers at a time.
+    The process started in the k-th worker slot gets the environment variables
+    worker_envs[k % len(worker_envs)], e.g. {"CUDA_VISIBLE_DEVICES": "0"}.
+    With more than one worker, OMP_NUM_THREADS shares the cores among the
+    slots unless it is set by worker_envs.
+    Return the exit code of each task.
+    """
+    n_workers = max(1, min(n_workers, len(task_dirs)))
+    slot_envs = []
+    for kk in range(n_workers):
+        env = dict(os.environ)
+        if n_workers > 1:
+            env['OMP_NUM_THREADS'] = str(max(1, (os.cpu_count() or 1) // n_workers))
+        if worker_envs:
+            env.update({ii: str(jj) for ii, jj in worker_envs[kk % len(worker_envs)].items()})
+        slot_envs.append(env)
+    free_slots = queue.Queue()
+    for kk in range(n_workers):
+        free_slots.put(kk)
+
+    def _run(task_dir):
+        slot = free_slots.get()
+        try:
+            return subprocess.call(cmd, shell=True, cwd=task_dir, env=slot_envs[slot])
+        finally:
+            free_slots.put(slot)
+
+    with ThreadPoolExecutor(n_workers) as pool:
+        return list(pool.map(_run, task_dirs))
+
+
+def link_models(models: list, model_paths: list):
+    """
+    Link the files of the model artifact to the model paths of the interaction
+    that do not exist, e.g. when the models are not in the uploaded work directory,
+    return the links to be removed before the work directory is output
+    """
+    links = []
+    for src, dst in zip(models, model_paths):
+        if not os.path.exists(dst):
+            if os.path.islink(dst):
+                os.remove(dst)
+            os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+            os.symlink(os.path.abspath(src), dst)
+            links.append(dst)
+    return links
+
+
+def strip_model_links(task_dirs: list, model_paths: list):
+    """
+    Remove the links to the models from the tasks and their parent directories,
+    the models are passed to the calculations as a separate artifact and never
+    enter the task artifacts
+    """
+    names = [os.path.basename(ii) for ii in model_paths]
+    for ii in task_dirs:
+        for jj in [ii, os.path.dirname(ii)]:
+            for kk in names:
+                if os.path.islink(os.path.join(jj, kk)):
+                    os.remove(os.path.join(jj, kk))
+
+
+def link_task_models(task_dir: str, models: list) -> list:
+    """
+    Link the files of the model artifact into task_dir by their names,
+    return the links to be removed after the calculation
+    """
+    links = []
+    for ii in models:
+        dst = os.path.join(task_dir, os.path.basename(ii))
+        if os.path.islink(dst):
+            os.remove(dst)
+        if not os.path.exists(dst):
+            os.symlink(os.path.abspath(ii), dst)
+            links.append(dst)
+    return links
+
+
+# the files of a conf kept by the compact post output: the results of the
+# properties and the relaxation, the relaxed structure (CONTCAR, or the
+# final STRU of ABACUS with its INPUT and the running log that final_stru reads
+# with out_stru) that a properties-only test starts from
+compact_patterns = ['*/result.json', '*/result.out',
+                    'relaxation/relax_task/result.json', 'relaxation/relax_task/CONTCAR',
+                    'relaxation/relax_task/INPUT', 'relaxation/relax_task/OUT.*/STRU_ION*_D',
+                    'relaxation/relax_task/OUT.*/running_*.log']
+
+
+def copy_post_output(work_dir: str, structures: list, compact: bool = False):
+    """
+    Copy the confs of work_dir to ./confs, the output_post artifact. In compact
+    mode only the files of compact_patterns in the conf dirs of structures are
+    copied there, and the whole confs to ./raw/confs, the output_raw artifact,
+    which is not downloaded.
+    Return the path of output_raw, None if not compact.
+    """
+    src = os.path.join(work_dir, 'confs')
+    if not compact:
+        shutil.copytree(src, 'confs', dirs_exist_ok=True)
+        return None
+    shutil.copytree(src, os.path.join('raw', 'confs'), dirs_exist_ok=True)
+    os.makedirs('confs', exist_ok=True)
+    n_files = 0
+    for conf in structures:
+        for ii in sorted(glob.glob(os.path.join(work_dir, conf))):
+            for jj in compact_patterns:
+                for kk in glob.glob(os.path.join(ii, jj)):
+                    dst = os.path.relpath(kk, work_dir)
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    shutil.copy2(kk, dst)
+                    n_files += 1
+    print('compact post output: %d files in confs, the task trees in raw/confs' % n_files)
+    return os.path.join('raw', 'confs')